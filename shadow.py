@@ -24,6 +24,8 @@ import test.test_workflow, test.test_heuristic
 from shadow.algorithms.heuristic import heft
 from shadow.classes.workflow import Workflow
 from shadow.classes.environment import Environment
+from shadow import batch, bench
+from shadow.classes.profiler import DISABLED, Profiler, log_sink, json_sink
 
 testcases = {  # Tests for the test runner
 	"workflow": test.test_workflow,
@@ -70,10 +72,45 @@ def run_algorithm(arg, parser):
 		wf = Workflow(arg['workflow'])
 		env = Environment(arg['environment'])
 		wf.add_environment(env)
-		print(heft(wf))
+		profiler = DISABLED
+		if arg['profile']:
+			profiler = Profiler(log_sink(), json_sink(arg['profile']))
+		print(heft(wf, profiler=profiler))
 		print(wf.machine_alloc)
 
 
+def run_batch(arg, parser):
+	pairs = batch.find_pairs(arg['path'])
+	if not pairs:
+		parser.print_help()
+		return None
+	results = batch.run_batch(
+		pairs, arg['algorithms'], output=arg['output'], workers=arg['workers'],
+		cache_dir=arg['cache_dir']
+	)
+	failed = [r for r in results if r['error']]
+	print('Scheduled {0} runs ({1} failed), results in {2}'.format(
+		len(results), len(failed), arg['output'])
+	)
+
+
+def run_bench(arg, parser):
+	workload_list = bench.workloads(
+		arg['sizes'], arg['ccr'], arg['machines'], arg['heterogeneity'],
+		width=arg['width'], seed=arg['seed']
+	)
+	report = bench.run_benchmarks(
+		workload_list, arg['algorithms'], output=arg['output'],
+		repeat=arg['repeat'], memory=not arg['no_memory']
+	)
+	for r in report['results']:
+		print(
+			'{algorithm:8} tasks={num_tasks:<8} ccr={ccr:<5} machines={num_machines:<5} '
+			'load={load:.3f}s rank={rank:.3f}s allocate={allocate:.3f}s '
+			'makespan={makespan:.0f}'.format(**r)
+		)
+
+
 # wf = Workflow(arg['graph'])
 # calc_time = (arg['calc_time'] == 'True')
 # wf.load_attributes(arg['attr'], calc_time)
@@ -106,6 +143,28 @@ if __name__ == "__main__":
 	algorithm_parser.add_argument('algorithm', help='Name of algorithm')
 	algorithm_parser.add_argument('workflow', help='Location of workflow config')
 	algorithm_parser.add_argument('environment', help='Location of the environment config')
+	algorithm_parser.add_argument('--profile', help='Append per-phase counters and timers for the run to this JSON lines file')
+
+	batch_parser = subparsers.add_parser('batch', help='Run algorithms on many workflow/environment pairs in parallel')
+	batch_parser.set_defaults(func=run_batch)
+	batch_parser.add_argument('path', help='Directory of X.json/X_sys.json pairs, or a JSON manifest of pairs')
+	batch_parser.add_argument('--algorithms', nargs='+', default=['heft'], choices=list(batch.algorithms), help='Algorithms to run on every pair')
+	batch_parser.add_argument('--output', default='results.csv', help='Output file (.csv or .parquet)')
+	batch_parser.add_argument('--workers', type=int, help='Number of worker processes (default is the CPU count)')
+	batch_parser.add_argument('--cache-dir', help='Directory of binary workflow/environment caches to reuse between runs')
+
+	bench_parser = subparsers.add_parser('bench', help='Benchmark algorithms on synthetic workflows')
+	bench_parser.set_defaults(func=run_bench)
+	bench_parser.add_argument('--algorithms', nargs='+', default=['heft', 'pheft'], choices=list(bench.algorithms), help='Algorithms to benchmark')
+	bench_parser.add_argument('--sizes', nargs='+', type=int, default=[100, 1000, 10000], help='Number of tasks in each workflow')
+	bench_parser.add_argument('--ccr', nargs='+', type=float, default=[1.0], help='Communication/Computation cost ratios')
+	bench_parser.add_argument('--machines', nargs='+', type=int, default=[8], help='Number of machines in each environment')
+	bench_parser.add_argument('--heterogeneity', nargs='+', type=float, default=[2.0], help='Ratio of the fastest to the slowest machine speed')
+	bench_parser.add_argument('--width', type=int, help='Average number of tasks per level (default is sqrt of the size)')
+	bench_parser.add_argument('--seed', type=int, default=20, help='Random seed for the generated workloads')
+	bench_parser.add_argument('--repeat', type=int, default=3, help='Number of timed runs of each algorithm on each workload')
+	bench_parser.add_argument('--no-memory', action='store_true', help='Do not measure peak memory')
+	bench_parser.add_argument('--output', default='bench.json', help='Output JSON report')
 
 	args = parser.parse_args()
 	if not args.command:
@@ -118,3 +177,7 @@ if __name__ == "__main__":
 		args.func(vars(args), algorithm_parser)
 	if args.command == 'test':
 		args.func(vars(args), testcases, test_parser)
+	if args.command == 'batch':
+		args.func(vars(args), batch_parser)
+	if args.command == 'bench':
+		args.func(vars(args), bench_parser)
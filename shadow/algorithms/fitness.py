@@ -15,40 +15,218 @@
 
 """
 Fitness functions for use in evaluating objectives
+
+Each objective is a kernel over a batch of schedules of one workflow (see
+Schedules), and returns an array with one value per schedule. Objectives are
+registered by name in objective_set, and run_objectives evaluates a list of
+them into an (n_solutions, n_objectives) matrix. non_dom_sort and
+crowding_distance rank the rows of such a matrix by Pareto dominance.
 """
 
+import numpy as np
 
-def cost_fitness():
-	return None
 
+class Schedules(object):
+	"""
+	A batch of schedules of one workflow, one row per schedule
 
-def time_fitness():
-	return None
+	:param start: (n_solutions, n_tasks) array of task start times
+	:param finish: (n_solutions, n_tasks) array of task finish times
+	:param machine: (n_solutions, n_tasks) array of the machine index of
+	each task
+	:param prices: Array of the cost of one unit of runtime on each machine
+	index (see machine_prices)
+	"""
 
+	__slots__ = ('start', 'finish', 'machine', 'prices')
 
-def throughput_fitness():
-	return None
+	def __init__(self, start, finish, machine, prices):
+		self.start = start
+		self.finish = finish
+		self.machine = machine
+		self.prices = prices
 
+	def __len__(self):
+		return len(self.start)
 
-def reliability_fitness():
-	return None
+	@property
+	def num_machines(self):
+		return len(self.prices)
 
 
-# This is ugly - I should place this somewhere else (e.g current_globs.py)
-# which keeps the current state of the shadow library options available; e.g.
-# visualisation parameters, objectives that can be tested etc.
+def machine_prices(wf):
+	"""
+	:return: Array of the cost of one unit of runtime on each machine index
+	of the workflow's environment, from Environment.calc_task_cost_on_machine
+	"""
+	return np.array([
+		wf.env.calc_task_cost_on_machine(machine, 1)
+		for machine in wf.compile().machines
+	], dtype=float)
+
+
+def time_fitness(schedules):
+	"""
+	:return: Makespan of each schedule
+	"""
+	return schedules.finish.max(axis=1, initial=0)
+
+
+def cost_fitness(schedules):
+	"""
+	:return: Total cost of the task runtimes of each schedule
+	"""
+	runtime = schedules.finish - schedules.start
+	return (runtime * schedules.prices[schedules.machine]).sum(axis=1)
+
+
+def throughput_fitness(schedules):
+	"""
+	:return: Number of tasks completed per unit time of each schedule
+	"""
+	makespan = time_fitness(schedules)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		return np.where(
+			makespan > 0, schedules.start.shape[1] / makespan, 0.0
+		)
 
-objective_set = {"cost": cost_fitness,
-				"time": time_fitness,
-				"throughput": throughput_fitness,
-				"reliability": reliability_fitness}
 
+def utilisation_fitness(schedules):
+	"""
+	:return: Fraction of the time that machines are busy over each
+	schedule's makespan
+	"""
+	busy = (schedules.finish - schedules.start).sum(axis=1)
+	capacity = schedules.num_machines * time_fitness(schedules)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		return np.where(capacity > 0, busy / capacity, 0.0)
 
-def run_objectives(objectives):
-	retdict = {}
-	for objective in objectives:
-		if objective in objective_set:
-			func = objective_set[objective]
-			retdict[objective] = func()
 
-	return None
+class Objective(object):
+	"""
+	A registered objective
+
+	:param kernel: Function from Schedules to an array of values
+	:param maximise: Whether larger values are better
+	"""
+
+	__slots__ = ('kernel', 'maximise')
+
+	def __init__(self, kernel, maximise=False):
+		self.kernel = kernel
+		self.maximise = maximise
+
+
+# This is ugly - I should place this somewhere else (e.g current_globs.py)
+# which keeps the current state of the shadow library options available; e.g.
+# visualisation parameters, objectives that can be tested etc.
+
+objective_set = {"time": Objective(time_fitness),
+				"cost": Objective(cost_fitness),
+				"throughput": Objective(throughput_fitness, maximise=True),
+				"utilisation": Objective(utilisation_fitness, maximise=True)}
+
+
+def run_objectives(objectives, schedules, minimise=False):
+	"""
+	Evaluate objectives over a batch of schedules
+
+	:param objectives: List of objective names (keys of objective_set)
+	:param schedules: Schedules
+	:param minimise: If True, objectives that are maximised are negated, so
+	that every column is minimised
+	:return: (n_solutions, n_objectives) array
+	"""
+	values = np.empty((len(schedules), len(objectives)))
+	for j, name in enumerate(objectives):
+		if name not in objective_set:
+			raise ValueError('Unknown objective: {0}'.format(name))
+		objective = objective_set[name]
+		values[:, j] = objective.kernel(schedules)
+		if minimise and objective.maximise:
+			values[:, j] = -values[:, j]
+	return values
+
+
+def natural_units(objectives, values):
+	"""
+	Undo the negation of run_objectives(..., minimise=True)
+
+	:return: Copy of values with the maximised objectives negated back
+	"""
+	values = np.array(values, dtype=float)
+	for j, name in enumerate(objectives):
+		if objective_set[name].maximise:
+			values[..., j] = -values[..., j]
+	return values
+
+
+def non_dom_sort(objectives):
+	"""
+	Sort solutions into non-dominated fronts, as in Deb et al. (2002).
+
+	The dominance relation between every pair of solutions is computed as a
+	boolean matrix, and each front is peeled off with a single reduction
+	over the rows of the previous front.
+
+	:param objectives: (n_solutions, n_objectives) array, all minimised
+	:return: Array of the front of each solution; 0 is non-dominated
+	"""
+	objectives = np.asarray(objectives)
+	dominated = dominates(objectives[:, np.newaxis], objectives[np.newaxis])
+	counter = dominated.sum(axis=0)
+	ranks = np.full(len(objectives), -1, dtype=np.int64)
+	front = np.flatnonzero(counter == 0)
+	rank = 0
+	while len(front):
+		ranks[front] = rank
+		counter -= dominated[front].sum(axis=0)
+		counter[front] = -1
+		front = np.flatnonzero(counter == 0)
+		rank += 1
+	return ranks
+
+
+def dominates(p, q):
+	"""
+	Checks if the solution with objectives 'p' dominates 'q': it is no worse
+	in any objective and better in at least one. p and q broadcast, so this
+	may compare many solutions at once.
+	"""
+	return np.all(p <= q, axis=-1) & np.any(p < q, axis=-1)
+
+
+def crowding_distance(objectives, ranks):
+	"""
+	For a given list of solutions, calculated the distance between the two closest solutions
+	for a given dimension; that is, the next highest and next lowest solution for that dimension.
+
+	Distances are normalised by the range of each objective within a front,
+	and every front is handled at once by sorting on (front, objective).
+	Solutions at either end of a front have infinite distance.
+
+	:param objectives: (n_solutions, n_objectives) array
+	:param ranks: Array of the front of each solution
+	:return: Array of the crowding distance of each solution
+	"""
+	objectives = np.asarray(objectives, dtype=float)
+	n = len(objectives)
+	distance = np.zeros(n)
+	if n == 0:
+		return distance
+	for j in range(objectives.shape[1]):
+		order = np.lexsort((objectives[:, j], ranks))
+		values = objectives[order, j]
+		front = ranks[order]
+		first = np.r_[True, front[1:] != front[:-1]]
+		last = np.r_[front[1:] != front[:-1], True]
+		starts = np.flatnonzero(first)
+		span = np.maximum.reduceat(values, starts) - np.minimum.reduceat(values, starts)
+		span = np.repeat(span, np.diff(np.r_[starts, n]))
+		gap = np.zeros(n)
+		gap[1:-1] = values[2:] - values[:-2]
+		with np.errstate(divide='ignore', invalid='ignore'):
+			d = np.where(span > 0, gap / span, 0.0)
+		d[first | last] = np.inf
+		distance[order] += d
+	return distance
@@ -19,11 +19,20 @@
 This module contais code for implementing heuristic-based scheduling
 algorithms. Currently, this file implements the following algorithms:
 
-* HEFT 
+* HEFT, optionally with a lookahead
 * PHEFT 
+* IC-PCP, for deadline-constrained cost minimisation
+* MOLS, a multi-objective list scheduler of makespan and cost
 """
+import heapq
 from random import randint
-import operator
+
+import numpy as np
+
+from shadow.algorithms.fitness import machine_prices, crowding_distance
+from shadow.classes.profiler import DISABLED
+from shadow.classes.solution import Solution
+from shadow.classes.workflow import segment_max
 
 RANDMAX = 1000
 
@@ -33,38 +42,180 @@ RANDMAX = 1000
 #############################################################################
 
 
-def heft(workflow):
+def heft(workflow, profiler=DISABLED, aggregate=False, lookahead=0):
 	"""
 	Implementation of the original 1999 HEFT algorithm.
 
 	:params wf: The workflow object to schedule
+	:params profiler: Optional Profiler that records the run
+	:params aggregate: Search each class of interchangeable machines as one
+	pool, see insertion_policy_classes()
+	:params lookahead: Depth of the lookahead, see
+	insertion_policy_lookahead(); 0 for none
 	:returns: The makespan of the resulting schedule
 	"""
-	upward_rank(workflow)
-	workflow.sort_tasks('rank')
-	makespan = insertion_policy(workflow)
+	if aggregate and lookahead:
+		raise ValueError('Lookahead is not supported with aggregate machines')
+	with profiler.run('heft'):
+		upward_rank(workflow, profiler)
+		if lookahead:
+			makespan = insertion_policy_lookahead(workflow, lookahead, profiler)
+		elif aggregate:
+			makespan = insertion_policy_classes(workflow, profiler)
+		else:
+			makespan = insertion_policy(workflow, profiler)
 	return makespan
 
-def pheft(wf):
+def pheft(wf, profiler=DISABLED):
 	"""
 	Implementation of the PHEFT algorithm, which adaptst the HEFT algorithm
 	using the concpet of an Optimistic Cost Table (OCT)
 	"""
 
-	oct_rank_matrix = dict()  # Necessary addition for PHEFT
-	upward_oct_rank(wf, oct_rank_matrix)
-	makespan = insertion_policy_oct(wf, oct_rank_matrix)
+	with profiler.run('pheft'):
+		oct_table = upward_oct_rank(wf, profiler)
+		makespan = insertion_policy_oct(wf, oct_table, profiler)
 	return makespan
 
 
-# TODO: Partial Critical Paths 
-def pcp(wf):
-	return None
+def pcp(wf, deadline=None, profiler=DISABLED):
+	"""
+	Implementation of the IaaS Cloud Partial Critical Paths (IC-PCP)
+	algorithm of Abrishami, Naghibzadeh & Epema (2013), which looks for the
+	cheapest schedule that finishes by a deadline.
+
+	Every task has an earliest start time (EST), from the fastest runtimes
+	of the unallocated tasks before it, and a latest finish time (LFT), from
+	the deadline and the fastest runtimes of the tasks after it. The partial
+	critical path of a task follows its critical parent (the unallocated
+	parent whose data arrives last) back to a task with no unallocated
+	parents. Starting from the exit tasks, each path is allocated as a whole
+	to the cheapest machine on which every task of the path finishes by its
+	LFT, the ESTs and LFTs around the path are updated, and then the paths
+	of the path's own tasks are allocated in the same way. The LFT of an
+	allocated task is its share of the deadline: tasks allocated later must
+	let it start in time to meet it.
+
+	Machines are the fixed machines of the environment rather than instances
+	launched on demand, and are charged per unit of runtime (see
+	Environment.calc_task_cost_on_machine). A path that cannot meet its LFTs
+	on any machine goes to the machine on which it is least late. Once every
+	task has a machine, the tasks are allocated again on their machines in
+	order, so that the schedule stays valid when a path was late.
+
+	:param wf: The workflow object to schedule
+	:param deadline: Time by which the workflow should finish; by default
+	the length of the critical path with every task on its fastest machine
+	:param profiler: Optional Profiler that records the run
+	:return: The makespan of the resulting schedule; the cost is stored as
+	wf.solution.solution_cost
+	"""
+	with profiler.run('pcp'):
+		with profiler.timer('compile'):
+			cw = wf.compile()
+		with profiler.timer('rank'):
+			paths = _PartialCriticalPaths(wf, cw, deadline)
+		with profiler.timer('allocate'):
+			paths.assign_all(profiler)
+			paths.retime()
+		profiler.count('allocate.tasks', cw.num_tasks)
+
+	makespan = cw.finish.max().item() if cw.num_tasks else 0
+	cost = paths.prices[cw.placed] @ cw.runtime[np.arange(cw.num_tasks), cw.placed]
+	wf.makespan = makespan
+	wf.solution.makespan = makespan
+	wf.solution.solution_cost = cost.item()
+	return makespan
 
 
-# TODO: Multi-objective list scheduling
-def mols(wf):
-	return None
+def mols(wf, size=10, profiler=DISABLED):
+	"""
+	Multi-objective list scheduling of makespan and cost, following the
+	MOHEFT algorithm of Durillo, Fard & Prodan (2012).
+
+	Tasks are taken in order of upward rank, as in HEFT, and a set of at
+	most size partial schedules is kept. Each task is added to every
+	partial schedule on every machine, at its earliest start with
+	insertion. Of these, the partial schedules that no other dominates on
+	(makespan, cost) are kept; if there are more than size, the ones with
+	the largest crowding distance are kept.
+
+	Partial schedules share structure rather than copying a Solution each:
+	their machine timelines are Snapshots of persistent Timelines, and the
+	machine and finish time of each task are held in blocks that are only
+	copied when written.
+
+	:param wf: The workflow object to schedule
+	:param size: Largest number of partial schedules kept
+	:param profiler: Optional Profiler that records the run
+	:return: List of the Solutions on the Pareto front, in order of
+	makespan, each with its makespan and solution_cost set
+	"""
+	with profiler.run('mols'):
+		upward_rank(wf, profiler)
+		cw = wf.compile()
+		prices = machine_prices(wf)
+		order = rank_order(cw)
+		position = np.empty(cw.num_tasks, dtype=np.int64)
+		position[order] = np.arange(cw.num_tasks)
+		position = position.tolist()
+		dtype = cw.time_type
+		empty = Solution(machines=cw.machines)
+		front = [_PartialSchedule(empty.snapshot(), [], [], 0, 0.0)]
+
+		with profiler.timer('allocate'):
+			for i in order.tolist():
+				preds = cw.predecessors(i)
+				data_size = cw.predecessor_data(i)
+				slots = [position[p] for p in preds.tolist()]
+				runtime = cw.runtime[i]
+				eft = np.empty((len(front), cw.num_machines), dtype=dtype)
+				for a, schedule in enumerate(front):
+					machines, aft = schedule.lookup(slots)
+					ready = data_ready_times(
+						np.array(machines, dtype=np.int64),
+						np.array(aft, dtype=dtype), data_size,
+						cw.num_machines, dtype, cw.comm
+					)
+					eft[a] = schedule.timelines.earliest_starts(
+						ready, runtime, profiler
+					) + runtime
+				makespan = np.maximum(
+					eft, [[schedule.makespan] for schedule in front]
+				).ravel()
+				cost = (
+					np.array([[schedule.cost] for schedule in front])
+					+ runtime * prices
+				).ravel()
+				kept = _pareto_front(makespan, cost, size)
+				profiler.count('allocate.est_evaluations', eft.size)
+				profiler.count('allocate.partial_schedules', len(kept))
+
+				k = position[i]
+				front = [
+					front[a].extend(
+						k, m, cw.machines[m], eft[a, m].item() - runtime[m].item(),
+						eft[a, m].item(), makespan[c].item(), cost[c].item()
+					)
+					for c, (a, m) in zip(
+						kept.tolist(), zip(*np.divmod(kept, cw.num_machines))
+					)
+				]
+			profiler.count('allocate.tasks', cw.num_tasks)
+
+	solutions = []
+	tids = cw.tids[order].tolist()
+	for schedule in sorted(front, key=lambda s: (s.makespan, s.cost)):
+		solution = Solution(machines=cw.machines)
+		machines, aft = schedule.lookup(range(cw.num_tasks))
+		for tid, m, finish, runtime in zip(
+			tids, machines, aft, cw.runtime[order, machines].tolist()
+		):
+			solution.allocate(tid, cw.machines[m], finish - runtime, finish)
+		solution.makespan = schedule.makespan
+		solution.solution_cost = schedule.cost
+		solutions.append(solution)
+	return solutions
 
 
 #############################################################################
@@ -72,29 +223,114 @@ def mols(wf):
 #############################################################################
 
 
-def upward_rank(wf):
+def upward_rank(wf, profiler=DISABLED):
+	"""
+	Ranks tasks according to the upward rank heuristic outlined in
+	Topcuoglu, Hariri & Wu (2002). Tasks are visited a level at a time in
+	reverse topological order, so each level is ranked with a handful of
+	array operations and there is no recursion on deep graphs.
+
+	:param wf: Subject workflow
+	:param profiler: Optional Profiler that records the ranking
+	:return: Array of task ranks, indexed by compiled task index
+	"""
+	with profiler.timer('compile'):
+		cw = wf.compile()
+	with profiler.timer('rank'):
+		ave_runtime = cw.runtime.mean(axis=1)
+		comm = cw.average_comm
+		rank = np.zeros(cw.num_tasks)
+		for level in cw.reverse_levels():
+			edges, counts = cw.successor_edges(level)
+			longest_rank = segment_max(
+				comm[edges] + rank[cw.succ_idx[edges]], counts
+			)
+			rank[level] = ave_runtime[level] + longest_rank
+			profiler.count('rank.levels')
+			profiler.count('rank.edges', len(edges))
+
+	cw.rank = rank
+	if cw.tasks is not None:
+		for task, task_rank in zip(cw.tasks, rank.tolist()):
+			task.rank = task_rank
+	return rank
+
+
+def upward_oct_rank(wf, profiler=DISABLED):
 	"""
-	Ranks tasks according to the specified method. Tasks need to be ranked,
-	then sorted according to the rank. Returns a sorted list of tasks in
-	order of rank.
+	Builds the Optimistic Cost Table (OCT) outlined in Arabnejad and Barbosa
+	(2014), and ranks each task by the average of its row in the table.
+
+	OCT(t, p) = max over successors s of
+		min over machines q of OCT(s, q) + w(s, q) + c(t, s) * [q != p]
+
+	The table is filled a level at a time in reverse topological order. For
+	each edge, the min over q is taken with broadcasting: staying on p costs
+	OCT(s, p) + w(s, p), and moving costs the cheapest machine plus c(t, s).
+
+	:param wf: Subject workflow
+	:param profiler: Optional Profiler that records the ranking
+	:return: (n_tasks, n_machines) OCT array, indexed by compiled task and
+	machine index
 	"""
-	for task in sorted(list(wf.tasks)):
-		rank_up(wf, task)
+	with profiler.timer('compile'):
+		cw = wf.compile()
+	with profiler.timer('rank'):
+		comm = cw.average_comm
+		oct_table = np.zeros((cw.num_tasks, cw.num_machines))
+		for level in cw.reverse_levels():
+			edges, counts = cw.successor_edges(level)
+			successors = cw.succ_idx[edges]
+			cost = oct_table[successors] + cw.runtime[successors]
+			cost = np.minimum(
+				cost, cost.min(axis=1, keepdims=True) + comm[edges, np.newaxis]
+			)
+			oct_table[level] = segment_max(cost, counts)
+			profiler.count('rank.levels')
+			profiler.count('rank.edges', len(edges))
 
+	rank = oct_table.mean(axis=1).astype(int)
+	cw.rank = rank
+	if cw.tasks is not None:
+		for task, task_rank in zip(cw.tasks, rank.tolist()):
+			task.rank = task_rank
+	return oct_table
 
-def upward_oct_rank(wf, oct_rank_matrix):
-	for val in wf.env.machines:
-		for node in sorted(list(wf.tasks()), reverse=True):
-			rank_oct(wf, oct_rank_matrix, node, val)
 
-	for task in wf.tasks:
-		ave = 0
-		for (t, p) in oct_rank_matrix:
-			if t is task:
-				ave += oct_rank_matrix[(t, p)]
+def update_ranks(wf, tasks):
+	"""
+	Recompute the upward ranks of the given tasks and of their ancestors,
+	which are the only tasks whose rank depends on them. The affected tasks
+	are visited a level at a time in reverse topological order, as in
+	upward_rank().
+
+	:param wf: Subject workflow, already ranked by upward_rank()
+	:param tasks: Array of the task indices whose runtimes have changed
+	:return: Array of the task indices whose ranks were recomputed
+	"""
+	cw = wf.compile()
+	if cw.rank is None:
+		upward_rank(wf)
+		return np.arange(cw.num_tasks)
+	affected = cw.ancestors(np.asarray(tasks, dtype=np.int64))
+	numbers = cw.level_numbers()[affected]
+	order = np.argsort(numbers, kind='stable')
+	affected, numbers = affected[order], numbers[order]
+	bounds = np.flatnonzero(np.diff(numbers)) + 1
+
+	rank = cw.rank
+	comm = cw.average_comm
+	for level in np.split(affected, bounds):
+		edges, counts = cw.successor_edges(level)
+		longest_rank = segment_max(
+			comm[edges] + rank[cw.succ_idx[edges]], counts
+		)
+		rank[level] = cw.runtime[level].mean(axis=1) + longest_rank
 
-		rank = int(ave / len(wf.env.machines))
-		task.rank = rank
+	if cw.tasks is not None:
+		for i, task_rank in zip(affected.tolist(), rank[affected].tolist()):
+			cw.tasks[i].rank = task_rank
+	return affected
 
 
 def rank_up(wf, task):
@@ -150,56 +386,18 @@ def rank_up_random(wf, task):
 	wf.tasks[task]['rank'] = ave_comp + longest_rank
 
 
-def rank_oct(wf, oct_rank_matrix, task, pk):
-	"""
-	Optimistic cost table ranking heuristic outlined in
-	Arabnejad and Barbos (2014)
-	"""
-	max_successor = 0
-	for successor in wf.graph.successors(task):
-		min_machine = 1000
-		for machine in wf.machine_alloc:
-			oct_val = 0
-			if (successor, machine) not in oct_rank_matrix.keys():
-				rank_oct(wf, oct_rank_matrix, successor, machine)
-			comm_cost = 0
-			comp_cost = successor.calculated_runtime[machine]
-			if machine is not pk:
-				comm_cost = ave_comm_cost(wf, task, successor)
-			oct_val = oct_rank_matrix[(successor, machine)] + \
-					comp_cost + comm_cost
-			min_machine = min(min_machine, oct_val)
-		max_successor = max(max_successor, min_machine)
-
-	oct_rank_matrix[(task, pk)] = max_successor
-
 def ave_comm_cost(wf, task, successor):
 	"""
-	Returns the 'average' communication cost, which is just
-	the cost in the matrix. Not sure how the ave. in the
-	original paper was calculate or represented...
+	Returns the 'average' communication cost of the edge from task to
+	successor: its data size over the average data rate of every pair of
+	distinct machines, as in Topcuoglu, Hariri & Wu (2002). See
+	CommunicationModel.average_cost.
 
 	:params task: Starting task
 	:params successor: Node with which the starting task is communicating
 	"""
-	# TODO sort out data rates in future release
-	# cost, zeros = 0, 0
-	# data_product_size = wf.graph.edges[task, successor]['data_size']
-	# for val in range(len(wf.system['data_rate'][0])):
-	# 	rate = wf.system['data_rate'][0][val]
-	# 	if rate != 0:
-	# 		cost += data_product_size / rate
-	# 	else:
-	# 		zeros += 1
-	# denominator = len(wf.system['data_rate'][0]) - zeros
-	#
-	# # if denominator is 0, the data rate between each machine is negligible.
-	# if denominator == 0:
-	# 	return 0
-	# else:
-	# 	return int(cost / denominator)
-
-	return wf.graph.edges[task, successor]['data_size']
+	data_size = wf.graph.edges[task, successor]['data_size']
+	return wf.env.communication.average_cost(data_size).item()
 
 
 def ave_comp_cost(wf, task):
@@ -221,167 +419,846 @@ def calc_est(wf, task, machine):
 	"""
 	Calculate the Estimated Start Time of a task on a given processor
 	"""
-
+	cw = wf.compile()
+	i = cw.task_index[task.tid]
 	est = 0
-	predecessors = wf.graph.predecessors(task)
-	for pretask in predecessors:
+	predecessors = zip(
+		cw.predecessors(i).tolist(), cw.predecessor_data(i).tolist()
+	)
+	m = cw.machine_index[machine]
+	for p, data_size in predecessors:
+		pretask = cw.tasks[p]
 		# If task isn't on the same processor, there is a transfer cost
-		pre_machine = pretask.machine
-		# rate = wf.system['data_rate'][pre_processor][machine]
-		if pre_machine != machine:  # and rate > 0:
-			comm_cost = int(wf.graph.edges[pretask, task]['data_size'])  # / rate)
+		if pretask.machine != machine:
+			comm_cost = cw.comm.transfer_times(
+				data_size, cw.machine_index[pretask.machine], m
+			).item()
+			if cw.comm.unit:
+				comm_cost = int(comm_cost)
 		else:
 			comm_cost = 0
+		if pretask.aft + comm_cost >= est:
+			est = pretask.aft + comm_cost
 
-		aft = pretask.aft
-		tmp = aft + comm_cost
-		if tmp >= est:
-			est = tmp
-
-	machine_str = machine
-	curr_allocations = wf.solution.list_machine_allocations(machine_str)
-	available_slots = []
-	num_alloc = len(curr_allocations)
-	prev = None
-	if num_alloc == 0:
-		test = 0
+	return wf.solution.earliest_start(
+		machine, est, task.calculated_runtime[machine]
+	)
+
+
+def ready_times(cw, i, placed, finish):
+	"""
+	Calculate the time at which all of task index i's input data is
+	available on every machine.
+
+	:param cw: CompiledWorkflow
+	:param i: Task index
+	:param placed: Array of the machine index of each allocated task
+	:param finish: Array of the finish time of each allocated task
+	:return: Array of ready times, indexed by machine index
+	"""
+	preds = cw.predecessors(i)
+	return data_ready_times(
+		placed[preds], finish[preds], cw.predecessor_data(i),
+		cw.num_machines, finish.dtype, cw.comm
+	)
+
+
+def data_ready_times(machines, aft, data_size, num_machines, dtype=np.int64,
+					comm=None):
+	"""
+	Calculate the time at which all of a task's input data is available on
+	every machine. Data from a predecessor arrives at its finish time plus
+	the transfer cost, except on the predecessor's own machine where there
+	is no transfer.
+
+	:param machines: Array of the machine index of each predecessor (-1 for
+	a predecessor that is not allocated, whose data comes over the slowest
+	link)
+	:param aft: Array of the finish time of each predecessor
+	:param data_size: Array of the data size on the edge from each predecessor
+	:param num_machines: Number of machines
+	:param dtype: Type of the returned times
+	:param comm: Optional CommunicationModel; without one the transfer cost
+	is the data size
+	:return: Array of ready times, indexed by machine index
+	"""
+	ready = np.zeros(num_machines, dtype=dtype)
+	if len(machines) == 0:
+		return ready
+	if comm is not None and comm.uniform is None:
+		# Transfer costs depend on both machines: one row per predecessor
+		machines = np.asarray(machines)[:, np.newaxis]
+		data_size = np.asarray(data_size)[:, np.newaxis]
+		transfer = np.where(
+			machines >= 0,
+			comm.transfer_times(
+				data_size, np.maximum(machines, 0), np.arange(num_machines)
+			),
+			comm.remote_times(data_size[:, 0])
+		)
+		return np.maximum(ready, (aft[:, np.newaxis] + transfer).max(axis=0))
+	if comm is None or comm.unit:
+		arrival = aft + np.asarray(data_size).astype(np.int64)
 	else:
-		for i,alloc in enumerate(curr_allocations):
-			if i == 0:
-				if alloc.ast !=0: # If the start time of the first allocation is not 0
-					available_slots.append((0, alloc.ast))
-				else:
-					continue
-			else:
-				prev_alloc = curr_allocations[i-1]
-				available_slots.append((
-					prev_alloc.aft,
-					alloc.ast
-				))
-		final_alloc = curr_allocations[num_alloc-1] # We want the finish time of the latest allocation.
-		available_slots.append((final_alloc.aft, -1))
-
-	for slot in available_slots:
-		if est < slot[0] and slot[0] + \
-				task.calculated_runtime[machine] <= slot[1]:
-			return slot[0]
-		if (est >= slot[0]) and est + task.calculated_runtime[machine] <= slot[1]:
-			return est
-		# At the 'end' of available slots
-		if (est >= slot[0]) and (slot[1] < 0):
-			return est
-		# This last case occurs when we have a low est but a high cost, so
-		# it doesn't fit in any gaps; hence we have to put it at the 'end'
-		# and start it late
-		if (est < slot[0]) and (slot[1] < 0):
-			return slot[0]
-
-	return est
-
-
-def insertion_policy(wf):
+		arrival = aft + np.asarray(data_size) * comm.uniform
+	on_machine = machines >= 0
+	np.maximum.at(ready, machines[on_machine], aft[on_machine])
+	# Every machine but the one holding the latest arrival waits for it
+	latest = np.argmax(arrival)
+	m = machines[latest]
+	same = ready[m]
+	ready = np.maximum(ready, arrival[latest])
+	if m >= 0:
+		other = arrival[machines != m]
+		ready[m] = max(same, other.max()) if len(other) else same
+	return ready
+
+
+def rank_order(cw):
+	"""
+	:return: Task indices in decreasing order of rank; tasks with equal rank
+	keep their graph order
+	"""
+	return np.argsort(-cw.rank, kind='stable')
+
+
+def schedule_arrays(cw):
+	"""
+	:return: (placed, finish) arrays for recording the machine index and
+	finish time of each task as it is allocated. The arrays are kept on
+	the CompiledWorkflow so that the schedule can be revised later.
+	"""
+	placed = np.full(cw.num_tasks, -1, dtype=np.int64)
+	finish = np.zeros(cw.num_tasks, dtype=cw.time_type)
+	cw.placed, cw.finish = placed, finish
+	return placed, finish
+
+
+def _allocate(wf, cw, i, m, ast, aft, placed, finish):
+	"""
+	Record the allocation of task index i to machine index m in the
+	workflow Solution, and on the Task object if the workflow has them.
+	"""
+	placed[i] = m
+	finish[i] = aft
+	machine = cw.machines[m]
+	if cw.tasks is not None:
+		task = cw.tasks[i]
+		task.machine = machine
+		task.ast = ast
+		task.aft = aft
+	wf.solution.allocate(cw.tids[i].item(), machine, ast, aft)
+
+
+def insertion_policy(wf, profiler=DISABLED):
 	"""
 	Allocate tasks to machines following the insertion based policy outline
 	in Tocuoglu et al.(2002)
 	"""
+	cw = wf.compile()
+	if cw.rank is None:
+		upward_rank(wf, profiler)
+	placed, finish = schedule_arrays(cw)
 	makespan = 0
-	# tasks = sort_tasks(wf, 'rank')
-	sorted_tasks = wf.sort_tasks('rank')
-	# tmp = wf.tasks
-	for task in sorted_tasks:
-		# Treat the first task differently, as it's the easiest to get the lowest cost
-		if task == list(wf.tasks)[0]:  # Convert networkx NodeView to list
-			m, w = min(
-				task.calculated_runtime.items(),
-				key=operator.itemgetter(1)
-			)
-			task.machine = m
-			task.ast = 0
-			task.aft = w
 
-			wf.solution.add_allocation(task=task, machine=m)
-		else:
-			aft = -1  # Finish time for the current task
-			m = 0
-			for machine in wf.env.machines:
-				# tasks in self.rank_sort are being updated, not wf.graph;
-				est = calc_est(wf, task, machine)
-				if aft == -1:  # assign initial value of aft for this task
-					aft = est + task.calculated_runtime[machine]
-					m = machine
-				# see if the next processor gives us an earlier finish time
-				elif est + task.calculated_runtime[machine] < aft:
-					aft = est + task.calculated_runtime[machine]
-					m = machine
-
-			task.machine = m
-			task.ast = aft - task.calculated_runtime[m]
-			task.aft = aft
-
-			if task.ast >= makespan:
-				makespan = task.aft
-
-			wf.solution.add_allocation(task=task, machine=m)
+	with profiler.timer('allocate'):
+		for i in rank_order(cw).tolist():
+			runtime = cw.runtime[i]
+			# Treat the first task differently, as it's the easiest to get the lowest cost
+			if i == 0:
+				m = int(np.argmin(runtime))
+				aft = runtime[m].item()
+				_allocate(wf, cw, i, m, 0, aft, placed, finish)
+			else:
+				eft = _earliest_finish_times(
+					wf, cw, i, runtime, placed, finish, profiler
+				)
+				# The first machine with the earliest finish time
+				m = int(np.argmin(eft))
+				aft = eft[m].item()
+				_allocate(
+					wf, cw, i, m, aft - runtime[m].item(), aft, placed, finish
+				)
+
+			makespan = max(makespan, aft)
+		profiler.count('allocate.tasks', cw.num_tasks)
 
 	wf.makespan = makespan
 	wf.solution.makespan = makespan
 	return makespan
 
 
-def insertion_policy_oct(wf, oct_rank_matrix):
+def insertion_policy_oct(wf, oct_table=None, profiler=DISABLED):
 	"""
 	Allocate tasks to machines following the insertion based policy outline
-	in Tocuoglu et al.(2002)
+	in Tocuoglu et al.(2002), choosing the machine that minimises the
+	optimistic EFT (EFT plus the task's OCT entry for that machine)
+	"""
+	if oct_table is None:
+		oct_table = upward_oct_rank(wf, profiler)
+	cw = wf.compile()
+	placed, finish = schedule_arrays(cw)
+	makespan = 0
+
+	with profiler.timer('allocate'):
+		for i in rank_order(cw).tolist():
+			runtime = cw.runtime[i]
+			if i == 0:
+				eft = runtime
+			else:
+				eft = _earliest_finish_times(
+					wf, cw, i, runtime, placed, finish, profiler
+				)
+			m = int(np.argmin(eft + oct_table[i]))
+			eft_m = eft[m].item()
+
+			_allocate(
+				wf, cw, i, m, eft_m - runtime[m].item(), eft_m, placed, finish
+			)
+			makespan = max(makespan, eft_m)
+		profiler.count('allocate.tasks', cw.num_tasks)
+
+	wf.solution.makespan = makespan
+	return makespan
+
+
+def insertion_policy_classes(wf, profiler=DISABLED):
 	"""
+	The insertion policy of insertion_policy(), with each class of
+	interchangeable machines (see CompiledWorkflow.machine_classes())
+	searched as a pool rather than machine by machine.
+
+	A task is placed exactly on the machines that hold its predecessors.
+	On every other machine of a class its input data is ready at the same
+	time, so the runtime and ready time are found once per class and the
+	task is only tried on the class's earliest-available machine, which is
+	kept at the top of a heap of machine end times. Gaps on the rest of the
+	pool are not searched, so the schedule can differ from
+	insertion_policy() when classes have several machines. Only the search
+	is pooled: the runtime matrix still holds a column for every machine.
+	"""
+	cw = wf.compile()
+	if cw.rank is None:
+		upward_rank(wf, profiler)
+	solution = wf.solution
+	classes, representatives = cw.machine_classes()
+	category = cw.comm.category[representatives]
+	# Heap of (end time, machine index) for each class. Entries are left in
+	# place when a machine's end time moves on, and dropped once they reach
+	# the top.
+	heaps = [[] for c in representatives.tolist()]
+	for m, c in enumerate(classes.tolist()):
+		heaps[c].append((solution._end[m].item(), m))
+	for heap in heaps:
+		heapq.heapify(heap)
+	placed, finish = schedule_arrays(cw)
+	makespan = 0
+
+	with profiler.timer('allocate'):
+		for i in rank_order(cw).tolist():
+			preds = cw.predecessors(i)
+			src = placed[preds][:, np.newaxis]
+			aft = finish[preds][:, np.newaxis]
+			data_size = cw.predecessor_data(i)[:, np.newaxis]
+			holders = sorted(set(src.ravel().tolist()))
+			candidates = []
+			if holders:
+				ready = (aft + cw.comm.transfer_times(
+					data_size, src, holders
+				)).max(axis=0)
+				candidates.extend(zip(holders, ready, cw.runtime[i, holders]))
+
+			ready = np.zeros(len(heaps), dtype=finish.dtype)
+			if len(preds):
+				ready = np.maximum(ready, (
+					aft + cw.comm.category_times(data_size, src, category)
+				).max(axis=0))
+			runtime = cw.runtime[i, representatives]
+			for c, heap in enumerate(heaps):
+				held = []
+				while heap:
+					end, m = heap[0]
+					if end != solution._end[m]:
+						heapq.heappop(heap)
+					elif m in holders:
+						held.append(heapq.heappop(heap))
+					else:
+						candidates.append((m, ready[c], runtime[c]))
+						break
+				for entry in held:
+					heapq.heappush(heap, entry)
+
+			best = None
+			for m, ready, runtime in candidates:
+				runtime = runtime.item()
+				ast = solution.earliest_start(cw.machines[m], ready.item(), runtime)
+				if best is None or (ast + runtime, m) < best[:2]:
+					best = (ast + runtime, m, ast)
+			aft, m, ast = best
+			end = solution._end[m]
+			_allocate(wf, cw, i, m, ast, aft, placed, finish)
+			if solution._end[m] != end:
+				heapq.heappush(heaps[classes[m]], (solution._end[m].item(), m))
+			makespan = max(makespan, aft)
+			profiler.count('allocate.est_evaluations', len(candidates))
+		profiler.count('allocate.tasks', cw.num_tasks)
+
+	wf.makespan = makespan
+	wf.solution.makespan = makespan
+	return makespan
 
+
+def insertion_policy_lookahead(wf, depth=1, profiler=DISABLED):
+	"""
+	The insertion policy with a lookahead, after Bittencourt, Sakellariou &
+	Madeira (2010). Before a task is allocated, each machine is tried on a
+	Snapshot of the schedule: the task is placed there, and its descendants
+	up to depth edges away are then placed after it with the insertion
+	policy, in rank order. The task is allocated to the machine on which the
+	latest of these finishes earliest; ties go to the machine with the
+	earlier finish time for the task itself, then to the first machine.
+
+	While looking ahead, data from predecessors that are not yet allocated
+	is ignored.
+
+	:param wf: Workflow to schedule
+	:param depth: Number of levels of descendants to look ahead to; with
+	depth 0 this is insertion_policy()
+	:param profiler: Optional Profiler that records the run
+	:return: The makespan of the resulting schedule
+	"""
+	cw = wf.compile()
+	if cw.rank is None:
+		upward_rank(wf, profiler)
+	solution = wf.solution
+	placed, finish = schedule_arrays(cw)
+	order = rank_order(cw)
+	position = np.empty(cw.num_tasks, dtype=np.int64)
+	position[order] = np.arange(cw.num_tasks)
 	makespan = 0
-	if not oct_rank_matrix:
-		upward_oct_rank(wf, oct_rank_matrix)
-	eft_matrix = dict()
-	oeft_matrix = dict()
-	m = None
-	sorted_tasks = wf.sort_tasks('rank')
-	for task in sorted_tasks:
-		if task == list(wf.tasks)[0]:
-			task.ast = 0
-			min_oeft = -1
-			for machine in wf.machine_alloc:
-				eft_matrix[(task, machine)] = task.calculated_runtime[machine] 
-				oeft_matrix[(task, machine)] = \
-					eft_matrix[(task, machine)] + oct_rank_matrix[(task, machine)]
-				if (min_oeft == -1) or \
-						(oeft_matrix[(task, machine)] < min_oeft):
-					min_oeft = oeft_matrix[(task, machine)]
-					m = machine
-			task.aft = task.calculated_runtime[m]
-			task.machine = m
-			wf.solution.add_allocation(task=task, machine=m)
-		else:
-			min_oeft = -1
-			for machine in wf.machine_alloc:
-				if wf.graph.predecessors(task):
-					est = calc_est(wf, task, machine)
-				else:
-					est = 0
-				eft = est + task.calculated_runtime[machine]
-				eft_matrix[(task, machine)] = eft
-
-				oeft_matrix[(task, machine)] = \
-					eft_matrix[(task, machine)] + oct_rank_matrix[(task, machine)]
-				if (min_oeft == -1) or \
-						(oeft_matrix[(task, machine)] < min_oeft):
-					min_oeft = oeft_matrix[(task, machine)]
-					m = machine
-
-			task.aft = eft_matrix[(task, m)]
-			task.ast = task.aft - task.calculated_runtime[m]
-			task.machine = m
-
-			if task.aft >= makespan:
-				makespan = task.aft
-			wf.solution.add_allocation(task=task, machine=m)
 
+	with profiler.timer('allocate'):
+		for i in order.tolist():
+			runtime = cw.runtime[i]
+			eft = _earliest_finish_times(
+				wf, cw, i, runtime, placed, finish, profiler
+			)
+			following = _descendants(cw, i, depth)
+			following = following[np.argsort(position[following])].tolist()
+			m = int(np.argmin(eft))
+			if following:
+				best = None
+				for k, aft in enumerate(eft.tolist()):
+					snapshot = solution.snapshot()
+					snapshot.allocate(cw.machines[k], aft - runtime[k].item(), aft)
+					placed[i], finish[i] = k, aft
+					latest = max(aft, _look_ahead(
+						cw, snapshot, following, placed, finish, profiler
+					))
+					if best is None or (latest, aft) < best[:2]:
+						best = (latest, aft, k)
+				m = best[2]
+				profiler.count('allocate.lookahead_tasks', len(following))
+			aft = eft[m].item()
+			_allocate(wf, cw, i, m, aft - runtime[m].item(), aft, placed, finish)
+			makespan = max(makespan, aft)
+		profiler.count('allocate.tasks', cw.num_tasks)
+
+	wf.makespan = makespan
 	wf.solution.makespan = makespan
 	return makespan
 
 
+def _descendants(cw, i, depth):
+	"""
+	:return: Array of the task indices up to depth edges below task index i
+	"""
+	found = []
+	frontier = np.array([i], dtype=np.int64)
+	for level in range(depth):
+		positions, _ = cw.successor_edges(frontier)
+		frontier = np.unique(cw.succ_idx[positions])
+		if len(frontier) == 0:
+			break
+		found.append(frontier)
+	if not found:
+		return frontier[:0]
+	return np.unique(np.concatenate(found))
+
+
+def _look_ahead(cw, snapshot, following, placed, finish, profiler):
+	"""
+	Place the tasks in following on the snapshot with the insertion policy,
+	in order, then restore placed and finish.
+
+	:return: The latest finish time of the tasks
+	"""
+	latest = 0
+	for j in following:
+		preds = cw.predecessors(j)
+		allocated = placed[preds] >= 0
+		preds = preds[allocated]
+		ready = data_ready_times(
+			placed[preds], finish[preds], cw.predecessor_data(j)[allocated],
+			cw.num_machines, finish.dtype, cw.comm
+		)
+		runtime = cw.runtime[j]
+		eft = snapshot.earliest_starts(ready, runtime, profiler) + runtime
+		m = int(np.argmin(eft))
+		aft = eft[m].item()
+		snapshot.allocate(cw.machines[m], aft - runtime[m].item(), aft)
+		placed[j], finish[j] = m, aft
+		latest = max(latest, aft)
+	placed[following] = -1
+	finish[following] = 0
+	return latest
+
+
+class _PartialCriticalPaths(object):
+	"""
+	State of an IC-PCP run, see pcp().
+
+	EST and LFT start from a forward and a backward pass over the levels of
+	the graph. Allocated tasks take their actual start time and runtime, and
+	keep their LFT unless they finish after it. After a path is allocated,
+	the LFTs of the tasks before it are revised from their children,
+	visiting only tasks whose children moved. The ESTs of the tasks after
+	it are only marked out of date, and are revised from their parents when
+	they are next needed. Edges into or out of an unallocated task cost the
+	HEFT average communication cost.
+	"""
+
+	def __init__(self, wf, cw, deadline):
+		self.wf = wf
+		self.cw = cw
+		self.solution = wf.solution
+		self.prices = machine_prices(wf)
+		self.placed, self.finish = schedule_arrays(cw)
+		fastest = cw.runtime.min(axis=1)
+		comm = cw.average_comm
+
+		est = np.zeros(cw.num_tasks, dtype=np.result_type(fastest, comm))
+		for level in reversed(cw.reverse_levels()):
+			edges, counts = cw.predecessor_edges(level)
+			preds = cw.pred_idx[edges]
+			est[level] = segment_max(
+				est[preds] + fastest[preds] + comm[cw.pred_eid[edges]], counts
+			)
+		if deadline is None:
+			deadline = (est + fastest).max(initial=0).item()
+		self.deadline = deadline
+		lft = np.zeros(cw.num_tasks, dtype=np.result_type(est, deadline))
+		for level in cw.reverse_levels():
+			edges, counts = cw.successor_edges(level)
+			succs = cw.succ_idx[edges]
+			lft[level] = -segment_max(
+				comm[edges] + fastest[succs] - lft[succs], counts, -deadline
+			)
+
+		self.est = est.tolist()
+		self.lft = lft.tolist()
+		self.runtime = fastest.tolist()
+		self.assigned = [False] * cw.num_tasks
+		self.stale = [False] * cw.num_tasks
+		self.level = cw.level_numbers().tolist()
+		self.pred_ptr = cw.pred_ptr.tolist()
+		self.pred_idx = cw.pred_idx.tolist()
+		self.pred_comm = comm[cw.pred_eid].tolist()
+		self.succ_ptr = cw.succ_ptr.tolist()
+		self.succ_idx = cw.succ_idx.tolist()
+		self.succ_comm = comm.tolist()
+
+	def _arrival(self, p, k):
+		# Time at which the data on predecessor entry k, from p, arrives
+		return self._est(p) + self.runtime[p] + self.pred_comm[k]
+
+	def critical_parent(self, t):
+		"""
+		:return: The unallocated parent of task index t whose data arrives
+		last, or None if every parent is allocated
+		"""
+		parent, latest = None, None
+		for k in range(self.pred_ptr[t], self.pred_ptr[t + 1]):
+			p = self.pred_idx[k]
+			if not self.assigned[p]:
+				arrival = self._arrival(p, k)
+				if latest is None or arrival > latest:
+					parent, latest = p, arrival
+		return parent
+
+	def partial_critical_path(self, t):
+		"""
+		:return: List of task indices, from the first critical parent of t
+		back to a task with no unallocated parents, in topological order
+		"""
+		path = []
+		parent = t
+		while True:
+			parent = self.critical_parent(parent)
+			if parent is None:
+				break
+			path.append(parent)
+		path.reverse()
+		return path
+
+	def assign_all(self, profiler=DISABLED):
+		"""
+		Allocate every task. The exit tasks are treated as the parents of a
+		single virtual exit task, whose critical parent is the exit task
+		that finishes last.
+		"""
+		exits = [
+			(-(self.est[t] + self.runtime[t]), t)
+			for t in range(self.cw.num_tasks)
+			if self.succ_ptr[t] == self.succ_ptr[t + 1]
+		]
+		heapq.heapify(exits)
+		while exits:
+			finish, t = heapq.heappop(exits)
+			if self.assigned[t]:
+				continue
+			# Exit tasks are taken in order of their finish times, which are
+			# brought up to date as they reach the front
+			latest = self._est(t) + self.runtime[t]
+			if latest != -finish:
+				heapq.heappush(exits, (-latest, t))
+				continue
+			path = self.partial_critical_path(t)
+			path.append(t)
+			self.assign_parents(path, profiler)
+
+	def retime(self):
+		"""
+		Allocate every task again on its machine, parents before children
+		and otherwise in order of start time. A path that could not meet
+		its LFTs may finish after a child that was allocated before it; the
+		child then starts later. Tasks whose parents all finish in time
+		keep their start time, or move into an earlier gap.
+		"""
+		cw = self.cw
+		placed, finish = self.placed, self.finish
+		start = (finish - cw.runtime[np.arange(cw.num_tasks), placed]).tolist()
+		self.wf.solution = Solution(machines=cw.machines)
+		waiting = np.diff(cw.pred_ptr).tolist()
+		ready = [(start[t], t) for t in range(cw.num_tasks) if waiting[t] == 0]
+		heapq.heapify(ready)
+		while ready:
+			t = heapq.heappop(ready)[1]
+			m = placed[t].item()
+			preds = cw.predecessors(t)
+			arrival = finish[preds] + cw.comm.transfer_times(
+				cw.predecessor_data(t), placed[preds], m
+			)
+			runtime = cw.runtime[t, m].item()
+			ast = self.wf.solution.earliest_start(
+				cw.machines[m], arrival.max(initial=0).item(), runtime
+			)
+			_allocate(self.wf, cw, t, m, ast, ast + runtime, placed, finish)
+			for s in self.succ_idx[self.succ_ptr[t]:self.succ_ptr[t + 1]]:
+				waiting[s] -= 1
+				if waiting[s] == 0:
+					heapq.heappush(ready, (start[s], s))
+
+	def assign_parents(self, path, profiler):
+		"""
+		Allocate path, then the partial critical paths of each of its tasks
+		in turn, depth first
+		"""
+		self.assign_path(path, profiler)
+		stack = list(reversed(path))
+		while stack:
+			t = stack.pop()
+			path = self.partial_critical_path(t)
+			if path:
+				self.assign_path(path, profiler)
+				# Return to t once the new path's parents are allocated
+				stack.append(t)
+				stack.extend(reversed(path))
+
+	def assign_path(self, path, profiler):
+		"""
+		Allocate every task of path to the same machine: the cheapest one on
+		which each task finishes by its LFT, otherwise the one on which the
+		path is least late. Tasks on the path are allocated one after
+		another, so each starts after the previous one finishes and the
+		earlier tasks never occupy a slot that a later one could use.
+		"""
+		cw = self.cw
+		placed, finish = self.placed, self.finish
+		previous = np.zeros(cw.num_machines, dtype=finish.dtype)
+		cost = np.zeros(cw.num_machines)
+		late = np.full(cw.num_machines, -np.inf)
+		starts = []
+		for k, t in enumerate(path):
+			preds = cw.predecessors(t)
+			data_size = cw.predecessor_data(t)
+			if k:
+				# The previous task of the path is on the same machine
+				other = preds != path[k - 1]
+				preds, data_size = preds[other], data_size[other]
+			# Allocated tasks have their actual start and runtime
+			aft = np.array(
+				[self._est(p) + self.runtime[p] for p in preds.tolist()],
+				dtype=np.result_type(finish, self.est[0])
+			)
+			ready = np.maximum(data_ready_times(
+				placed[preds], aft, data_size, cw.num_machines, finish.dtype,
+				cw.comm
+			), previous)
+			runtime = cw.runtime[t]
+			start = self.solution.earliest_starts(ready, runtime, profiler)
+			previous = start + runtime
+			cost += runtime * self.prices
+			late = np.maximum(late, previous - self.lft[t])
+			starts.append(start)
+		feasible = late <= 0
+		if feasible.any():
+			order = np.lexsort((previous, np.where(feasible, cost, np.inf)))
+		else:
+			order = np.lexsort((cost, late))
+		m = int(order[0])
+		profiler.count('allocate.paths')
+		profiler.count('allocate.est_evaluations', len(path) * cw.num_machines)
+
+		for t, start in zip(path, starts):
+			ast = start[m].item()
+			aft = ast + cw.runtime[t, m].item()
+			_allocate(self.wf, cw, t, m, ast, aft, placed, finish)
+			self.assigned[t] = True
+			self.est[t] = ast
+			self.lft[t] = max(self.lft[t], aft)
+			self.runtime[t] = aft - ast
+		self._invalidate_est(path)
+		self._update_lft(path)
+
+	def _invalidate_est(self, path):
+		"""
+		Mark the ESTs of the unallocated tasks after the path as out of
+		date. The unallocated descendants of a marked task are always
+		marked too, so the walk stops at tasks that are already marked.
+		"""
+		stack = list(path)
+		while stack:
+			t = stack.pop()
+			for s in self.succ_idx[self.succ_ptr[t]:self.succ_ptr[t + 1]]:
+				if not self.assigned[s] and not self.stale[s]:
+					self.stale[s] = True
+					stack.append(s)
+
+	def _est(self, t):
+		"""
+		:return: The EST of task index t, first revising any out of date
+		ESTs it depends on, parents before children
+		"""
+		if not self.stale[t]:
+			return self.est[t]
+		stack = [t]
+		while stack:
+			t = stack[-1]
+			parents = self.pred_idx[self.pred_ptr[t]:self.pred_ptr[t + 1]]
+			stale = [p for p in parents if self.stale[p]]
+			if stale:
+				stack.extend(stale)
+				continue
+			stack.pop()
+			if self.stale[t]:
+				self.est[t] = max((
+					self._arrival(self.pred_idx[k], k)
+					for k in range(self.pred_ptr[t], self.pred_ptr[t + 1])
+				), default=0)
+				self.stale[t] = False
+		return self.est[t]
+
+	def _update_lft(self, path):
+		"""
+		Revise the LFTs of the unallocated tasks before the path, children
+		before parents
+		"""
+		heap = []
+		queued = set()
+		for t in path:
+			self._queue_parents(t, heap, queued)
+		while heap:
+			t = heapq.heappop(heap)[1]
+			queued.discard(t)
+			lft = self.deadline
+			for k in range(self.succ_ptr[t], self.succ_ptr[t + 1]):
+				s = self.succ_idx[k]
+				lft = min(lft, self.lft[s] - self.runtime[s] - self.succ_comm[k])
+			if lft != self.lft[t]:
+				self.lft[t] = lft
+				self._queue_parents(t, heap, queued)
+
+	def _queue_parents(self, t, heap, queued):
+		for k in range(self.pred_ptr[t], self.pred_ptr[t + 1]):
+			p = self.pred_idx[k]
+			if not self.assigned[p] and p not in queued:
+				queued.add(p)
+				heapq.heappush(heap, (self.level[p], p))
+
+
+def _pareto_front(makespan, cost, size):
+	"""
+	:return: Array of the indices of the candidates that no other candidate
+	dominates on (makespan, cost), keeping the first of any duplicates; if
+	there are more than size, those with the largest crowding distance
+	"""
+	order = np.lexsort((cost, makespan))
+	cheapest = np.minimum.accumulate(cost[order])
+	kept = order[np.concatenate(([True], cost[order][1:] < cheapest[:-1]))]
+	if len(kept) > size:
+		values = np.column_stack((makespan[kept], cost[kept]))
+		distance = crowding_distance(values, np.zeros(len(kept), dtype=np.int64))
+		kept = np.sort(kept[np.argsort(-distance, kind='stable')[:size]])
+	return kept
+
+
+# Number of tasks in each block of a _PartialSchedule
+_BLOCK = 64
+
+
+class _PartialSchedule(object):
+	"""
+	A schedule of the first tasks in rank order, for mols(). Tasks are
+	referred to by their position in rank order. The machine index and
+	finish time of each task are stored in blocks of _BLOCK tasks; extend()
+	shares every block but the one it writes to with the schedule it
+	extends.
+	"""
+	__slots__ = ('timelines', 'machines', 'finish', 'makespan', 'cost')
+
+	def __init__(self, timelines, machines, finish, makespan, cost):
+		self.timelines = timelines
+		self.machines = machines
+		self.finish = finish
+		self.makespan = makespan
+		self.cost = cost
+
+	def lookup(self, positions):
+		"""
+		:return: (machine indices, finish times) lists of the tasks at the
+		given positions
+		"""
+		machines, finish = [], []
+		for k in positions:
+			b, j = divmod(k, _BLOCK)
+			machines.append(self.machines[b][j])
+			finish.append(self.finish[b][j])
+		return machines, finish
+
+	def extend(self, k, m, machine, ast, aft, makespan, cost):
+		"""
+		:return: A new partial schedule with the task at position k allocated
+		to machine index m between ast and aft
+		"""
+		timelines = self.timelines.snapshot()
+		timelines.allocate(machine, ast, aft)
+		b, j = divmod(k, _BLOCK)
+		machines, finish = list(self.machines), list(self.finish)
+		if j == 0:
+			machines.append([m])
+			finish.append([aft])
+		else:
+			machines[b] = machines[b] + [m]
+			finish[b] = finish[b] + [aft]
+		return _PartialSchedule(timelines, machines, finish, makespan, cost)
+
+
+def _earliest_finish_times(wf, cw, i, runtime, placed, finish, profiler):
+	"""
+	:return: Array of the earliest finish time of task index i on each
+	machine, given the tasks allocated so far
+	"""
+	with profiler.timer('allocate.ready_times'):
+		ready = ready_times(cw, i, placed, finish)
+	with profiler.timer('allocate.earliest_starts'):
+		eft = wf.solution.earliest_starts(ready, runtime, profiler) + runtime
+	if profiler:
+		profiler.count('allocate.est_evaluations', cw.num_machines)
+		profiler.count('allocate.predecessors', len(cw.predecessors(i)))
+	return eft
+
+
+def reschedule(wf, time, runtimes=None, unavailable=None, profiler=DISABLED):
+	"""
+	Revise a HEFT schedule at a change point, rather than scheduling the
+	whole workflow again. Allocations that start before time are kept;
+	every task that starts at or after time is allocated again with the
+	insertion policy, in rank order, no earlier than time.
+
+	Revised runtimes update the ranks of the revised tasks and their
+	ancestors only. A revised task that is already running keeps its start
+	time and finishes after its new runtime. Tasks running on a machine
+	that drops out are lost and allocated again, and the machine receives
+	no further allocations. Ranks keep averaging over every machine of the
+	environment, as the workflow itself does not change.
+
+	:param wf: Workflow that has been scheduled with heft()
+	:param time: The change point
+	:param runtimes: Optional {task id: new runtime} dictionary, with either
+	a single runtime or one per machine for each task
+	:param unavailable: Optional list of machine names that drop out at time
+	:param profiler: Optional Profiler that records the replanning
+	:return: The makespan of the revised schedule
+	"""
+	cw = wf.compile()
+	if cw.placed is None or cw.rank is None:
+		raise RuntimeError('Workflow must be scheduled before rescheduling')
+	solution = wf.solution
+
+	with profiler.run('reschedule'):
+		if runtimes:
+			revised = [wf.update_runtime(tid, r) for tid, r in runtimes.items()]
+			with profiler.timer('rank'):
+				ranked = update_ranks(wf, revised)
+			profiler.count('rank.tasks', len(ranked))
+			# Running tasks finish according to their new runtime
+			for i in revised:
+				tid = cw.tids[i].item()
+				machine, a = solution.find_alloc(tid)
+				if a.ast < time < a.aft:
+					m = cw.machine_index[machine]
+					solution.remove_allocation(tid, machine)
+					aft = a.ast + cw.runtime[i, m].item()
+					_allocate(wf, cw, i, m, a.ast, aft, cw.placed, cw.finish)
+
+		removed = solution.allocations_from(time)
+		for machine in unavailable or []:
+			solution.unavailable.add(machine)
+			# Tasks that were running on the machine are lost
+			removed.extend(
+				(machine, a) for a in solution.list_machine_allocations(machine)
+				if a.ast < time < a.aft
+			)
+		for machine, a in removed:
+			solution.remove_allocation(a.tid, machine)
+		affected = np.array(
+			[cw.task_index[a.tid] for m, a in removed], dtype=np.int64
+		)
+		cw.placed[affected] = -1
+		cw.finish[affected] = 0
+		profiler.count('allocate.tasks', len(affected))
+
+		available = np.ones(cw.num_machines, dtype=bool)
+		for machine in solution.unavailable:
+			available[cw.machine_index[machine]] = False
+		if not available.any():
+			raise RuntimeError('No machines are available for rescheduling')
+
+		with profiler.timer('allocate'):
+			order = affected[np.lexsort((affected, -cw.rank[affected]))]
+			for i in order.tolist():
+				runtime = cw.runtime[i]
+				ready = np.maximum(ready_times(cw, i, cw.placed, cw.finish), time)
+				eft = solution.earliest_starts(ready, runtime, profiler) + runtime
+				m = int(np.argmin(np.where(available, eft, np.inf)))
+				aft = eft[m].item()
+				_allocate(
+					wf, cw, i, m, aft - runtime[m].item(), aft,
+					cw.placed, cw.finish
+				)
+
+	makespan = cw.finish.max().item()
+	wf.makespan = makespan
+	solution.makespan = makespan
+	return makespan
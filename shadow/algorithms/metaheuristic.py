@@ -21,9 +21,17 @@
 
 import networkx as nx
 import itertools
+import multiprocessing
 import random
+from concurrent.futures import ProcessPoolExecutor
 
+import numpy as np
+
+from shadow.algorithms.fitness import Schedules, machine_prices, \
+	natural_units, run_objectives, non_dom_sort, dominates, crowding_distance
+from shadow.algorithms.heuristic import upward_rank, rank_order
 from shadow.classes.solution import Solution, Allocation
+from shadow.classes.workflow import CompiledWorkflow, segment_max
 
 # TODO; initial setup required for a genetic algorithm
 # TODO; initial setup required for an evolutionary algorithm 6
@@ -44,8 +52,12 @@ The two differ on evaluation and selection strategy
 
 RAND_BOUNDS = 1000
 
+# Default objectives of the metaheuristics (see fitness.objective_set)
+OBJECTIVES = ('time', 'cost')
+
 
-def nsga2(wf, seed, generations=100, popsize=100):
+def nsga2(wf, seed, generations=100, popsize=100, crossover_rate=0.9,
+		mutation_rate=None, workers=1, chunk_size=32, objectives=OBJECTIVES):
 	"""
 	Apply non-dominated sort to P
 	Binary tournament selection to create population Q, size N
@@ -70,114 +82,420 @@ def nsga2(wf, seed, generations=100, popsize=100):
 		mutate the offspring
 		evaluate the quality of the solutions
 		select individuals to carry over to the new population
-	"""
-
-	objectives = []
-	# Create a random parent population P size N
-	n = popsize
-	pop = generate_population(wf, seed, n)
-	fronts = non_dom_sort(pop, objectives)
-	Q = binary_tournament_rank(fronts)
-	mutation()
-	crossover()
-	g = 0
-	while g < generations:
-		new_pop = []
-		R = pop + Q
-		non_dom_sort(R, objectives)
-		crowding_distance(R)
-		for soln in R:
-			if len(new_pop) < popsize:
-				new_pop.append(soln)
 
-	return None
-
-
-def spea2(wf, seed):
-	generate_population(wf, seed)
-	return None
+	The objectives are named in fitness.objective_set, and default to
+	makespan ('time') and cost.
+
+	:param wf: Workflow with an environment
+	:param seed: Random seed
+	:param generations: Number of generations
+	:param popsize: Population size N
+	:param crossover_rate: Probability that a pair of parents is crossed over
+	:param mutation_rate: Probability that each task is mutated (default is
+	1 / number of tasks)
+	:param workers: Number of processes that evaluate the population (see
+	PopulationEvaluator); the result does not depend on it
+	:param chunk_size: Number of individuals evaluated by a process at a time
+	:param objectives: Names of the objectives
+	:return: The solutions of the first front of the final population,
+	ordered by their objectives
+	"""
+	rng = np.random.default_rng(seed)
+	cw = wf.compile()
+	if mutation_rate is None:
+		mutation_rate = 1 / cw.num_tasks
+	exec_order, task_assign = generate_population(wf, popsize, seed)
+	with PopulationEvaluator(wf, workers, chunk_size, objectives) as evaluate:
+		values = evaluate(exec_order, task_assign)
+		ranks = non_dom_sort(values)
+		distance = crowding_distance(values, ranks)
+
+		for g in range(generations):
+			parents = binary_tournament(ranks, distance, popsize + popsize % 2, rng)
+			child_order, child_assign = crossover(
+				cw, exec_order[parents], task_assign[parents], rng, crossover_rate
+			)
+			child_order, child_assign = child_order[:popsize], child_assign[:popsize]
+			mutation(cw, child_order, child_assign, rng, mutation_rate)
+
+			exec_order = np.concatenate((exec_order, child_order))
+			task_assign = np.concatenate((task_assign, child_assign))
+			values = np.concatenate((
+				values, evaluate(child_order, child_assign)
+			))
+			ranks = non_dom_sort(values)
+			distance = crowding_distance(values, ranks)
+			# Fill by front, and the last front by decreasing crowding distance
+			survivors = np.lexsort((-distance, ranks))[:popsize]
+			exec_order, task_assign = exec_order[survivors], task_assign[survivors]
+			values = values[survivors]
+			ranks, distance = ranks[survivors], distance[survivors]
+
+	front = np.flatnonzero(ranks == 0)
+	solutions = _front_solutions(
+		wf, exec_order, task_assign, objectives, values, front
+	)
+	for soln, i in zip(solutions, soln_order(values, front).tolist()):
+		soln.crowding_dist = distance[i].item()
+	return solutions
+
+
+def spea2(wf, seed, generations=100, popsize=100, archive_size=None,
+		crossover_rate=0.9, mutation_rate=None, workers=1, chunk_size=32,
+		objectives=OBJECTIVES):
+	"""
+	SPEA2, from Zitzler, Laumanns & Thiele (2001)
+
+	Generate an initial population P and an empty archive A
+	For each generation:
+		Calculate the fitness of every solution in P + A
+		Copy the non-dominated solutions of P + A to the next archive. If
+		there are too many, truncate the archive; if there are too few, fill
+		it with the best dominated solutions
+		Binary tournament selection on the archive to create the mating pool
+		crossover and mutation of the mating pool give the next P
+
+	The objectives are named in fitness.objective_set, as in nsga2.
+
+	:param wf: Workflow with an environment
+	:param seed: Random seed
+	:param generations: Number of generations
+	:param popsize: Population size
+	:param archive_size: Archive size (default popsize)
+	:param crossover_rate: Probability that a pair of parents is crossed over
+	:param mutation_rate: Probability that each task is mutated (default is
+	1 / number of tasks)
+	:param workers: Number of processes that evaluate the population (see
+	PopulationEvaluator); the result does not depend on it
+	:param chunk_size: Number of individuals evaluated by a process at a time
+	:param objectives: Names of the objectives
+	:return: The non-dominated solutions of the final archive, ordered by
+	their objectives
+	"""
+	rng = np.random.default_rng(seed)
+	cw = wf.compile()
+	if mutation_rate is None:
+		mutation_rate = 1 / cw.num_tasks
+	if archive_size is None:
+		archive_size = popsize
+	exec_order, task_assign = generate_population(wf, popsize, seed)
+	with PopulationEvaluator(wf, workers, chunk_size, objectives) as evaluate:
+		values = evaluate(exec_order, task_assign)
+		for g in range(generations + 1):
+			fitness, distance = spea2_fitness(values)
+			archive = environmental_selection(fitness, distance, archive_size)
+			exec_order, task_assign = exec_order[archive], task_assign[archive]
+			values, fitness = values[archive], fitness[archive]
+			if g == generations:
+				break
+			# The tournament is won by the lower fitness
+			parents = binary_tournament(
+				fitness, np.zeros(len(fitness)), popsize + popsize % 2, rng
+			)
+			child_order, child_assign = crossover(
+				cw, exec_order[parents], task_assign[parents], rng, crossover_rate
+			)
+			child_order, child_assign = child_order[:popsize], child_assign[:popsize]
+			mutation(cw, child_order, child_assign, rng, mutation_rate)
+
+			exec_order = np.concatenate((exec_order, child_order))
+			task_assign = np.concatenate((task_assign, child_assign))
+			values = np.concatenate((
+				values, evaluate(child_order, child_assign)
+			))
+
+	front = np.flatnonzero(fitness < 1)
+	return _front_solutions(
+		wf, exec_order, task_assign, objectives, values, front
+	)
+
+
+def soln_order(values, members):
+	"""
+	:return: members, ordered by their first objective, then their second...
+	"""
+	return members[np.lexsort(values[members].T[::-1])]
 
 
-def generate_population(wf, size, seed, skip_limit):
+def _front_solutions(wf, exec_order, task_assign, objectives, values, members):
+	"""
+	Decode the non-dominated members of a population, ordered by their
+	objectives
+	"""
+	solutions = []
+	members = soln_order(values, members)
+	natural = natural_units(objectives, values[members])
+	for i, row in zip(members.tolist(), natural.tolist()):
+		soln = decode(wf, exec_order[i], task_assign[i])
+		soln.nondom_rank = 0
+		soln.objectives = dict(zip(objectives, row))
+		solutions.append(soln)
+	return solutions
+
+
+def generate_population(wf, size, seed, rank_noise=0.2):
 	"""
 	task_assign[0] is the resource to which Task0 is assigned
 	task_order[0] is the task that will be executed first
 
-	each 'solution' should be a tuple of a task-assign and exec-order solution
-
-	In the future it might be useful, in addition to checking feasibility of solution, to minimise duplicates of the population generated. Not sure about this.
+	A population is held as two integer arrays with one row per individual:
+	its execution order (task indices, in a topological order) and its task
+	assignment (the machine index of each task index). The first individual
+	follows the upward rank order and the others a randomly perturbed rank
+	order (see sample_exec_orders); every task assignment is random.
+
+	:param wf: Workflow with an environment
+	:param size: Number of individuals
+	:param seed: Random seed
+	:param rank_noise: Perturbation of the upward ranks of the sampled orders
+	:return: (exec_order, task_assign), both (size, n_tasks) arrays
 	"""
-	pop = [Solution() for x in range(size)]
-
-	exec_order = generate_exec_orders(wf, size, seed, skip_limit)
-
-	# Generate a list of task/resource assignments
-
-	task_assign = generate_allocations(wf, size, 4, seed)
-
-	if len(pop) != len(exec_order) or len(pop) != len(task_assign):
-		return None
+	cw = wf.compile()
+	if cw.rank is None:
+		upward_rank(wf)
+	rng = np.random.default_rng(seed)
+	exec_order = np.empty((size, cw.num_tasks), dtype=np.int64)
+	exec_order[:1] = rank_order(cw)
+	exec_order[1:] = sample_exec_orders(cw, size - 1, rng, rank_noise)
+	task_assign = rng.integers(0, cw.num_machines, (size, cw.num_tasks))
+	return exec_order, task_assign
+
+
+def sample_exec_orders(cw, size, rng, rank_noise=None):
+	"""
+	Draw random execution orders without enumerating topological sorts.
+
+	Each task is given a random priority, and its sort key is the largest
+	priority among the task and its ancestors, so that keys never decrease
+	along an edge. Sorting on the key, with ties going to the task whose
+	level comes first, gives a topological order. Keys are propagated one
+	level at a time for every order at once, so each order costs O(V + E).
+
+	:param cw: CompiledWorkflow
+	:param size: Number of orders
+	:param rng: numpy Generator
+	:param rank_noise: If None, priorities are uniformly random. Otherwise
+	the upward rank (which must be set) is scaled by a random factor between
+	1 and 1 + rank_noise, and tasks with higher rank go first; a rank_noise
+	of 0 gives the upward rank order.
+	:return: (size, n_tasks) array of task indices
+	"""
+	if rank_noise is None:
+		key = rng.random((size, cw.num_tasks))
 	else:
-		for soln in pop:
-			soln.exec_order = exec_order.pop()
-			soln.task_assign = task_assign.pop()
-
-	return pop
-
-
-# How can we test non-domination? Need to get a testing set together for our HEFT graph
-
-def non_dom_sort(pop, objectives):
-	front = {0: []}
-	dominated = {}
-	for p in pop:
-		p.dom_counter = 0  # reset between different sorts, as may have changed
-		for q in pop:
-			if dominates(p, q, objectives):  # if p dominates q
-				if p not in dominated:
-					dominated[p] = [q]
-				else:
-					dominated[p] += [q]  # add q to set of soln dominated by p
-			elif dominates(q, p, objectives):
-				p.dom_counter += 1  # This determines if it has been dominated
-		if p.dom_counter == 0:
-			p.nondom_rank = 1
-			front[0].append(p)
-
-	i = 1
+		noise = 1 + rank_noise * rng.random((size, cw.num_tasks))
+		key = -cw.rank * noise
+	for level in reversed(cw.reverse_levels()):
+		positions, counts = cw.predecessor_edges(level)
+		if len(positions):
+			inherited = segment_max(
+				key[:, cw.pred_idx[positions]].T, counts, initial=-np.inf
+			)
+			key[:, level] = np.maximum(key[:, level], inherited.T)
+	level = np.broadcast_to(-cw.level_numbers(), key.shape)
+	return np.lexsort((level, key), axis=-1)
+
+
+def decode_population(cw, exec_order, task_assign):
+	"""
+	Build the schedules of a population. Each individual visits its tasks
+	in its execution order, and each task starts as soon as its input data
+	has arrived and its machine has finished the tasks placed on it before.
+	Step k places the k-th task of every individual at once.
+
+	Nothing is written to the workflow's Tasks, so individuals do not
+	interfere with each other.
+
+	:param cw: CompiledWorkflow
+	:param exec_order: (n_individuals, n_tasks) array of task indices
+	:param task_assign: (n_individuals, n_tasks) array of machine indices
+	:return: (start, finish) arrays of the start and finish time of each
+	task index, one row per individual
+	"""
+	size, n = exec_order.shape
+	rows = np.arange(size)
+	dtype = cw.time_type
+	start = np.zeros((size, n), dtype=dtype)
+	finish = np.zeros((size, n), dtype=dtype)
+	available = np.zeros((size, cw.num_machines), dtype=dtype)
+	pred_data = cw.data_size[cw.pred_eid]
+	for k in range(n):
+		task = exec_order[:, k]
+		machine = task_assign[rows, task]
+		st = available[rows, machine]
+		positions, counts = cw.predecessor_edges(task)
+		if len(positions):
+			owner = np.repeat(rows, counts)
+			pred = cw.pred_idx[positions]
+			transfer = cw.comm.transfer_times(
+				pred_data[positions], task_assign[owner, pred], machine[owner]
+			)
+			arrival = finish[owner, pred] + transfer
+			st = np.maximum(st, segment_max(arrival, counts))
+		aft = st + cw.runtime[task, machine]
+		start[rows, task] = st
+		finish[rows, task] = aft
+		available[rows, machine] = aft
+	return start, finish
+
+
+def evaluate_population(wf, exec_order, task_assign, objectives=OBJECTIVES):
+	"""
+	:return: (n_individuals, n_objectives) array of the objectives of each
+	individual, negated where they are maximised (see
+	fitness.run_objectives)
+	"""
+	return _objectives(
+		wf.compile(), machine_prices(wf), objectives, exec_order, task_assign
+	)
 
-	if i in front:
-		Q = []
-		for p in front[i]:
-			for q in dominated[p]:
-				q.dom_counter -= 1
-				if q.dom_counter == 0:
-					q.nondom_rank = i + 1
-					Q.append(q)
-		i += 1
-		front[i] = Q
 
-	return None
+def _objectives(cw, prices, objectives, exec_order, task_assign):
+	start, finish = decode_population(cw, exec_order, task_assign)
+	schedules = Schedules(start, finish, task_assign, prices)
+	return run_objectives(objectives, schedules, minimise=True)
 
 
-def dominates(p, q, objective_set):
+class PopulationEvaluator(object):
 	"""
-	Checks if the given solution 'p' dominates 'q' for each objective outlined
-	in 'objective set'
+	Evaluates populations across a pool of worker processes.
+
+	The arrays of the compiled workflow are sent to each worker once, when
+	it starts (workers that are forked inherit them without copying).
+	Populations are then split into chunks of chunk_size individuals, and
+	only the chunks and their objectives pass between processes.
+
+	Evaluation draws no random numbers: all of the randomness of a
+	metaheuristic stays in the parent process, and the objectives of the
+	chunks are put back in population order. Results are therefore the same
+	for any number of workers.
+
+	:param wf: Workflow with an environment
+	:param workers: Number of worker processes (defaults to the CPU count);
+	with 1 worker populations are evaluated in this process
+	:param chunk_size: Number of individuals in each chunk
+	:param objectives: Names of the objectives (keys of fitness.objective_set)
 	"""
 
-	return True
+	def __init__(self, wf, workers=None, chunk_size=32, objectives=OBJECTIVES):
+		self.cw = wf.compile()
+		self.prices = machine_prices(wf)
+		self.objectives = list(objectives)
+		self.chunk_size = chunk_size
+		self.executor = None
+		if workers != 1:
+			cw = self.cw
+			arrays = (
+				cw.tids, cw.machines, cw.runtime, cw.succ_ptr, cw.succ_idx,
+				cw.data_size, (cw.pred_ptr, cw.pred_idx, cw.pred_eid), cw.comm
+			)
+			self.executor = ProcessPoolExecutor(
+				max_workers=workers, mp_context=_pool_context(),
+				initializer=_init_worker,
+				initargs=(arrays, self.prices, self.objectives)
+			)
+
+	def __call__(self, exec_order, task_assign):
+		"""
+		:return: (n_individuals, n_objectives) array, as evaluate_population
+		"""
+		if self.executor is None:
+			return _objectives(
+				self.cw, self.prices, self.objectives, exec_order, task_assign
+			)
+		starts = range(0, len(exec_order), self.chunk_size)
+		chunks = self.executor.map(
+			_evaluate_chunk,
+			[exec_order[k:k + self.chunk_size] for k in starts],
+			[task_assign[k:k + self.chunk_size] for k in starts]
+		)
+		if not len(starts):
+			return np.zeros((0, len(self.objectives)))
+		return np.concatenate(list(chunks))
+
+	def close(self):
+		if self.executor is not None:
+			self.executor.shutdown()
+			self.executor = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+		return False
+
+
+def _pool_context():
+	# Forked workers inherit the workflow arrays instead of unpickling them
+	if 'fork' in multiprocessing.get_all_start_methods():
+		return multiprocessing.get_context('fork')
+	return multiprocessing.get_context()
+
+
+# The workflow of a worker process, set by _init_worker
+_worker = None
+
+
+def _init_worker(arrays, prices, objectives):
+	global _worker
+	tids, machines, runtime, succ_ptr, succ_idx, data_size, pred, comm = arrays
+	cw = CompiledWorkflow(
+		tids, machines, runtime, succ_ptr, succ_idx, data_size, pred=pred,
+		comm=comm
+	)
+	_worker = (cw, prices, objectives)
+
+
+def _evaluate_chunk(exec_order, task_assign):
+	cw, prices, objectives = _worker
+	return _objectives(cw, prices, objectives, exec_order, task_assign)
+
+
+def decode(wf, exec_order, task_assign):
+	"""
+	Build the Solution of a single individual
 
+	:param wf: Workflow with an environment
+	:param exec_order: Array of task indices, in a topological order
+	:param task_assign: Array of the machine index of each task index
+	:return: NSGASolution with makespan and solution_cost set
+	"""
+	cw = wf.compile()
+	exec_order, task_assign = np.asarray(exec_order), np.asarray(task_assign)
+	start, finish = decode_population(
+		cw, exec_order[np.newaxis], task_assign[np.newaxis]
+	)
+	soln = NSGASolution(machines=cw.machines)
+	soln.exec_order = exec_order
+	soln.task_assign = task_assign
+	tids = cw.tids.tolist()
+	for i in exec_order.tolist():
+		soln.allocate(
+			tids[i], cw.machines[task_assign[i]],
+			start[0, i].item(), finish[0, i].item()
+		)
+	soln.makespan = finish.max().item()
+	soln.solution_cost = calc_solution_cost(soln, wf)
+	return soln
 
-def binary_tournament(pop):
-	return None
 
+def binary_tournament(ranks, distance, size, rng):
+	"""
+	Select size parents, each the winner of a tournament between two random
+	solutions under the crowded comparison operator: the lower front wins,
+	then the larger crowding distance.
 
-def binary_tournament_rank(pop):
-	return None
+	:return: Array of the indices of the selected solutions
+	"""
+	a, b = rng.integers(0, len(ranks), (2, size))
+	a_wins = (ranks[a] < ranks[b]) | (
+		(ranks[a] == ranks[b]) & (distance[a] >= distance[b])
+	)
+	return np.where(a_wins, a, b)
 
 
-def crossover(soln):
+def crossover(cw, exec_order, task_assign, rng, rate=1.0):
 	"""
 	As described in Yu & Buyya 2007
 
@@ -186,36 +504,238 @@ def crossover(soln):
 	2. Two random points are selected from the task-assignment strings
 	3. all tasks between the points are chosen as crossover points
 	4. the service allocation of the tasks within the crossover points are exchanged.
+
+	Execution orders are crossed at a single point: each child keeps its
+	parent's order up to the point, followed by the remaining tasks in the
+	order of the other parent, which keeps both orders topological.
+
+	Rows 2k and 2k + 1 are the parents of children 2k and 2k + 1. Each pair
+	is crossed over with probability rate, and copied otherwise.
+
+	:param exec_order: (n_parents, n_tasks) array, n_parents is even
+	:param task_assign: (n_parents, n_tasks) array
+	:return: (exec_order, task_assign) arrays of the children
 	"""
-	return None
+	n = cw.num_tasks
+	a, b = exec_order[0::2], exec_order[1::2]
+	pairs = len(a)
+	crossed = rng.random(pairs) < rate
+
+	lo, hi = np.sort(rng.integers(0, n + 1, (2, pairs)), axis=0)
+	columns = np.arange(n)
+	swap = (columns >= lo[:, np.newaxis]) & (columns < hi[:, np.newaxis])
+	swap &= crossed[:, np.newaxis]
+	child_assign = task_assign.copy()
+	child_assign[0::2] = np.where(swap, task_assign[1::2], task_assign[0::2])
+	child_assign[1::2] = np.where(swap, task_assign[0::2], task_assign[1::2])
+
+	cut = np.where(crossed, rng.integers(0, n + 1, pairs), n)[:, np.newaxis]
+	position_a, position_b = positions(a), positions(b)
+	child_order = np.empty_like(exec_order)
+	child_order[0::2] = np.argsort(
+		np.where(position_a < cut, position_a, n + position_b), axis=1
+	)
+	child_order[1::2] = np.argsort(
+		np.where(position_b < cut, position_b, n + position_a), axis=1
+	)
+	return child_order, child_assign
+
+
+def positions(exec_order):
+	"""
+	:return: Array of the position of each task index in each row of
+	exec_order
+	"""
+	size, n = exec_order.shape
+	position = np.empty_like(exec_order)
+	position[np.arange(size)[:, np.newaxis], exec_order] = np.arange(n)
+	return position
 
 
-def mutation(soln):
+def mutation(cw, exec_order, task_assign, rng, rate):
 	"""
 	Mutation requires us to separate the nodes into levels of nodes that are
 	independent of each other with respect to precedence:
 
 	Level 0 should have just the first task(s) - those with no indegree
 	Level n should have just the final task(s) - those with no outdegree
-	"""
 
-	return None
+	Each task is reassigned to a random machine with probability rate. With
+	the same probability a task is moved to a random position between its
+	last predecessor and first successor in the execution order; every
+	individual moves at most one task in each round. Both arrays hold one
+	row per individual and are changed in place.
+	"""
+	size, n = exec_order.shape
+	reassign = rng.random((size, n)) < rate
+	task_assign[reassign] = rng.integers(0, cw.num_machines, reassign.sum())
+
+	moves = rng.binomial(n, rate, size)
+	for r in range(moves.max(initial=0)):
+		rows = np.flatnonzero(moves > r)
+		order = exec_order[rows]
+		position = positions(order)
+		local = np.arange(len(rows))
+		task = order[local, rng.integers(0, n, len(rows))]
+		lo = _neighbour_positions(
+			cw.predecessor_edges(task), cw.pred_idx, position, -1, np.maximum
+		)
+		hi = _neighbour_positions(
+			cw.successor_edges(task), cw.succ_idx, position, n, np.minimum
+		)
+		target = lo + 1 + (rng.random(len(rows)) * (hi - lo - 1)).astype(np.int64)
+		# Sort keys that place the task just before (or after) the task now
+		# at its target position
+		key = 2 * position
+		current = position[local, task]
+		key[local, task] = np.where(target < current, 2 * target - 1, 2 * target + 1)
+		exec_order[rows] = np.take_along_axis(order, np.argsort(key, axis=1), axis=1)
+
+
+def _neighbour_positions(edges, idx, position, empty, reduce):
+	"""
+	Reduce (np.maximum or np.minimum) the positions of the neighbours of
+	each task, in its own row of position. Tasks with no neighbours take
+	the value empty.
+	"""
+	gathered, counts = edges
+	owner = np.repeat(np.arange(len(counts)), counts)
+	out = np.full(len(counts), empty, dtype=np.int64)
+	reduce.at(out, owner, position[owner, idx[gathered]])
+	return out
 
 
-def crowding_distance(solutions):
+def spea2_fitness(objectives):
+	"""
+	SPEA2 fitness: the strength of a solution is the number of solutions it
+	dominates, and its raw fitness is the sum of the strengths of the
+	solutions that dominate it. Both come from a single dominance matrix.
+	The density 1 / (d_k + 2), where d_k is the distance to the k-th nearest
+	solution and k is the square root of the number of solutions, is added
+	to separate solutions of equal raw fitness.
+
+	Distances are measured with each objective normalised by its range.
+
+	:param objectives: (n_solutions, n_objectives) array, all minimised
+	:return: (fitness, distance), the array of the fitness of each solution
+	(non-dominated solutions have a fitness below 1) and the matrix of
+	distances between solutions, with infinite distance from a solution to
+	itself
 	"""
-	For a given list of solutions, calculated the distance between the two closest solutions
-	for a given dimension; that is, the next highest and next lowest solution for that dimension.
-	:return:
+	objectives = np.asarray(objectives, dtype=float)
+	n = len(objectives)
+	dominated = dominates(objectives[:, np.newaxis], objectives[np.newaxis])
+	strength = dominated.sum(axis=1)
+	raw = strength @ dominated
+
+	span = objectives.max(axis=0, initial=0) - objectives.min(axis=0, initial=0)
+	scaled = objectives / np.where(span > 0, span, 1)
+	distance = np.sqrt(
+		((scaled[:, np.newaxis] - scaled[np.newaxis]) ** 2).sum(axis=-1)
+	)
+	np.fill_diagonal(distance, np.inf)
+	k = min(int(np.sqrt(n)), n - 1)
+	density = np.full(n, 0.5)
+	if k > 0:
+		kth = np.partition(distance, k - 1, axis=1)[:, k - 1]
+		density = 1 / (kth + 2)
+	return raw + density, distance
+
+
+def environmental_selection(fitness, distance, size):
 	"""
-	popsize = len(solutions)
+	Select the next SPEA2 archive: every non-dominated solution, truncated
+	(see truncate) if there are more than size, and otherwise filled up
+	with the dominated solutions of lowest fitness.
 
-	crowding_distance = []
+	:return: Array of the indices of the archive members
+	"""
+	front = np.flatnonzero(fitness < 1)
+	if len(front) > size:
+		return front[truncate(distance[np.ix_(front, front)], size)]
+	return np.argsort(fitness, kind='stable')[:size]
 
-	# Scores need to be normalised to the highest/lowest
-	normalise_scores = None
 
-	return None
+def truncate(distance, size):
+	"""
+	SPEA2 archive truncation: repeatedly remove the solution whose distances
+	to its remaining neighbours, taken in increasing order, are
+	lexicographically smallest, until size solutions remain.
+
+	Each row of distance is sorted once to give a nearest neighbour index,
+	and each solution keeps a pointer to its nearest remaining neighbour.
+	Removing a solution only advances the pointers that point at it, and
+	only the solutions tied for the closest neighbour are compared on their
+	further neighbours, so the truncation costs O(n^2 log n) rather than the
+	O(n^3) of recomputing every distance vector for each removal.
+
+	:param distance: (n, n) matrix of distances, infinite on the diagonal
+	:param size: Number of solutions to keep
+	:return: Sorted array of the indices of the kept solutions
+	"""
+	n = len(distance)
+	if n <= size:
+		return np.arange(n)
+	# Neighbours of each solution, nearest first; the last column is the
+	# solution itself, at infinite distance, and acts as a sentinel
+	neighbours = np.argsort(distance, axis=1, kind='stable')
+	sorted_distance = np.take_along_axis(distance, neighbours, axis=1)
+	alive = np.ones(n, dtype=bool)
+	pointer = np.zeros(n, dtype=np.int64)
+	nearest = sorted_distance[:, 0].copy()
+	rows = np.arange(n)
+
+	def advance(i, k):
+		# Position of the first remaining neighbour of i from position k on
+		while k < n - 1 and not alive[neighbours[i, k]]:
+			k += 1
+		return k
+
+	for r in range(n - size):
+		candidates = np.flatnonzero(nearest == nearest.min())
+		# Break ties on the distances to the first width remaining neighbours,
+		# doubling width until one candidate is left. Candidates at distance
+		# 0 from each other are the same point and stay tied.
+		width, others = 1, alive.sum() - 1
+		while (len(candidates) > 1 and width < others
+				and distance[candidates[0], candidates[1:]].any()):
+			width = min(2 * width, others)
+			remaining = _remaining_distances(
+				sorted_distance, neighbours, alive, candidates, pointer, width
+			)
+			least = remaining[np.lexsort(remaining.T[::-1])[0]]
+			candidates = candidates[(remaining == least).all(axis=1)]
+		removed = candidates[0]
+
+		alive[removed] = False
+		nearest[removed] = np.inf
+		stale = np.flatnonzero(alive & (neighbours[rows, pointer] == removed))
+		for i in stale.tolist():
+			pointer[i] = advance(i, pointer[i].item())
+			nearest[i] = sorted_distance[i, pointer[i]]
+	return np.flatnonzero(alive)
+
+
+def _remaining_distances(sorted_distance, neighbours, alive, candidates,
+						pointer, width):
+	"""
+	:return: (len(candidates), width) array of the distances from each
+	candidate to its width nearest remaining neighbours, starting from its
+	pointer; missing neighbours are at infinite distance
+	"""
+	n = len(alive)
+	rows = candidates[:, np.newaxis]
+	span = width
+	while True:
+		# Columns past the end repeat the sentinel, which is never removed
+		columns = np.minimum(pointer[rows] + np.arange(span), n - 1)
+		keep = alive[neighbours[rows, columns]]
+		count = np.cumsum(keep, axis=1)
+		if (count[:, -1] >= width).all():
+			break
+		span *= 2
+	keep &= count <= width
+	return sorted_distance[rows, columns][keep].reshape(len(candidates), width)
 
 
 def peek(iterable):
@@ -227,6 +747,11 @@ def peek(iterable):
 
 
 def generate_exec_orders(wf, popsize, seed, skip_limit):
+	"""
+	Walk networkx's enumeration of every topological sort, skipping a random
+	number of sorts between each. Orders drawn this way share long common
+	prefixes; sample_exec_orders draws independent orders instead.
+	"""
 	top_sort_list = []
 	generator = nx.all_topological_sorts(G=wf.graph)
 	retval = peek(generator)
@@ -257,50 +782,24 @@ def calc_solution_cost(solution, workflow):
 	return cost
 
 def generate_allocations(machines, task_order, wf, seed):
-	soln = NSGASolution(machines=machines)
+	"""
+	Decode a random task assignment for the given execution order
+
+	:param machines: List of machine names
+	:param task_order: Tasks, in a topological order
+	:param wf: Workflow with an environment
+	:param seed: Random seed
+	:return: NSGASolution
+	"""
+	cw = wf.compile()
 	rand_bounds = len(machines)
 	random.seed(seed)
-	for t in task_order:
+	exec_order = np.array([cw.task_index[t.tid] for t in task_order])
+	task_assign = np.zeros(cw.num_tasks, dtype=np.int64)
+	for i in exec_order.tolist():
 		index = random.randint(0, RAND_BOUNDS) % rand_bounds
-		m = machines[index]
-		calc_start_finish_times(t, m, wf,soln.list_machine_allocations(m))
-		soln.add_allocation(t, m)
-		if t.aft > soln.makespan:
-			soln.makespan = 107
-
-	soln.solution_cost = calc_solution_cost(soln,wf)
-
-	return soln
-
-
-def calc_start_finish_times(task, machine, workflow, curr_allocations):
-	# For a given solution, we have task-machine pairs in a given order
-	# This order will be based on the execution order provided by a topological sort
-	st = 0
-	predecessors = workflow.graph.predecessors(task)
-	for pretask in predecessors:
-		edge_comm_cost = 0
-		if pretask.machine != machine:
-			edge_comm_cost = workflow.graph.edges[pretask, task]['data_size']
-		# If the finish time of the previous task is greater than st and communication cost, then we update the est
-		if pretask.aft + edge_comm_cost >= st:
-			st = pretask.aft + edge_comm_cost
-	# Also need to check what the latest current allocation is on the machine
-
-	num_alloc = len(curr_allocations)
-	if num_alloc > 0:
-		final = curr_allocations[num_alloc - 1]
-		# This is in the event that the task execution order places tasks
-		# with the same previous task on the same machine
-		if final.aft > st:
-			st = final.aft
-
-	runtime = task.calc_runtime(machine)
-	task.ast = st
-	task.aft = task.ast + runtime
-	task.machine = machine
-
-	return None
+		task_assign[i] = cw.machine_index[machines[index]]
+	return decode(wf, exec_order, task_assign)
 
 
 class NSGASolution(Solution):
@@ -313,3 +812,5 @@ class NSGASolution(Solution):
 		self.nondom_rank = -1
 		self.crowding_dist = -1
 		self.solution_cost = 0
+		# Objective values, by name, for solutions returned by nsga2/spea2
+		self.objectives = {}
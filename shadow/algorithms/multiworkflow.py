@@ -0,0 +1,176 @@
+# Copyright (C) 2020 RW Bunney
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Scheduling several workflows that compete for the machines of one
+Environment.
+
+Each workflow is ranked with the HEFT upward rank, and its tasks are
+allocated in rank order onto machine timelines shared by all workflows,
+starting no earlier than the workflow's arrival time. A policy decides
+which workflow allocates its next task:
+
+* fcfs: workflows are scheduled one after another, in order of arrival
+* round_robin: workflows take turns, one task at a time
+* fairness: the workflow with the largest slowdown so far goes next,
+  following the fairness policy of Zhao & Sakellariou (2006). Slowdown is
+  the time a workflow's allocated tasks take on the shared machines,
+  relative to the time the same tasks take when the workflow is scheduled
+  alone.
+"""
+
+import numpy as np
+
+from shadow.algorithms.heuristic import heft, rank_order, schedule_arrays, \
+	ready_times, _allocate
+from shadow.classes.profiler import DISABLED
+from shadow.classes.solution import Solution
+
+
+def _fcfs(states):
+	return min(states, key=lambda s: (s.arrival, s.index))
+
+
+def _round_robin(states):
+	return min(states, key=lambda s: (s.next, s.index))
+
+
+def _fairness(states):
+	return max(states, key=lambda s: (s.slowdown(), -s.arrival, -s.index))
+
+
+policies = {
+	'fcfs': _fcfs,
+	'round_robin': _round_robin,
+	'fairness': _fairness,
+}
+
+
+class _WorkflowState(object):
+	"""
+	Progress of one workflow through the shared schedule
+	"""
+
+	def __init__(self, index, wf, arrival, environment):
+		self.index = index
+		self.wf = wf
+		self.arrival = arrival
+		wf.add_environment(environment)
+		# The schedule the workflow gets when it has the machines to itself
+		self.own_makespan = heft(wf)
+		self.cw = wf.compile()
+		self.own_finish = self.cw.finish.copy()
+		self.order = rank_order(self.cw).tolist()
+		self.next = 0
+		self.finish = arrival
+		self.own = 0
+		# The Solution that holds this workflow's part of the shared schedule
+		wf.solution = Solution(machines=environment.machines.keys())
+		self.placed, self.aft = schedule_arrays(self.cw)
+
+	def slowdown(self):
+		# A workflow that has not started yet is treated as the most slowed
+		if self.own == 0:
+			return float('inf')
+		return (self.finish - self.arrival) / self.own
+
+
+def schedule_workflows(workflows, environment, arrivals=None,
+					policy='fairness', profiler=DISABLED):
+	"""
+	Schedule several workflows onto the shared machines of an environment.
+
+	:param workflows: List of Workflow objects. Each is bound to environment,
+	and its Tasks and Solution describe its part of the shared schedule
+	:param environment: The shared Environment
+	:param arrivals: Optional list of arrival times (default 0 for every
+	workflow); no task starts before its workflow arrives
+	:param policy: Name of the policy that picks the next workflow, one of
+	multiworkflow.policies
+	:param profiler: Optional Profiler that records the run
+	:return: Dictionary with the shared 'solution', the overall 'makespan'
+	and 'throughput' (workflows completed per unit time, from the first
+	arrival), the 'unfairness' (sum of the absolute differences between
+	each slowdown and the mean slowdown) and a list of per-workflow
+	'workflows' dictionaries with the arrival, finish, makespan (finish -
+	arrival), own_makespan and slowdown of each workflow
+	"""
+	if policy not in policies:
+		raise ValueError('Unknown policy: {0}'.format(policy))
+	if arrivals is None:
+		arrivals = [0] * len(workflows)
+	choose = policies[policy]
+
+	with profiler.run('schedule_workflows'):
+		with profiler.timer('rank'):
+			states = [
+				_WorkflowState(k, wf, arrival, environment)
+				for k, (wf, arrival) in enumerate(zip(workflows, arrivals))
+			]
+		shared = Solution(machines=environment.machines.keys())
+		active = [s for s in states if s.order]
+		with profiler.timer('allocate'):
+			while active:
+				state = choose(active)
+				_allocate_next(state, shared, profiler)
+				if state.next == len(state.order):
+					active.remove(state)
+		profiler.count('allocate.tasks', sum(len(s.order) for s in states))
+
+	start = min(arrivals) if len(arrivals) else 0
+	makespan = max((s.finish for s in states), default=start) - start
+	summary = []
+	for s in states:
+		s.wf.solution.makespan = s.finish - s.arrival
+		summary.append({
+			'arrival': s.arrival,
+			'finish': s.finish,
+			'makespan': s.finish - s.arrival,
+			'own_makespan': s.own_makespan,
+			'slowdown': (s.finish - s.arrival) / s.own_makespan
+			if s.own_makespan else 1.0
+		})
+	slowdown = np.array([w['slowdown'] for w in summary])
+	shared.makespan = makespan
+	return {
+		'solution': shared,
+		'makespan': makespan,
+		'throughput': len(states) / makespan if makespan else 0.0,
+		'unfairness': float(np.abs(slowdown - slowdown.mean()).sum())
+		if len(slowdown) else 0.0,
+		'workflows': summary
+	}
+
+
+def _allocate_next(state, shared, profiler):
+	"""
+	Allocate the next task of a workflow, in rank order, onto the shared
+	machines
+	"""
+	cw = state.cw
+	i = state.order[state.next]
+	state.next += 1
+	runtime = cw.runtime[i]
+	ready = np.maximum(ready_times(cw, i, state.placed, state.aft), state.arrival)
+	eft = shared.earliest_starts(ready, runtime, profiler) + runtime
+	m = int(np.argmin(eft))
+	aft = eft[m].item()
+	ast = aft - runtime[m].item()
+	shared.allocate(
+		(state.index, cw.tids[i].item()), cw.machines[m], ast, aft
+	)
+	_allocate(state.wf, cw, i, m, ast, aft, state.placed, state.aft)
+	state.finish = max(state.finish, aft)
+	state.own = max(state.own, state.own_finish[i].item())
@@ -0,0 +1,330 @@
+# Copyright (C) 2020 RW Bunney
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Streaming HEFT scheduling, for workflows that arrive a partition at a time
+and need never be held in memory as a whole.
+
+A stream is an iterable (or async iterable) of events:
+
+* ('task', tid, comp): a new task. comp is its FLOPs, or a list with its
+  runtime on each machine
+* ('edge', src, dst, data_size): a new dependency. src must be a task that
+  has arrived and not been retired
+* ('barrier',): every task that has arrived so far has all of its input
+  edges; no new edges into these tasks will follow
+* ('retire', tid): task tid will have no further successors
+
+At each barrier (and at the end of the stream) the pending tasks are ranked
+with the upward rank of the subgraph known so far, and every task whose
+predecessors are all allocated is allocated with the HEFT insertion policy,
+in rank order. The allocations are emitted as (machine, Allocation) pairs.
+
+Retired tasks are forgotten once allocated. All retained tasks finish after
+a watermark; no further task starts before it, so allocations finishing
+before the watermark are discarded from the machine timelines. Memory is
+therefore bounded by the pending and retained tasks, not the whole stream.
+"""
+
+import heapq
+
+import numpy as np
+
+from shadow.algorithms.heuristic import data_ready_times
+from shadow.classes.profiler import DISABLED
+from shadow.classes.solution import Solution
+
+
+class StreamingScheduler(object):
+	"""
+	Schedules a stream of tasks and edges onto an Environment
+
+	:param environment: Environment whose machines are scheduled
+	:param profiler: Optional Profiler that records each barrier
+	"""
+
+	def __init__(self, environment, profiler=DISABLED):
+		self.env = environment
+		self.machines = list(environment.machines)
+		self.comm = environment.communication
+		self.solution = Solution(machines=self.machines)
+		self.profiler = profiler
+		self.watermark = 0
+		self.makespan = 0
+		self._flops = None
+		if environment.has_comp:
+			self._flops = np.array(
+				[environment.machines[m]['flops'] for m in self.machines]
+			)
+
+		# Pending (unallocated) tasks
+		self._runtime = {}
+		self._preds = {}
+		self._succs = {}
+		self._waiting = {}  # Number of unallocated predecessors
+		self._open = set()  # Tasks that arrived since the last barrier
+		self._order = {}  # Arrival order, used to break ties in rank
+		self._arrivals = 0
+		# Allocated tasks that are retained for their successors: tid -> (m, aft)
+		self._done = {}
+		self._dependents = {}  # Number of unallocated successors
+		self._retired = set()  # Retired, but with unallocated successors
+
+	def __len__(self):
+		"""
+		Number of tasks currently held in memory
+		"""
+		return len(self._dependents)
+
+	def add_task(self, tid, comp):
+		if tid in self._dependents:
+			raise ValueError('Task {0} has already arrived'.format(tid))
+		if np.ndim(comp) == 0:
+			if self._flops is None:
+				raise ValueError(
+					'Environment has no FLOP/s to calculate runtimes with'
+				)
+			runtime = np.round(comp / self._flops).astype(np.int64)
+		else:
+			runtime = np.asarray(comp)
+			if len(runtime) != len(self.machines):
+				raise ValueError(
+					'Task {0} has {1} runtimes for {2} machines'.format(
+						tid, len(runtime), len(self.machines)
+					)
+				)
+		self._runtime[tid] = runtime
+		self._preds[tid] = []
+		self._succs[tid] = []
+		self._waiting[tid] = 0
+		self._dependents[tid] = 0
+		self._open.add(tid)
+		self._order[tid] = self._arrivals
+		self._arrivals += 1
+
+	def add_edge(self, src, dst, data_size):
+		if dst not in self._open:
+			raise ValueError(
+				'Inputs of task {0} are closed or it has not arrived'.format(dst)
+			)
+		if src in self._retired or src not in self._dependents:
+			raise ValueError(
+				'Task {0} has been retired or has not arrived'.format(src)
+			)
+		if src in self._runtime:
+			self._succs[src].append((dst, data_size))
+			self._waiting[dst] += 1
+		self._dependents[src] += 1
+		self._preds[dst].append((src, data_size))
+
+	def retire(self, tid):
+		"""
+		Declare that task tid will have no further successors. It is
+		forgotten once it and all of its successors are allocated.
+		"""
+		if tid not in self._dependents:
+			raise ValueError('Task {0} is not known'.format(tid))
+		self._retired.add(tid)
+		self._release(tid)
+
+	def _release(self, tid):
+		if (tid in self._retired and tid in self._done
+				and self._dependents[tid] == 0):
+			self._retired.remove(tid)
+			del self._done[tid]
+			del self._dependents[tid]
+
+	def barrier(self):
+		"""
+		Close the inputs of every task that has arrived, and allocate every
+		task that can now be scheduled.
+
+		:return: List of (machine, Allocation) pairs, in allocation order
+		"""
+		with self.profiler.run('barrier'):
+			self._open.clear()
+			rank = self._rank()
+			ready = [
+				(-rank[tid], self._order[tid], tid)
+				for tid, waiting in self._waiting.items() if waiting == 0
+			]
+			heapq.heapify(ready)
+			allocated = []
+			with self.profiler.timer('allocate'):
+				while ready:
+					tid = heapq.heappop(ready)[2]
+					allocated.append(self._allocate(tid))
+					for succ, data_size in self._succs[tid]:
+						self._waiting[succ] -= 1
+						if self._waiting[succ] == 0:
+							heapq.heappush(
+								ready, (-rank[succ], self._order[succ], succ)
+							)
+					self._forget(tid)
+			self.profiler.count('allocate.tasks', len(allocated))
+			self._advance_watermark()
+		return allocated
+
+	def _rank(self):
+		"""
+		Upward rank of each pending task within the known pending subgraph
+		"""
+		remaining = {tid: len(succs) for tid, succs in self._succs.items()}
+		stack = [tid for tid, n in remaining.items() if n == 0]
+		rank = {}
+		while stack:
+			tid = stack.pop()
+			longest_rank = 0
+			for succ, data_size in self._succs[tid]:
+				longest_rank = max(
+					longest_rank, self.comm.average_cost(data_size).item() + rank[succ]
+				)
+			rank[tid] = self._runtime[tid].mean() + longest_rank
+			for pred, data_size in self._preds[tid]:
+				if pred in remaining:
+					remaining[pred] -= 1
+					if remaining[pred] == 0:
+						stack.append(pred)
+		self.profiler.count('rank.tasks', len(rank))
+		return rank
+
+	def _allocate(self, tid):
+		runtime = self._runtime[tid]
+		preds = self._preds[tid]
+		machines = np.array([self._done[p][0] for p, d in preds], dtype=np.int64)
+		data_size = [d for p, d in preds]
+		dtype = runtime.dtype
+		if not self.comm.unit:
+			dtype = np.result_type(dtype, float)
+		aft = np.array([self._done[p][1] for p, d in preds], dtype=dtype)
+		ready = np.maximum(data_ready_times(
+			machines, aft, data_size, len(self.machines), dtype, self.comm
+		), self.watermark)
+		eft = self.solution.earliest_starts(
+			ready, runtime, self.profiler
+		) + runtime
+		m = int(np.argmin(eft))
+		aft = eft[m].item()
+		machine = self.machines[m]
+		self.solution.allocate(tid, machine, aft - runtime[m].item(), aft)
+		self._done[tid] = (m, aft)
+		for p, d in preds:
+			self._dependents[p] -= 1
+			self._release(p)
+		self.makespan = max(self.makespan, aft)
+		return self.solution.find_alloc(tid)
+
+	def _forget(self, tid):
+		del self._runtime[tid]
+		del self._preds[tid]
+		del self._succs[tid]
+		del self._waiting[tid]
+		del self._order[tid]
+		self._release(tid)
+
+	def _advance_watermark(self):
+		"""
+		Move the watermark up to the earliest finish time of the retained
+		tasks, and discard the allocations that finish before it
+		"""
+		if self._done:
+			mark = min(aft for m, aft in self._done.values())
+		else:
+			mark = self.solution._end.min().item()
+		if mark > self.watermark:
+			self.watermark = mark
+			self.solution.discard_before(mark)
+
+	def run(self, stream):
+		"""
+		Schedule a stream of events, see the module documentation
+
+		:return: Generator of (machine, Allocation) pairs, emitted at each
+		barrier and at the end of the stream
+		"""
+		for event in stream:
+			if event[0] == 'barrier':
+				yield from self.barrier()
+			else:
+				self._handle(event)
+		yield from self.barrier()
+
+	async def arun(self, stream):
+		"""
+		As run(), for an async iterable of events
+		"""
+		async for event in stream:
+			if event[0] == 'barrier':
+				for allocation in self.barrier():
+					yield allocation
+			else:
+				self._handle(event)
+		for allocation in self.barrier():
+			yield allocation
+
+	def _handle(self, event):
+		kind = event[0]
+		if kind == 'task':
+			self.add_task(*event[1:])
+		elif kind == 'edge':
+			self.add_edge(*event[1:])
+		elif kind == 'retire':
+			self.retire(*event[1:])
+		else:
+			raise ValueError('Unknown stream event: {0}'.format(kind))
+
+
+def workflow_events(wf, partition_size=None):
+	"""
+	Turn a loaded Workflow into a stream of events, in topological order,
+	with a barrier after every partition_size tasks (or only at the end).
+	A task is retired once all of its successors have arrived.
+
+	:param wf: Workflow with an environment
+	:param partition_size: Number of tasks between barriers
+	:return: Generator of stream events
+	"""
+	cw = wf.compile()
+	tids = cw.tids.tolist()
+	# Topological order that follows the graph order as closely as possible
+	waiting = np.diff(cw.pred_ptr).tolist()
+	ready = [i for i in range(cw.num_tasks) if waiting[i] == 0]
+	order = []
+	while ready:
+		i = heapq.heappop(ready)
+		order.append(i)
+		for s in cw.successors(i).tolist():
+			waiting[s] -= 1
+			if waiting[s] == 0:
+				heapq.heappush(ready, s)
+	position = {i: k for k, i in enumerate(order)}
+	# Index in order after which each task has no successors left to arrive
+	last_successor = [
+		max((position[s] for s in cw.successors(i).tolist()), default=position[i])
+		for i in range(cw.num_tasks)
+	]
+	retire_at = {}
+	for i, k in enumerate(last_successor):
+		retire_at.setdefault(k, []).append(i)
+	for k, i in enumerate(order):
+		yield ('task', tids[i], cw.runtime[i].tolist())
+		for p, data_size in zip(
+			cw.predecessors(i).tolist(), cw.predecessor_data(i).tolist()
+		):
+			yield ('edge', tids[p], tids[i], data_size)
+		for done in retire_at.get(k, []):
+			yield ('retire', tids[done])
+		if partition_size and (k + 1) % partition_size == 0:
+			yield ('barrier',)
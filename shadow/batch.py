@@ -0,0 +1,189 @@
+# Copyright (C) 2020 RW Bunney
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Batch scheduling of many workflow/environment pairs across a pool of worker
+processes.
+
+Each workflow/environment pair is loaded once in a worker, and every
+requested algorithm is run against it. Results (makespan, cost and timings)
+are collected into a single CSV or Parquet file.
+"""
+
+import csv
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from shadow.algorithms.heuristic import heft, pheft
+from shadow.algorithms.metaheuristic import calc_solution_cost
+from shadow.classes.environment import Environment
+from shadow.classes.workflow import Workflow
+
+logger = logging.getLogger(__name__)
+
+algorithms = {
+	'heft': heft,
+	'pheft': pheft,
+}
+
+RESULT_FIELDS = [
+	'workflow',
+	'environment',
+	'algorithm',
+	'makespan',
+	'cost',
+	'load_time',
+	'wall_time',
+	'error'
+]
+
+SYSTEM_SUFFIX = '_sys'
+
+
+def find_pairs(path):
+	"""
+	Find the workflow/environment pairs to schedule.
+
+	:param path: Either a directory, in which every 'X.json' workflow that has
+	a matching 'X_sys.json' environment is paired with it, or a JSON manifest
+	containing a list of {"workflow": ..., "environment": ...} entries. Paths
+	in a manifest are relative to the manifest's directory.
+	:return: List of (workflow path, environment path) tuples
+	"""
+	if os.path.isdir(path):
+		pairs = []
+		for name in sorted(os.listdir(path)):
+			base, ext = os.path.splitext(name)
+			if ext != '.json' or base.endswith(SYSTEM_SUFFIX):
+				continue
+			system = os.path.join(path, base + SYSTEM_SUFFIX + ext)
+			if os.path.exists(system):
+				pairs.append((os.path.join(path, name), system))
+		return pairs
+
+	with open(path, 'r') as infile:
+		manifest = json.load(infile)
+	root = os.path.dirname(path)
+	return [
+		(
+			os.path.join(root, entry['workflow']),
+			os.path.join(root, entry['environment'])
+		)
+		for entry in manifest
+	]
+
+
+def run_pair(job):
+	"""
+	Load a workflow/environment pair and run each algorithm on it. The
+	environment is re-added before each algorithm so every run starts from
+	an empty Solution.
+
+	:param job: (workflow path, environment path, list of algorithm names,
+	cache directory or None)
+	:return: List of result dictionaries, one per algorithm
+	"""
+	workflow, environment, names, cache_dir = job
+	results = []
+	start = time.perf_counter()
+	try:
+		wf = Workflow(workflow, cache_dir=cache_dir)
+		env = Environment(environment, cache_dir=cache_dir)
+	except Exception as e:
+		logger.warning('Unable to load %s, %s: %s', workflow, environment, e)
+		return [
+			_result(workflow, environment, name, error=repr(e))
+			for name in names
+		]
+	load_time = time.perf_counter() - start
+
+	for name in names:
+		start = time.perf_counter()
+		try:
+			wf.add_environment(env)
+			makespan = algorithms[name](wf)
+			cost = None
+			if env.has_cost:
+				cost = calc_solution_cost(wf.solution, wf)
+			results.append(_result(
+				workflow, environment, name,
+				makespan=float(makespan),
+				cost=cost,
+				load_time=load_time,
+				wall_time=time.perf_counter() - start
+			))
+		except Exception as e:
+			logger.warning('%s failed on %s: %s', name, workflow, e)
+			results.append(_result(
+				workflow, environment, name, error=repr(e)
+			))
+	return results
+
+
+def _result(workflow, environment, algorithm, makespan=None, cost=None,
+			load_time=None, wall_time=None, error=None):
+	return {
+		'workflow': workflow,
+		'environment': environment,
+		'algorithm': algorithm,
+		'makespan': makespan,
+		'cost': cost,
+		'load_time': load_time,
+		'wall_time': wall_time,
+		'error': error
+	}
+
+
+def run_batch(pairs, names, output=None, workers=None, cache_dir=None):
+	"""
+	Schedule every pair with every algorithm across a process pool.
+
+	:param pairs: List of (workflow path, environment path) tuples
+	:param names: List of algorithm names (keys of batch.algorithms)
+	:param output: Optional path of a .csv or .parquet file for the results
+	:param workers: Number of worker processes (defaults to the CPU count)
+	:param cache_dir: Optional directory of binary workflow/environment
+	caches, so that repeated batches skip JSON parsing
+	:return: List of result dictionaries
+	"""
+	for name in names:
+		if name not in algorithms:
+			raise ValueError('Unknown algorithm: {0}'.format(name))
+	jobs = [(workflow, env, names, cache_dir) for workflow, env in pairs]
+	results = []
+	with ProcessPoolExecutor(max_workers=workers) as executor:
+		for pair_results in executor.map(run_pair, jobs):
+			results.extend(pair_results)
+	if output:
+		write_results(results, output)
+	return results
+
+
+def write_results(results, output):
+	"""
+	Write results to output; Parquet is used if the file name ends in
+	'.parquet' (this requires pandas), otherwise CSV.
+	"""
+	if output.endswith('.parquet'):
+		import pandas as pd
+		pd.DataFrame(results, columns=RESULT_FIELDS).to_parquet(output)
+		return
+	with open(output, 'w', newline='') as outfile:
+		writer = csv.DictWriter(outfile, fieldnames=RESULT_FIELDS)
+		writer.writeheader()
+		writer.writerows(results)
@@ -0,0 +1,342 @@
+# Copyright (C) 2020 RW Bunney
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Benchmarks of scheduling throughput on reproducible synthetic workloads.
+
+Workflows are random layered DAGs and environments are split into machine
+categories of differing speed. Costs are drawn the same way as in
+utils.shadowgen.generator (uniform computation about a mean, communication
+scaled by the CCR), so a workload is fully described by its size, CCR,
+heterogeneity, machine count and seed.
+
+Each algorithm is timed in three phases: load (reading the workflow and
+environment), rank and allocate. Results are written as JSON so that runs
+can be compared across commits.
+"""
+
+import itertools
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from shadow.algorithms.heuristic import upward_rank, upward_oct_rank, \
+	insertion_policy, insertion_policy_oct, insertion_policy_classes, \
+	insertion_policy_lookahead, pcp, mols
+from shadow.classes.environment import Environment
+from shadow.classes.workflow import Workflow
+
+
+def _allocate_heft(wf, rank):
+	return insertion_policy(wf)
+
+
+def _allocate_heft_classes(wf, rank):
+	return insertion_policy_classes(wf)
+
+
+def _allocate_heft_lookahead(wf, rank):
+	return insertion_policy_lookahead(wf)
+
+
+def _compile(wf):
+	return wf.compile()
+
+
+def _allocate_pcp(wf, cw):
+	return pcp(wf)
+
+
+def _allocate_mols(wf, cw):
+	# The fastest schedule on the front
+	return mols(wf)[0].makespan
+
+
+# Algorithm name -> (rank phase, allocate phase). The rank phase is called
+# with the workflow, and its result is passed on to the allocate phase.
+# IC-PCP and MOLS compute their own task orders, so their rank phase only
+# compiles the workflow and the ordering is timed as part of allocation.
+algorithms = {
+	'heft': (upward_rank, _allocate_heft),
+	'pheft': (upward_oct_rank, insertion_policy_oct),
+	'heft_classes': (upward_rank, _allocate_heft_classes),
+	'heft_lookahead': (upward_rank, _allocate_heft_lookahead),
+	'pcp': (_compile, _allocate_pcp),
+	'mols': (_compile, _allocate_mols),
+}
+
+PHASES = ['load', 'rank', 'allocate']
+
+
+def generate_workflow(path, num_tasks, ccr=1.0, mean=100, uniform_range=50,
+					width=None, degree=3, seed=20):
+	"""
+	Write a random layered workflow in the Shadow JSON format.
+
+	Task 0 is the single entry task. Every other level holds between 1 and
+	2 * width - 1 tasks, each of which depends on 1 to degree tasks of the
+	previous level.
+
+	:param path: Output path of the workflow JSON
+	:param num_tasks: Number of tasks in the workflow
+	:param ccr: Communication/Computation cost ratio
+	:param mean: The mean computation cost of a task
+	:param uniform_range: the range above/below the mean for the uniform distribution
+	:param width: Average number of tasks per level (default sqrt(num_tasks))
+	:param degree: Maximum number of predecessors of a task
+	:param seed: Random seed
+	:return: Number of edges in the workflow
+	"""
+	rng = np.random.default_rng(seed)
+	if width is None:
+		width = max(1, int(round(np.sqrt(num_tasks))))
+
+	sources, targets = [], []
+	prev_start, prev_size = 0, 1
+	start = 1
+	while start < num_tasks:
+		size = min(int(rng.integers(1, 2 * width)), num_tasks - start)
+		parents = prev_start + rng.integers(0, prev_size, (size, degree))
+		counts = rng.integers(1, degree + 1, size)
+		keep = np.arange(degree) < counts[:, np.newaxis]
+		children = np.repeat(np.arange(start, start + size), degree)
+		sources.append(parents.ravel()[keep.ravel()])
+		targets.append(children.reshape(size, degree)[keep])
+		prev_start, prev_size = start, size
+		start += size
+
+	edges = np.zeros((0, 2), dtype=np.int64)
+	if sources:
+		edges = np.unique(
+			np.column_stack((np.concatenate(sources), np.concatenate(targets))),
+			axis=0
+		)
+	comp = rng.integers(mean - uniform_range, mean + uniform_range + 1, num_tasks)
+	comm_range = uniform_range * ccr
+	data_size = rng.integers(
+		int(mean * ccr - comm_range), int(mean * ccr + comm_range) + 1, len(edges)
+	)
+
+	jgraph = {
+		"header": {
+			"time": False
+		},
+		'graph': {
+			'directed': True,
+			'multigraph': False,
+			'graph': {},
+			'nodes': [
+				{'comp': c, 'id': i} for i, c in enumerate(comp.tolist())
+			],
+			'links': [
+				{'source': u, 'target': v, 'data_size': d}
+				for (u, v), d in zip(edges.tolist(), data_size.tolist())
+			]
+		}
+	}
+	with open(path, 'w') as jfile:
+		json.dump(jgraph, jfile)
+	return len(edges)
+
+
+def generate_environment(path, num_machines, heterogeneity=1.0, categories=2):
+	"""
+	Write an environment of num_machines machines, split as evenly as
+	possible between the given number of categories.
+
+	Machine speeds are spread evenly between the slowest and fastest
+	category, and normalised so that the average speed is 1; the average
+	runtime of a task is therefore its mean computation cost.
+
+	:param path: Output path of the environment JSON
+	:param num_machines: Number of machines in the environment
+	:param heterogeneity: Ratio of the fastest to the slowest machine speed
+	:param categories: Number of machine categories
+	"""
+	categories = max(1, min(categories, num_machines))
+	speed = np.linspace(1.0, heterogeneity, categories)
+	category = np.arange(num_machines) % categories
+	speed = speed / speed[category].mean()
+	resources = {
+		'cat{0}_m{1}'.format(c, m): {'flops': speed[c].item()}
+		for m, c in enumerate(category.tolist())
+	}
+	system = {
+		"header": {
+			"time": False
+		},
+		'system': {
+			'resources': resources,
+			'rates': {'cat{0}'.format(c): 1.0 for c in range(categories)},
+			'cost': {
+				'cat{0}'.format(c): speed[c].item() for c in range(categories)
+			}
+		}
+	}
+	with open(path, 'w') as jfile:
+		json.dump(system, jfile)
+
+
+def workloads(sizes, ccrs=(1.0,), machines=(8,), heterogeneity=(2.0,),
+			width=None, seed=20):
+	"""
+	:return: List of workload dictionaries, one for each combination of
+	size, CCR, machine count and heterogeneity
+	"""
+	return [
+		{
+			'num_tasks': n,
+			'ccr': ccr,
+			'num_machines': m,
+			'heterogeneity': h,
+			'width': width,
+			'seed': seed
+		}
+		for n, ccr, m, h in itertools.product(sizes, ccrs, machines, heterogeneity)
+	]
+
+
+def run_once(workflow, environment, name):
+	"""
+	Load and schedule a workflow once, timing each phase
+
+	:return: (phase timings dictionary, makespan)
+	"""
+	rank, allocate = algorithms[name]
+	start = time.perf_counter()
+	wf = Workflow(workflow)
+	wf.add_environment(Environment(environment))
+	loaded = time.perf_counter()
+	state = rank(wf)
+	ranked = time.perf_counter()
+	makespan = allocate(wf, state)
+	allocated = time.perf_counter()
+	timings = {
+		'load': loaded - start,
+		'rank': ranked - loaded,
+		'allocate': allocated - ranked
+	}
+	return timings, makespan
+
+
+def peak_memory(workflow, environment, name):
+	"""
+	:return: Peak memory (in bytes) allocated by Python and NumPy while
+	loading and scheduling the workflow
+	"""
+	tracemalloc.start()
+	try:
+		run_once(workflow, environment, name)
+		return tracemalloc.get_traced_memory()[1]
+	finally:
+		tracemalloc.stop()
+
+
+def run_workload(workload, names, directory, repeat=3, memory=True):
+	"""
+	Generate a workload and benchmark each algorithm on it. Phase timings
+	are the minimum over repeat runs. Memory is measured in a separate run,
+	as tracing allocations slows the scheduler down.
+
+	:param workload: Dictionary, as returned by workloads()
+	:param names: List of algorithm names (keys of bench.algorithms)
+	:param directory: Directory in which to write the generated files
+	:param repeat: Number of timed runs of each algorithm
+	:param memory: Whether to measure peak memory
+	:return: List of result dictionaries, one per algorithm
+	"""
+	base = os.path.join(
+		directory, 'bench_{num_tasks}_{ccr}_{num_machines}_{heterogeneity}'.format(**workload)
+	)
+	workflow, environment = base + '.json', base + '_sys.json'
+	num_edges = generate_workflow(
+		workflow, workload['num_tasks'], ccr=workload['ccr'],
+		width=workload['width'], seed=workload['seed']
+	)
+	generate_environment(
+		environment, workload['num_machines'], workload['heterogeneity']
+	)
+
+	results = []
+	for name in names:
+		best = dict.fromkeys(PHASES, float('inf'))
+		for r in range(repeat):
+			timings, makespan = run_once(workflow, environment, name)
+			for phase in PHASES:
+				best[phase] = min(best[phase], timings[phase])
+		result = dict(workload)
+		result.update({
+			'algorithm': name,
+			'num_edges': num_edges,
+			'makespan': float(makespan),
+			'total': sum(best.values()),
+			'peak_memory': None
+		})
+		result.update(best)
+		if memory:
+			result['peak_memory'] = peak_memory(workflow, environment, name)
+		results.append(result)
+	return results
+
+
+def run_benchmarks(workload_list, names, output=None, repeat=3, memory=True):
+	"""
+	Benchmark every algorithm on every workload.
+
+	:param workload_list: List of workload dictionaries, see workloads()
+	:param names: List of algorithm names (keys of bench.algorithms)
+	:param output: Optional path of a JSON file for the report
+	:param repeat: Number of timed runs of each algorithm on each workload
+	:param memory: Whether to measure peak memory
+	:return: Report dictionary, with 'meta' and 'results' entries
+	"""
+	for name in names:
+		if name not in algorithms:
+			raise ValueError('Unknown algorithm: {0}'.format(name))
+	results = []
+	with tempfile.TemporaryDirectory() as directory:
+		for workload in workload_list:
+			results.extend(
+				run_workload(workload, names, directory, repeat, memory)
+			)
+	report = {'meta': _metadata(repeat), 'results': results}
+	if output:
+		with open(output, 'w') as outfile:
+			json.dump(report, outfile, indent=2)
+	return report
+
+
+def _metadata(repeat):
+	try:
+		commit = subprocess.run(
+			['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+			cwd=os.path.dirname(os.path.abspath(__file__))
+		).stdout.strip() or None
+	except OSError:
+		commit = None
+	return {
+		'commit': commit,
+		'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+		'python': platform.python_version(),
+		'numpy': np.__version__,
+		'platform': platform.platform(),
+		'repeat': repeat
+	}
@@ -0,0 +1,63 @@
+# Copyright (C) 2020 RW Bunney
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Helpers for the binary (.npz) caches of workflow and environment configs.
+
+Cache files are named after the SHA-1 digest of the JSON file they were
+built from, so an edited config never reuses a stale cache.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+CHUNK_SIZE = 1 << 20
+
+
+def file_digest(path):
+	"""
+	:return: Hex SHA-1 digest of the contents of the file at path
+	"""
+	digest = hashlib.sha1()
+	with open(path, 'rb') as infile:
+		for chunk in iter(lambda: infile.read(CHUNK_SIZE), b''):
+			digest.update(chunk)
+	return digest.hexdigest()
+
+
+def cache_path(config, cache_dir, kind):
+	"""
+	:param config: Path of the source JSON file
+	:param cache_dir: Directory that holds the cache files
+	:param kind: 'workflow' or 'environment'
+	:return: Path of the cache file for config
+	"""
+	return os.path.join(
+		cache_dir, '{0}-{1}.npz'.format(kind, file_digest(config))
+	)
+
+
+def save_npz(path, **arrays):
+	"""
+	Write arrays to an uncompressed .npz file at path. The file is written
+	under a temporary name and then moved into place, so that concurrent
+	processes never read a partially written cache.
+	"""
+	tmp = '{0}.{1}.tmp'.format(path, os.getpid())
+	with open(tmp, 'wb') as outfile:
+		np.savez(outfile, **arrays)
+	os.replace(tmp, path)
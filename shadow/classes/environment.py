@@ -14,18 +14,75 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import numpy as np
+import os
 import sys
 import json
 import logging
 
+from shadow.classes.cache import cache_path, save_npz
+
 logger = logging.getLogger(__name__)
 
 
 class Environment(object):
 
-	def __init__(self, config):
+	def __init__(self, config, cache_dir=None):
+		"""
+		:param config: JSON formatted file that stores the system specification
+		:param cache_dir: Optional directory of binary environment caches. If \
+		a cache of config exists there it is loaded instead of the JSON; \
+		otherwise the JSON is parsed and a cache is written for next time.
+		"""
+		cache = None
+		if cache_dir is not None:
+			cache = cache_path(config, cache_dir, 'environment')
+			if os.path.exists(cache):
+				self._setup(_read_cache(cache))
+				return
 		with open(config, 'r') as infile:
-			self.env = json.load(infile)
+			self._setup(json.load(infile))
+		if cache is not None:
+			os.makedirs(cache_dir, exist_ok=True)
+			self.save_cache(cache)
+
+	@classmethod
+	def from_cache(cls, path):
+		"""
+		Load an environment from a binary cache written by save_cache()
+
+		:param path: Path of the .npz cache file
+		:return: Environment
+		"""
+		env = cls.__new__(cls)
+		env._setup(_read_cache(path))
+		return env
+
+	def save_cache(self, path):
+		"""
+		Save the machine FLOP/s, data rates and costs as a binary .npz file.
+		Other resource attributes are not stored.
+
+		:param path: Path of the .npz cache file
+		"""
+		system = self.env['system']
+		rates = system.get('rates') or {}
+		costs = system.get('cost', {})
+		save_npz(
+			path,
+			machines=np.array(list(self.machines), dtype=str),
+			flops=np.array(
+				[self.machines[m].get('flops', np.nan) for m in self.machines],
+				dtype=float
+			),
+			rate_keys=np.array(list(rates), dtype=str),
+			rate_values=np.array(list(rates.values()), dtype=float),
+			cost_keys=np.array(list(costs), dtype=str),
+			cost_values=np.array(list(costs.values()), dtype=float),
+			has_cost=self.has_cost
+		)
+
+	def _setup(self, env):
+		self.env = env
 		self.has_comp = False
 		self.has_mem = False
 		self.has_cost = False
@@ -38,10 +95,10 @@ class Environment(object):
 
 		# machines -> categories -> machines -> compute
 		self.machines = self.env['system']['resources']
-		# TODO Use rates in system config; for time being rates are taken from graph
 		self.rates = self.env['system']['rates']
 		if self.rates:
 			self.has_rates = True
+		self._communication = None
 
 		if 'cost' in self.env['system']:
 			self.has_cost = True
@@ -104,6 +161,40 @@ class Environment(object):
 		return int(np.round(task_flops/self.machines[machine]['flops']))
 
 
+	def calc_runtime_matrix(self, task_flops, chunk_size=1 << 20):
+		"""
+		Vectorised calc_task_runtime_on_machine for every task and machine.
+		Rows are computed in chunks so that task_flops may be a large
+		memory-mapped array.
+
+		:param task_flops: Array of the total FLOPs of each task
+		:param chunk_size: Number of tasks per chunk
+		:return: (n_tasks, n_machines) integer array of runtimes
+		"""
+		flops = np.array([self.machines[m]['flops'] for m in self.machines])
+		# Machines of the same speed share a column, so each distinct FLOP/s
+		# value is only divided through once
+		speeds, column = np.unique(flops, return_inverse=True)
+		runtime = np.empty((len(task_flops), len(flops)), dtype=np.int64)
+		for start in range(0, len(task_flops), chunk_size):
+			chunk = np.asarray(task_flops[start:start + chunk_size])
+			runtime[start:start + chunk_size] = np.round(
+				chunk[:, np.newaxis] / speeds
+			)[:, column]
+		return runtime
+
+	@property
+	def communication(self):
+		"""
+		The CommunicationModel of the environment's machines and rates,
+		built on first use
+		"""
+		if self._communication is None:
+			self._communication = CommunicationModel(
+				list(self.machines), self.rates if self.has_rates else None
+			)
+		return self._communication
+
 	def calc_task_cost_on_machine(self, machine, task_runtime):
 		"""
 		Machine costs are presented as $ per second
@@ -114,9 +205,152 @@ class Environment(object):
 		machine_type_prefix = machine.split('_')[0]
 		return self.costs[machine_type_prefix] * task_runtime
 
+
+class CommunicationModel(object):
+	"""
+	Data transfer times between machines.
+
+	Each machine category (the prefix of a machine name, as in 'cat0_m1') has
+	a data rate in the system config's 'rates'. Data moving between
+	categories a and b travels at the slower rate, min(rate_a, rate_b), and
+	data that stays on one machine costs nothing. The category x category
+	matrix of inverse rates is computed once, so the transfer time of any
+	number of edges is a single data_size * inverse[src, dst] lookup.
+
+	A rate that is missing or not positive is treated as a negligible
+	transfer cost. Without rates, every rate is 1 and the transfer time is
+	the data size itself.
+
+	:param machines: List of machine names, in machine index order
+	:param rates: Optional dictionary of the data rate of each category
+	"""
+
+	def __init__(self, machines, rates=None):
+		names = [machine.split('_')[0] for machine in machines]
+		self.categories = list(dict.fromkeys(names))
+		index = {c: k for k, c in enumerate(self.categories)}
+		self.category = np.array([index[c] for c in names], dtype=np.int64)
+		rate = np.ones(len(self.categories))
+		if rates:
+			rate = np.array([rates.get(c, 0) for c in self.categories], dtype=float)
+		self.bandwidth = np.minimum.outer(rate, rate)
+		with np.errstate(divide='ignore'):
+			self.inverse = np.where(self.bandwidth > 0, 1 / self.bandwidth, 0.0)
+
+		# The average inverse rate over every ordered pair of distinct
+		# machines, from the number of machines in each category
+		count = np.bincount(self.category, minlength=len(self.categories))
+		pairs = len(machines) * (len(machines) - 1)
+		total = count @ self.inverse @ count - (count * self.inverse.diagonal()).sum()
+		self.mean_inverse = total / pairs if pairs else 0.0
+
+		# Inverse rate shared by every link, or None if links differ
+		links = self.inverse[np.ix_(self.category, self.category)]
+		links = links[~np.eye(len(machines), dtype=bool)]
+		self.uniform = None
+		if len(links) == 0 or (links == links[0]).all():
+			self.uniform = links[0].item() if len(links) else 1.0
+		self.unit = self.uniform == 1.0
+
+	def _scale(self, data_size):
+		if self.unit:
+			return np.asarray(data_size)
+		return np.asarray(data_size) * self.uniform
+
+	def transfer_times(self, data_size, src, dst):
+		"""
+		Vectorised transfer time of data between machines. The arguments
+		broadcast against each other.
+
+		:param data_size: Array of data sizes
+		:param src: Array of the machine index holding each data item
+		:param dst: Array of the machine index that needs it
+		:return: Array of transfer times; 0 where src == dst
+		"""
+		src, dst = np.asarray(src), np.asarray(dst)
+		if self.uniform is not None:
+			cost = self._scale(data_size)
+		else:
+			cost = data_size * self.inverse[self.category[src], self.category[dst]]
+		return np.where(src == dst, 0, cost)
+
+	def category_times(self, data_size, src, categories):
+		"""
+		Vectorised transfer time of data from a machine to any other machine
+		of a category. The arguments broadcast against each other.
+
+		:param data_size: Array of data sizes
+		:param src: Array of the machine index holding each data item
+		:param categories: Array of the category index of the machine that
+		needs it
+		:return: Array of transfer times. With a uniform rate the times do
+		not depend on either machine, and have the shape of data_size.
+		"""
+		if self.uniform is not None:
+			return self._scale(data_size)
+		return data_size * self.inverse[self.category[src], categories]
+
+	def remote_times(self, data_size):
+		"""
+		:return: Transfer times into each machine of data held on another
+		machine, assuming the slowest incoming link, as an array of shape
+		data_size.shape + (n_machines,). With a uniform rate the times do
+		not depend on either machine.
+		"""
+		if self.uniform is not None:
+			return self._scale(data_size)[..., np.newaxis]
+		slowest = self.inverse.max(axis=0)[self.category]
+		return np.asarray(data_size)[..., np.newaxis] * slowest
+
+	def average_cost(self, data_size):
+		"""
+		The HEFT average communication cost of edges: the data size over
+		the average rate of every pair of distinct machines (Topcuoglu,
+		Hariri & Wu, 2002)
+
+		:param data_size: Array of data sizes
+		:return: Array of average transfer times
+		"""
+		if self.uniform is not None:
+			return self._scale(data_size)
+		return np.asarray(data_size) * self.mean_inverse
+
+	def result_type(self, data_size):
+		"""
+		:return: dtype of the transfer times of data_size
+		"""
+		if self.unit:
+			return np.result_type(data_size)
+		return np.result_type(data_size, float)
+
+
 	# self.en nviron['system']
 	#
 	#
 	# self.machines = [[] for x in range(len(self.env['resource']))]
 	# self.data_load = np.array([])
 	# self.thrpt = 0.0
+
+
+def _read_cache(path):
+	"""
+	Rebuild the system specification stored in an environment cache file.
+
+	:return: Dictionary in the same layout as the JSON config
+	"""
+	with np.load(path) as cache:
+		resources = {}
+		for machine, flops in zip(cache['machines'].tolist(),
+								cache['flops'].tolist()):
+			resources[machine] = {} if np.isnan(flops) else {'flops': flops}
+		system = {
+			'resources': resources,
+			'rates': dict(zip(
+				cache['rate_keys'].tolist(), cache['rate_values'].tolist()
+			))
+		}
+		if cache['has_cost']:
+			system['cost'] = dict(zip(
+				cache['cost_keys'].tolist(), cache['cost_values'].tolist()
+			))
+	return {'system': system}
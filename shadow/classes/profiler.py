@@ -0,0 +1,195 @@
+# Copyright (C) 2020 RW Bunney
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Counters and timers for the phases of a scheduling run.
+
+A Profiler is passed to an algorithm for a single run, e.g.
+
+	profiler = Profiler(log_sink(), json_sink('profile.jsonl'))
+	heft(wf, profiler=profiler)
+
+and at the end of the run its report is sent to each sink. A sink is any
+callable that takes the report dictionary. Algorithms that are not given a
+Profiler use DISABLED, whose methods do nothing.
+"""
+
+import json
+import logging
+import time
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+
+class _Timer(object):
+	__slots__ = ('profiler', 'name', 'start')
+
+	def __init__(self, profiler, name):
+		self.profiler = profiler
+		self.name = name
+		self.start = 0
+
+	def __enter__(self):
+		self.start = time.perf_counter()
+		return self
+
+	def __exit__(self, *exc):
+		self.profiler.add_time(self.name, time.perf_counter() - self.start)
+		return False
+
+
+class Profiler(object):
+	"""
+	Collects named counters and timers over a run, and reports them to sinks
+
+	:param sinks: Callables that are each given the report of a run
+	"""
+
+	def __init__(self, *sinks):
+		self.sinks = list(sinks)
+		self.name = None
+		self.reset()
+
+	def __bool__(self):
+		return True
+
+	def reset(self):
+		self.counters = defaultdict(int)
+		self.timers = defaultdict(float)
+		self.calls = defaultdict(int)
+
+	def count(self, name, n=1):
+		"""
+		Add n to the counter name
+		"""
+		self.counters[name] += n
+
+	def add_time(self, name, seconds):
+		"""
+		Add seconds to the timer name
+		"""
+		self.timers[name] += seconds
+		self.calls[name] += 1
+
+	def timer(self, name):
+		"""
+		:return: A context manager that adds the time spent inside it to the
+		timer name
+		"""
+		return _Timer(self, name)
+
+	def run(self, name):
+		"""
+		:return: A context manager for a whole run of an algorithm. The
+		counters and timers are reset on entry, and the report is sent to
+		the sinks on exit.
+		"""
+		return _Run(self, name)
+
+	def report(self):
+		"""
+		:return: Dictionary of the name of the run, its counters, and the
+		total time and number of calls of each timer
+		"""
+		return {
+			'name': self.name,
+			'counters': dict(self.counters),
+			'timers': {
+				name: {'total': total, 'calls': self.calls[name]}
+				for name, total in self.timers.items()
+			}
+		}
+
+	def emit(self):
+		"""
+		Send the current report to every sink
+		"""
+		report = self.report()
+		for sink in self.sinks:
+			sink(report)
+		return report
+
+
+class _Run(_Timer):
+	__slots__ = ()
+
+	def __enter__(self):
+		self.profiler.reset()
+		self.profiler.name = self.name
+		return _Timer.__enter__(self)
+
+	def __exit__(self, *exc):
+		_Timer.__exit__(self, *exc)
+		self.profiler.emit()
+		return False
+
+
+class _NullContext(object):
+	__slots__ = ()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		return False
+
+
+_NULL_CONTEXT = _NullContext()
+
+
+class _DisabledProfiler(object):
+	"""
+	Profiler that records nothing. It is falsy, so that code can skip
+	gathering values that are only needed for profiling.
+	"""
+	__slots__ = ()
+
+	def __bool__(self):
+		return False
+
+	def count(self, name, n=1):
+		pass
+
+	def add_time(self, name, seconds):
+		pass
+
+	def timer(self, name):
+		return _NULL_CONTEXT
+
+	def run(self, name):
+		return _NULL_CONTEXT
+
+
+DISABLED = _DisabledProfiler()
+
+
+def log_sink(log=logger, level=logging.INFO):
+	"""
+	:return: Sink that writes each report to a logger
+	"""
+	def sink(report):
+		log.log(level, 'Profile of %s: %s', report['name'], json.dumps(report))
+	return sink
+
+
+def json_sink(path):
+	"""
+	:return: Sink that appends each report to path as a line of JSON
+	"""
+	def sink(report):
+		with open(path, 'a') as outfile:
+			outfile.write(json.dumps(report) + '\n')
+	return sink
@@ -13,16 +13,22 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import numpy as np
+
+from shadow.classes.profiler import DISABLED
+from shadow.classes.timeline import Timeline
+
 
 class Allocation:
 	"""
 	A simple storage class to save an allocation to a solution
 	"""
+	__slots__ = ('tid', 'ast', 'aft')
 
-	def __init__(self, task, machine):
-		self.tid = task.tid
-		self.ast = task.ast
-		self.aft = task.aft
+	def __init__(self, tid, ast, aft):
+		self.tid = tid
+		self.ast = ast
+		self.aft = aft
 
 
 class Solution:
@@ -35,6 +41,18 @@ class Solution:
 		self.machines = machines
 		# Generate a list of allocations for each machine
 		self.allocations = {m: [] for m in machines}
+		# Timelines index the same allocations for free-slot searches
+		self.timelines = {m: Timeline() for m in machines}
+		# End time and largest idle gap of each timeline, in machine order,
+		# so that earliest_starts() only searches timelines with a usable gap
+		self._names = list(machines)
+		self._machine_index = {m: i for i, m in enumerate(self._names)}
+		self._end = np.zeros(len(self._machine_index), dtype=np.int64)
+		self._gap = np.zeros(len(self._machine_index), dtype=np.int64)
+		# Task id -> (machine, Allocation)
+		self._placement = {}
+		# Machines that have dropped out, and can take no new allocations
+		self.unavailable = set()
 		self.makespan = 0
 
 	def _is_feasible(self, task_order):
@@ -44,11 +62,61 @@ class Solution:
 		return True
 
 	def add_allocation(self, task, machine):
-		a = Allocation(task, machine)
-		self.allocations[machine].append(a)
-		self.allocations[machine].sort(
-			key=lambda alloc: alloc.ast
-		)
+		self.allocate(task.tid, machine, task.ast, task.aft)
+
+	def allocate(self, tid, machine, ast, aft):
+		"""
+		Allocate the task with id tid to machine between ast and aft
+		"""
+		a = Allocation(tid, ast, aft)
+		timeline = self.timelines[machine]
+		# Allocations are kept in the same order as the timeline
+		self.allocations[machine].insert(timeline.count_le(a.ast, a.aft), a)
+		timeline.insert(a.ast, a.aft, a)
+		dtype = np.result_type(self._end, ast, aft)
+		if dtype != self._end.dtype:
+			self._end = self._end.astype(dtype)
+			self._gap = self._gap.astype(dtype)
+		self._placement[tid] = (machine, a)
+		self._update_bounds(machine)
+
+	def _update_bounds(self, machine):
+		timeline = self.timelines[machine]
+		i = self._machine_index[machine]
+		self._end[i] = timeline.end
+		self._gap[i] = timeline.max_gap
+
+	def earliest_start(self, machine, ready, runtime):
+		"""
+		Find the earliest time, no earlier than ready, at which a task with
+		the given runtime fits into the machine's current allocations.
+
+		:param machine: The String name of the machine
+		:param ready: The time at which the task's input data is available
+		:param runtime: The runtime of the task on the machine
+		:return: The start time of the task
+		"""
+		return self.timelines[machine].earliest_start(ready, runtime)
+
+	def earliest_starts(self, ready, runtime, profiler=DISABLED):
+		"""
+		Vectorised earliest_start() for every machine at once. A timeline is
+		only searched if its largest gap could hold the task before the
+		timeline ends; otherwise the task starts at max(ready, end).
+
+		:param ready: Array of the ready time of the task on each machine
+		:param runtime: Array of the runtime of the task on each machine
+		:param profiler: Optional Profiler that counts the timeline searches
+		:return: Array of the start time of the task on each machine
+		"""
+		return _earliest_starts(self, ready, runtime, profiler)
+
+	def snapshot(self):
+		"""
+		:return: A Snapshot of the machine timelines, on which allocations
+		can be tried out without changing the Solution
+		"""
+		return Snapshot(self)
 
 	def list_machine_allocations(self, machine):
 		"""
@@ -57,15 +125,147 @@ class Solution:
 		:param machine: The String name of the machine
 		:return:
 		"""
-		self.allocations[machine].sort(
-			key=lambda alloc: alloc.ast
-		)
 		return self.allocations[machine]
 
 	def list_all_allocations(self):
 		return self.allocations
 
-	def find_alloc(self, task):
-		pass
+	def find_alloc(self, tid):
+		"""
+		:param tid: Task id
+		:return: (machine, Allocation) of the task, or None if the task is
+		not allocated
+		"""
+		return self._placement.get(tid)
+
 	def remove_allocation(self, tid, m):
-		pass
+		"""
+		Remove the allocation of the task with id tid from machine m
+
+		:return: The removed Allocation
+		"""
+		machine, a = self._placement.pop(tid)
+		if machine != m:
+			self._placement[tid] = (machine, a)
+			raise ValueError(
+				'Task {0} is allocated to {1}, not {2}'.format(tid, machine, m)
+			)
+		timeline = self.timelines[m]
+		allocations = self.allocations[m]
+		# The allocation is among those ordered at or before (a.ast, a.aft)
+		i = timeline.count_le(a.ast, a.aft) - 1
+		while allocations[i] is not a:
+			i -= 1
+		del allocations[i]
+		timeline.remove(a.ast, a)
+		self._update_bounds(m)
+		return a
+
+	def discard_before(self, time):
+		"""
+		Forget every allocation that finishes at or before time. Allocations
+		on a machine do not overlap, so these are the first allocations of
+		each machine. Gaps before time can no longer be searched afterwards.
+
+		:return: Number of allocations discarded
+		"""
+		discarded = 0
+		for m in self._names:
+			allocations = self.allocations[m]
+			k = 0
+			while k < len(allocations) and allocations[k].aft <= time:
+				a = allocations[k]
+				self.timelines[m].remove(a.ast, a)
+				self._placement.pop(a.tid, None)
+				k += 1
+			if k:
+				del allocations[:k]
+				self._update_bounds(m)
+				discarded += k
+		return discarded
+
+	def allocations_from(self, time):
+		"""
+		:param time: Change point
+		:return: List of (machine, Allocation) for every allocation that
+		starts at or after time
+		"""
+		return [
+			(m, a) for m in self._names
+			for a in self.timelines[m].items_from(time)
+		]
+
+
+class Snapshot(object):
+	"""
+	Copy-on-write view of the machine timelines of a Solution (or of
+	another Snapshot). Taking a snapshot copies the end and gap arrays and
+	the dictionary of timelines; a timeline itself is only copied, in O(1)
+	(see Timeline.copy()), when the snapshot first allocates onto it.
+	Allocations on a snapshot are not visible to its source. A snapshot
+	shares the timelines it has not allocated onto, so it is only valid
+	until the next allocation on its source.
+
+	:param source: Solution or Snapshot to take the view of
+	"""
+
+	def __init__(self, source):
+		self.timelines = dict(source.timelines)
+		self._names = source._names
+		self._machine_index = source._machine_index
+		self._end = source._end.copy()
+		self._gap = source._gap.copy()
+		self._copied = set()
+
+	def snapshot(self):
+		"""
+		:return: A Snapshot of this snapshot
+		"""
+		return Snapshot(self)
+
+	def allocate(self, machine, ast, aft):
+		"""
+		Tentatively allocate the interval [ast, aft] to machine
+		"""
+		if machine not in self._copied:
+			self.timelines[machine] = self.timelines[machine].copy()
+			self._copied.add(machine)
+		timeline = self.timelines[machine]
+		timeline.insert(ast, aft)
+		dtype = np.result_type(self._end, ast, aft)
+		if dtype != self._end.dtype:
+			self._end = self._end.astype(dtype)
+			self._gap = self._gap.astype(dtype)
+		i = self._machine_index[machine]
+		self._end[i] = timeline.end
+		self._gap[i] = timeline.max_gap
+
+	def earliest_start(self, machine, ready, runtime):
+		"""
+		As Solution.earliest_start()
+		"""
+		return self.timelines[machine].earliest_start(ready, runtime)
+
+	def earliest_starts(self, ready, runtime, profiler=DISABLED):
+		"""
+		As Solution.earliest_starts()
+		"""
+		return _earliest_starts(self, ready, runtime, profiler)
+
+
+def _earliest_starts(timelines, ready, runtime, profiler):
+	"""
+	Solution.earliest_starts() for a Solution or Snapshot
+	"""
+	est = np.maximum(ready, timelines._end)
+	fits = (timelines._gap >= runtime) & (ready + runtime <= timelines._end)
+	if fits.any():
+		est = est.astype(np.result_type(est, ready, runtime))
+		searched = np.flatnonzero(fits).tolist()
+		profiler.count('allocate.slot_scans', len(searched))
+		for i in searched:
+			est[i] = timelines.timelines[timelines._names[i]].earliest_start(
+				ready[i].item(), runtime[i].item()
+			)
+	return est
+
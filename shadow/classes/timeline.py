@@ -0,0 +1,257 @@
+# Copyright (C) 2020 RW Bunney
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Per-machine timelines used to find free slots for insertion-based
+scheduling.
+
+A Timeline stores the (start, finish) intervals allocated on a machine in a
+treap ordered by start time, then finish time. Each node is augmented with the first start,
+last finish and largest idle gap of its subtree, so the earliest gap that
+fits a task after a given ready time is found in O(log n).
+
+Nodes are never modified once built; inserting or removing an interval
+copies only the O(log n) nodes on the path to it. Copying a Timeline is
+therefore O(1), and copies share all unchanged structure.
+"""
+
+import random
+
+# Private generator so that treap priorities do not disturb the global
+# random state used by seeded algorithms.
+_priorities = random.Random(0)
+
+
+class _Node(object):
+	__slots__ = (
+		'ast', 'aft', 'item', 'prio', 'left', 'right',
+		'first', 'last', 'gap', 'size'
+	)
+
+	def __init__(self, ast, aft, item, prio, left, right):
+		self.ast = ast
+		self.aft = aft
+		self.item = item
+		self.prio = prio
+		self.left = left
+		self.right = right
+		# Subtree aggregates: earliest start, latest finish, largest gap
+		# between two consecutive intervals and number of intervals.
+		gap = 0
+		size = 1
+		if left is not None:
+			self.first = left.first
+			gap = max(left.gap, ast - left.last)
+			size += left.size
+		else:
+			self.first = ast
+		if right is not None:
+			self.last = right.last
+			gap = max(gap, right.gap, right.first - aft)
+			size += right.size
+		else:
+			self.last = aft
+		self.gap = gap
+		self.size = size
+
+
+def _copy(node, left, right):
+	return _Node(node.ast, node.aft, node.item, node.prio, left, right)
+
+
+def _split(node, ast, aft):
+	"""
+	Split into the intervals ordered at or before (ast, aft), and those after
+	"""
+	if node is None:
+		return None, None
+	if node.ast < ast or (node.ast == ast and node.aft <= aft):
+		left, right = _split(node.right, ast, aft)
+		return _copy(node, node.left, left), right
+	left, right = _split(node.left, ast, aft)
+	return left, _copy(node, right, node.right)
+
+
+def _merge(left, right):
+	if left is None:
+		return right
+	if right is None:
+		return left
+	if left.prio > right.prio:
+		return _copy(left, left.left, _merge(left.right, right))
+	return _copy(right, _merge(left, right.left), right.right)
+
+
+def _remove(node, ast, item):
+	if node is None:
+		return None
+	if node.ast == ast and node.item == item:
+		return _merge(node.left, node.right)
+	if ast < node.ast:
+		left = _remove(node.left, ast, item)
+		return node if left is node.left else _copy(node, left, node.right)
+	if ast > node.ast:
+		right = _remove(node.right, ast, item)
+		return node if right is node.right else _copy(node, node.left, right)
+	# Equal start times may sit on either side
+	left = _remove(node.left, ast, item)
+	if left is not node.left:
+		return _copy(node, left, node.right)
+	right = _remove(node.right, ast, item)
+	return node if right is node.right else _copy(node, node.left, right)
+
+
+def _find(node, lo, ready, runtime):
+	"""
+	Earliest start >= ready for an interval of length runtime that fits in
+	the gap between lo and the first interval of the subtree, or in a gap
+	inside the subtree. Returns None if no such gap exists.
+	"""
+	# Every gap in this subtree closes before ready + runtime
+	if node.last < ready + runtime:
+		return None
+	# Every gap starts after ready, so only its length matters
+	if lo >= ready and max(node.first - lo, node.gap) < runtime:
+		return None
+	if node.left is not None:
+		start = _find(node.left, lo, ready, runtime)
+		if start is not None:
+			return start
+		lo = node.left.last
+	start = max(lo, ready)
+	if start + runtime <= node.ast:
+		return start
+	if node.right is not None:
+		return _find(node.right, node.aft, ready, runtime)
+	return None
+
+
+class Timeline(object):
+	"""
+	The intervals allocated to a single machine, ordered by start time and
+	then by finish time. A zero-length interval therefore comes before an
+	interval that starts at the same time, and the last interval in order
+	is the one that finishes last.
+	"""
+
+	def __init__(self):
+		self._root = None
+
+	def __len__(self):
+		return 0 if self._root is None else self._root.size
+
+	def __iter__(self):
+		stack = []
+		node = self._root
+		while stack or node is not None:
+			while node is not None:
+				stack.append(node)
+				node = node.left
+			node = stack.pop()
+			yield node.item
+			node = node.right
+
+	def items_from(self, ast):
+		"""
+		Iterate over the items of the intervals that start at or after ast,
+		in order of start time
+		"""
+		stack = []
+		node = self._root
+		# Find the path to the first interval starting at or after ast
+		while node is not None:
+			if node.ast >= ast:
+				stack.append(node)
+				node = node.left
+			else:
+				node = node.right
+		while stack:
+			node = stack.pop()
+			yield node.item
+			node = node.right
+			while node is not None:
+				stack.append(node)
+				node = node.left
+
+	def copy(self):
+		"""
+		:return: An independent Timeline that shares structure with this one
+		"""
+		timeline = Timeline()
+		timeline._root = self._root
+		return timeline
+
+	@property
+	def end(self):
+		"""
+		Finish time of the latest interval (0 for an empty timeline)
+		"""
+		return 0 if self._root is None else self._root.last
+
+	@property
+	def max_gap(self):
+		"""
+		Length of the largest idle period before the final interval,
+		including the period between time 0 and the first interval.
+		"""
+		if self._root is None:
+			return 0
+		return max(self._root.first, self._root.gap)
+
+	def count_le(self, ast, aft=None):
+		"""
+		:return: The number of intervals starting at or before ast. If aft
+		is given, intervals starting at ast only count if they finish at or
+		before aft; this is the position at which insert(ast, aft) places
+		the interval.
+		"""
+		count = 0
+		node = self._root
+		while node is not None:
+			if node.ast < ast or (node.ast == ast and (
+					aft is None or node.aft <= aft)):
+				count += 1 + (0 if node.left is None else node.left.size)
+				node = node.right
+			else:
+				node = node.left
+		return count
+
+	def insert(self, ast, aft, item=None):
+		"""
+		Add the interval [ast, aft] to the timeline. item is stored with the
+		interval and returned when iterating over the timeline.
+		"""
+		node = _Node(ast, aft, item, _priorities.random(), None, None)
+		left, right = _split(self._root, ast, aft)
+		self._root = _merge(_merge(left, node), right)
+
+	def remove(self, ast, item):
+		"""
+		Remove the interval starting at ast that was stored with item.
+		"""
+		self._root = _remove(self._root, ast, item)
+
+	def earliest_start(self, ready, runtime):
+		"""
+		Find the earliest start time, no earlier than ready, at which an
+		interval of length runtime fits between the existing intervals or
+		after the final one.
+		"""
+		if self._root is None:
+			return ready
+		start = _find(self._root, 0, ready, runtime)
+		if start is None:
+			return max(ready, self._root.last)
+		return start
@@ -15,11 +15,14 @@
 
 
 import json
+import os
 import sys
+from collections.abc import Mapping
 
 import networkx as nx
 import numpy as np
-from shadow.classes.environment import Environment
+from shadow.classes.cache import cache_path, save_npz
+from shadow.classes.environment import Environment, CommunicationModel
 from shadow.classes.solution import Solution
 
 # TODO clean up allocation and ranking;
@@ -27,10 +30,49 @@ from shadow.classes.solution import Solution
 #  instead, only interact with
 #  workflow tasks, naccessot graph nodes
 
+class MachineTable(object):
+	"""
+	Per-machine task values (currently runtimes) shared by all Tasks in a
+	Workflow. matrix has one row per task and one column per machine; index
+	maps machine names to columns.
+	"""
+	__slots__ = ('matrix', 'index')
+
+	def __init__(self):
+		self.matrix = None
+		self.index = {}
+
+
+class MachineRow(Mapping):
+	"""
+	Read-only {machine name: value} view of one task's row in a MachineTable
+	"""
+	__slots__ = ('_table', '_row')
+
+	def __init__(self, table, row):
+		self._table = table
+		self._row = row
+
+	def __getitem__(self, machine):
+		return self._table.matrix[self._row, self._table.index[machine]].item()
+
+	def __iter__(self):
+		return iter(self._table.index)
+
+	def __len__(self):
+		return len(self._table.index)
+
+	def values(self):
+		return self._table.matrix[self._row].tolist()
+
+
 class Task(object):
 	"""
 	Helper class for the
 	"""
+	__slots__ = (
+		'tid', 'rank', 'flops_demand', 'machine', 'ast', 'aft', 'row', 'table'
+	)
 
 	def __init__(self, tid, flops):
 		self.tid = tid  # task id - this is unique
@@ -38,16 +80,24 @@ class Task(object):
 
 		# Resource usage
 		self.flops_demand = flops  # Will use the constants
-		# Following is {machine name, value} dictionary pairs
-		self.calculated_runtime = {}
-		self.calculated_io = {}
-		self.calculated_memory = {}
+		# Row of this task in the workflow's MachineTable; set by the Workflow
+		self.row = -1
+		self.table = None
 
 		# allocations
 		self.machine = None
 		self.ast = 0  # actual start time
 		self.aft = 0  # actual finish time
 
+	@property
+	def calculated_runtime(self):
+		"""
+		{machine name: runtime} view of this task's runtimes
+		"""
+		if self.table is None:
+			return {}
+		return MachineRow(self.table, self.row)
+
 	# def __repr__(self):
 	# 	return str(self.tid)
 	#
@@ -93,25 +143,131 @@ class Workflow(object):
 	The workflow includes
 	"""
 
-	def __init__(self, config, from_file=True):
+	def __init__(self, config, from_file=True, cache_dir=None):
 		"""
+		:param cache_dir: Optional directory of binary workflow caches. If a \
+		cache of config exists there it is loaded instead of the JSON; \
+		otherwise the JSON is parsed and a cache is written for next time.
 		"""
+		cache = None
+		if cache_dir is not None:
+			cache = cache_path(config, cache_dir, 'workflow')
+			if os.path.exists(cache):
+				self._setup(*_read_cache(cache))
+				return
+
 		with open(config, 'r') as infile:
 			wfconfig = json.load(infile)
-		self.graph = nx.readwrite.json_graph.node_link_graph(wfconfig['graph'])
+		graph = nx.readwrite.json_graph.node_link_graph(wfconfig['graph'])
 		# Take advantage of how pipelines
 		mapping = {}
-		for node in self.graph.nodes:
-			t = Task(node, self.graph.nodes[node]['comp'])
+		for node in graph.nodes:
+			t = Task(node, graph.nodes[node]['comp'])
 			mapping[node] = t
-		self.graph = nx.relabel_nodes(self.graph, mapping, copy=False)
-		self.tasks = self.graph.nodes
-		self.edges = self.graph.edges
+		graph = nx.relabel_nodes(graph, mapping, copy=False)
+		self._setup(graph, wfconfig['header']['time'])
+		if cache is not None:
+			os.makedirs(cache_dir, exist_ok=True)
+			self.save_cache(cache)
+
+	@classmethod
+	def from_cache(cls, path):
+		"""
+		Load a workflow from a binary cache written by save_cache(), without
+		parsing any JSON.
+
+		:param path: Path of the .npz cache file
+		:return: Workflow
+		"""
+		wf = cls.__new__(cls)
+		wf._setup(*_read_cache(path))
+		return wf
+
+	def save_cache(self, path):
+		"""
+		Save the workflow graph (task ids, 'comp' values, edges and their
+		'data_size') as a binary .npz file, which from_cache() loads without
+		JSON parsing. Other node and edge attributes are not stored.
+
+		:param path: Path of the .npz cache file
+		"""
+		tids, comp, src, dst, data_size = self._columns()
+		save_npz(
+			path,
+			time=self._time,
+			tids=tids,
+			comp=comp,
+			src=src,
+			dst=dst,
+			data_size=data_size
+		)
+
+	@classmethod
+	def from_arrays(cls, directory, mmap_mode='r'):
+		"""
+		Load a workflow stored by save_arrays() or write_arrays(). The task
+		costs, edge lists and data sizes are memory-mapped from disk and no
+		networkx graph or Task objects are created, so the workflow can only
+		be scheduled through its compiled form (e.g. with heft or pheft).
+
+		:param directory: Directory holding the workflow arrays
+		:param mmap_mode: Passed to numpy.load; None reads the arrays into memory
+		:return: Workflow, with graph and tasks set to None
+		"""
+		arrays = read_arrays(directory, mmap_mode)
+		wf = cls.__new__(cls)
+		wf._setup(None, arrays['time'])
+		wf._arrays = arrays
+		return wf
+
+	def save_arrays(self, directory):
+		"""
+		Save the workflow graph as a directory of .npy columns that
+		from_arrays() can memory-map.
+
+		:param directory: Output directory (created if necessary)
+		"""
+		tids, comp, src, dst, data_size = self._columns()
+		write_arrays(directory, self._time, tids, comp, src, dst, data_size)
+
+	def _columns(self):
+		"""
+		:return: (tids, comp, src, dst, data_size) arrays describing the graph,
+		with edges in graph adjacency order
+		"""
+		tasks = list(self.graph.nodes)
+		index = {task: i for i, task in enumerate(tasks)}
+		src, dst, data_size = [], [], []
+		for u, v, size in self.graph.edges(data='data_size'):
+			src.append(index[u])
+			dst.append(index[v])
+			data_size.append(size)
+		return (
+			np.array([task.tid for task in tasks]),
+			np.array([self.graph.nodes[task]['comp'] for task in tasks]),
+			np.array(src, dtype=np.int64),
+			np.array(dst, dtype=np.int64),
+			np.array(data_size)
+		)
+
+	def _setup(self, graph, time):
+		self.graph = graph
+		self.tasks = None if graph is None else self.graph.nodes
+		self.edges = None if graph is None else self.graph.edges
+		self._arrays = None # Memory-mapped columns when there is no graph
+		self._runtime = None
+		# Task runtimes live in one matrix; each Task holds a view of its row
+		self._table = MachineTable()
+		if graph is not None:
+			for row, task in enumerate(self.graph.nodes):
+				task.row = row
+				task.table = self._table
 		self.env = None
 		self.solution = None # Solution is dependent on an environment
+		self.compiled = None # Frozen array representation; see compile()
 		# This lets us know when reading the graph if 'comp' attribute
 		# in the Networkx graph is time or FLOPs based
-		self._time = wfconfig['header']['time']
+		self._time = time
 
 	def add_environment(self, environment):
 		"""
@@ -120,38 +276,134 @@ class Workflow(object):
 		:return: Non-negative return value inidcates success.
 		"""
 		self.env = environment
+		self.compiled = None
 		# Go through environment flags and check what processing we can do to the workflow
 		self.machine_alloc = {m: [] for m in self.env.machines.keys()}
 		self.solution = Solution(machines=self.env.machines.keys())
+		if self.graph is None:
+			comp = self._arrays['comp']
+			if self._time:
+				if comp.shape[1] != self.env.num_machines:
+					return -1
+				self._runtime = comp
+				return 0
+			if self.env.has_comp:
+				self._runtime = self.env.calc_runtime_matrix(comp)
+				return 0
+			return -1
+		tasks = list(self.tasks)
 		if self._time:
 			# Check the number of computation values stored for each node so they match the
 			# nunber of machines in the system config
-			for task in self.tasks:
-				if len(self.tasks[task]['comp']) is not self.env.num_machines:
+			comp = [self.tasks[task]['comp'] for task in tasks]
+			for runtime_list in comp:
+				if len(runtime_list) != self.env.num_machines:
 					return -1
-				# if 'calculated_runtime' not in self.tasks[task]:
-				# 	self.tasks[task]['calculated_runtime'] = {}
-				machines = self.env.machines.keys()
-				runtime_list = self.tasks[task]['comp']
-				task.calculated_runtime = dict(zip(machines, runtime_list))
-			# sys.exit("Number of machines defined in environment is"
-			# 	  "not equivalent to the number definited in the workflow graph")
+			self._set_runtime(
+				np.array(comp).reshape(len(tasks), self.env.num_machines)
+			)
 			return 0
 		if self.env.has_comp:
 			# Use compute provided by system values to calculate the time taken
-			provided_flops = []
-			for m in self.env.machines:
-				for task in self.tasks:
-					# if 'calculated_runtime' not in self.tasks[task]:
-					# 	self.tasks[task]['calculated_runtime'] = {}
-					comp = task.flops_demand
-					task.calculated_runtime[m] = self.env.calc_task_runtime_on_machine(m,comp)
-			# self.tasks[node]['comp']
-			# TODO Use rates from environment in calcuation; for the time being rates are specified in the graph
-
+			self._set_runtime(self.env.calc_runtime_matrix(
+				np.array([task.flops_demand for task in tasks])
+			))
 			return 0
 
-	pass
+	def _set_runtime(self, runtime):
+		self._runtime = runtime
+		self._table.matrix = runtime
+		self._table.index = {m: i for i, m in enumerate(self.env.machines)}
+
+	def compile(self):
+		"""
+		Freeze the workflow graph into a CompiledWorkflow, which stores the
+		graph structure as CSR index arrays and the task runtimes as a dense
+		(n_tasks, n_machines) matrix. Scheduling algorithms use this instead
+		of walking the networkx graph.
+
+		The compiled workflow is cached until the environment changes.
+
+		:return: The CompiledWorkflow for the current graph and environment
+		"""
+		if self.compiled is not None:
+			return self.compiled
+		if self.env is None:
+			raise RuntimeError(
+				'Workflow requires an environment before it can be compiled'
+			)
+		if self.graph is None:
+			arrays = self._arrays
+			self.compiled = CompiledWorkflow(
+				tids=arrays['tids'],
+				machines=list(self.env.machines),
+				runtime=self._runtime,
+				succ_ptr=arrays['succ_ptr'],
+				succ_idx=arrays['succ_idx'],
+				data_size=arrays['data_size'],
+				pred=(arrays['pred_ptr'], arrays['pred_idx'], arrays['pred_eid']),
+				comm=self.env.communication
+			)
+			return self.compiled
+		tasks = list(self.graph.nodes)
+		index = {task: i for i, task in enumerate(tasks)}
+		machines = list(self.env.machines)
+		runtime = self._runtime
+		if runtime is None:
+			runtime = np.zeros((len(tasks), len(machines)), dtype=np.int64)
+
+		succ_ptr = np.zeros(len(tasks) + 1, dtype=np.int64)
+		succ_idx, data_size = [], []
+		for i, task in enumerate(tasks):
+			for successor, attr in self.graph.adj[task].items():
+				succ_idx.append(index[successor])
+				data_size.append(attr['data_size'])
+			succ_ptr[i + 1] = len(succ_idx)
+
+		self.compiled = CompiledWorkflow(
+			tids=np.array([task.tid for task in tasks]),
+			machines=machines,
+			runtime=runtime,
+			succ_ptr=succ_ptr,
+			succ_idx=np.array(succ_idx, dtype=np.int64),
+			data_size=np.array(data_size),
+			tasks=tasks,
+			comm=self.env.communication
+		)
+		return self.compiled
+
+	def update_runtime(self, tid, runtime):
+		"""
+		Revise the runtime estimate of a task. Ranks and allocations are not
+		changed; see heuristic.reschedule() to replan around the revision.
+
+		Runtimes calculated from FLOP/s are held as integers. A revision that
+		is not a whole number promotes the runtime matrix, and the recorded
+		finish times, to float rather than being truncated.
+
+		:param tid: Task id
+		:param runtime: New runtime, either a single value for every machine
+		or a sequence with one value per machine
+		:return: Index of the task in the compiled workflow
+		"""
+		cw = self.compile()
+		revision = np.asarray(runtime)
+		dtype = np.result_type(cw.runtime, revision)
+		if dtype != cw.runtime.dtype and (revision != np.round(revision)).any():
+			cw.runtime = cw.runtime.astype(dtype)
+			self._runtime = cw.runtime
+			self._table.matrix = cw.runtime
+			if cw.finish is not None:
+				cw.finish = cw.finish.astype(cw.time_type)
+		elif not cw.runtime.flags.writeable:
+			# Memory-mapped or shared runtimes are copied on first write
+			cw.runtime = np.array(cw.runtime)
+			self._runtime = cw.runtime
+			self._table.matrix = cw.runtime
+		i = cw.task_index[tid]
+		cw.runtime[i] = runtime
+		cw._classes = None
+		return i
 
 	def sort_tasks(self, sort_type):
 		"""
@@ -172,3 +424,392 @@ class Workflow(object):
 
 	def pretty_print_allocation(self):
 		print(json.dumps(self.machine_alloc, indent=2))
+
+
+def _read_cache(path):
+	"""
+	Rebuild the Task graph stored in a workflow cache file.
+
+	:return: (graph, time) as used by Workflow._setup()
+	"""
+	with np.load(path) as cache:
+		tids = cache['tids'].tolist()
+		comp = cache['comp'].tolist()
+		src = cache['src'].tolist()
+		dst = cache['dst'].tolist()
+		data_size = cache['data_size'].tolist()
+		time = cache['time'].item()
+	tasks = [Task(tid, c) for tid, c in zip(tids, comp)]
+	graph = nx.DiGraph()
+	graph.add_nodes_from((task, {'comp': c}) for task, c in zip(tasks, comp))
+	graph.add_edges_from(
+		(tasks[u], tasks[v], {'data_size': size})
+		for u, v, size in zip(src, dst, data_size)
+	)
+	return graph, time
+
+
+class CompiledWorkflow(object):
+	"""
+	Array-backed representation of a Workflow bound to an Environment.
+
+	Tasks are referred to by their index (0..n_tasks-1), which follows the
+	node order of the original graph; edges are referred to by their position
+	in the successor arrays.
+
+	:param tids: Task ids, indexed by task index
+	:param machines: Machine names, indexed by machine index
+	:param runtime: (n_tasks, n_machines) matrix of task runtimes
+	:param succ_ptr: CSR row pointer for the successor lists
+	:param succ_idx: CSR column indices (successor task indices)
+	:param data_size: Data size of each edge, in successor (CSR) order
+	:param tasks: Optional list of the Task objects the arrays were built from
+	:param comm: Optional CommunicationModel of the environment; without one
+	the transfer time of an edge is its data size
+	"""
+
+	def __init__(self, tids, machines, runtime, succ_ptr, succ_idx,
+				data_size, tasks=None, pred=None, comm=None):
+		self.tids = tids
+		self.machines = list(machines)
+		self.runtime = runtime
+		self.succ_ptr = succ_ptr
+		self.succ_idx = succ_idx
+		self.data_size = data_size
+		self.tasks = tasks
+		self.rank = None # Set by the ranking heuristics
+		if comm is None:
+			comm = CommunicationModel(self.machines)
+		self.comm = comm
+		self._average_comm = None
+		self._classes = None
+
+		self.num_tasks = len(tids)
+		self.num_machines = len(self.machines)
+		self.num_edges = len(succ_idx)
+		self.machine_index = {m: i for i, m in enumerate(self.machines)}
+		self._task_index = None
+		self._levels = None
+		self._level_numbers = None
+		# Machine index and finish time of each task in the current schedule;
+		# set by the scheduling heuristics
+		self.placed = None
+		self.finish = None
+
+		# Predecessor lists in CSR form. pred_eid maps each predecessor entry
+		# back to its edge, so data_size[pred_eid] lines up with pred_idx.
+		if pred is None:
+			pred = _transpose(succ_ptr, succ_idx)
+		self.pred_ptr, self.pred_idx, self.pred_eid = pred
+
+	@property
+	def task_index(self):
+		"""
+		Dictionary from task id to task index
+		"""
+		if self._task_index is None:
+			self._task_index = {
+				tid: i for i, tid in enumerate(self.tids.tolist())
+			}
+		return self._task_index
+
+	@property
+	def average_comm(self):
+		"""
+		HEFT average communication cost of every edge, in successor (CSR)
+		order (see CommunicationModel.average_cost)
+		"""
+		if self._average_comm is None:
+			self._average_comm = self.comm.average_cost(self.data_size)
+		return self._average_comm
+
+	def machine_classes(self):
+		"""
+		Group the machines that are interchangeable to a scheduler: machines
+		of the same category (so with the same data rate and cost) on which
+		every task has the same runtime.
+
+		Machines are keyed by category and the sum and maximum of their
+		runtime column, and a machine only joins a class after its column
+		is compared with the representative's, so the runtime matrix is
+		never copied.
+
+		:return: (classes, representatives) arrays: the class index of each
+		machine, and the lowest machine index of each class. Classes are
+		numbered in order of their representatives.
+		"""
+		if self._classes is None:
+			runtime = np.asarray(self.runtime)
+			keys = zip(
+				self.comm.category.tolist(),
+				runtime.sum(axis=0).tolist(),
+				runtime.max(axis=0, initial=0).tolist()
+			)
+			candidates = {}
+			classes = np.empty(self.num_machines, dtype=np.int64)
+			representatives = []
+			for m, key in enumerate(keys):
+				for c in candidates.setdefault(key, []):
+					rep = representatives[c]
+					if np.array_equal(runtime[:, m], runtime[:, rep]):
+						classes[m] = c
+						break
+				else:
+					classes[m] = len(representatives)
+					candidates[key].append(classes[m])
+					representatives.append(m)
+			self._classes = (classes, np.array(representatives, dtype=np.int64))
+		return self._classes
+
+	@property
+	def time_type(self):
+		"""
+		dtype of the start and finish times of tasks
+		"""
+		return np.result_type(self.runtime, self.comm.result_type(self.data_size))
+
+	@property
+	def edge_src(self):
+		"""
+		Source task index of every edge
+		"""
+		return np.repeat(
+			np.arange(self.num_tasks, dtype=np.int64), np.diff(self.succ_ptr)
+		)
+
+	@property
+	def edge_dst(self):
+		"""
+		Destination task index of every edge
+		"""
+		return self.succ_idx
+
+	def successors(self, i):
+		"""
+		:return: Array of successor task indices for task index i
+		"""
+		return self.succ_idx[self.succ_ptr[i]:self.succ_ptr[i + 1]]
+
+	def predecessors(self, i):
+		"""
+		:return: Array of predecessor task indices for task index i
+		"""
+		return self.pred_idx[self.pred_ptr[i]:self.pred_ptr[i + 1]]
+
+	def predecessor_data(self, i):
+		"""
+		:return: Array of the data sizes on the edges into task index i,
+		aligned with predecessors(i)
+		"""
+		eid = self.pred_eid[self.pred_ptr[i]:self.pred_ptr[i + 1]]
+		return self.data_size[eid]
+
+	def successor_edges(self, nodes):
+		"""
+		Gather the outgoing edges of a set of tasks.
+
+		:param nodes: Array of task indices
+		:return: (edges, counts), where edges holds the edge ids of every
+		task in nodes, grouped by task, and counts the number of edges
+		belonging to each task
+		"""
+		return _gather_segments(self.succ_ptr, nodes)
+
+	def predecessor_edges(self, nodes):
+		"""
+		Gather the incoming edges of a set of tasks.
+
+		:param nodes: Array of task indices
+		:return: (positions, counts), where positions index pred_idx and
+		pred_eid for every task in nodes, grouped by task, and counts the
+		number of predecessors of each task
+		"""
+		return _gather_segments(self.pred_ptr, nodes)
+
+	def reverse_levels(self):
+		"""
+		Partition the tasks into levels, starting with the exit tasks, such
+		that every successor of a task is in an earlier level. Iterating
+		over the levels visits the tasks in reverse topological order.
+
+		:return: List of task index arrays
+		"""
+		if self._levels is not None:
+			return self._levels
+		remaining = np.diff(self.succ_ptr)
+		slot = np.zeros(self.num_tasks, dtype=np.int64)
+		level = np.flatnonzero(remaining == 0)
+		levels = []
+		visited = 0
+		while len(level):
+			levels.append(level)
+			visited += len(level)
+			positions, _ = self.predecessor_edges(level)
+			preds = self.pred_idx[positions]
+			np.subtract.at(remaining, preds, 1)
+			ready = preds[remaining[preds] == 0]
+			# A task appears once for each of its successors in this level;
+			# keep only the last occurrence of each
+			order = np.arange(len(ready))
+			slot[ready] = order
+			level = ready[slot[ready] == order]
+		if visited != self.num_tasks:
+			raise ValueError('Workflow graph contains a cycle')
+		self._levels = levels
+		return levels
+
+	def level_numbers(self):
+		"""
+		:return: Array of the position of each task's level in
+		reverse_levels(), so that every successor of a task has a lower
+		level number than the task
+		"""
+		if self._level_numbers is None:
+			numbers = np.empty(self.num_tasks, dtype=np.int64)
+			for k, level in enumerate(self.reverse_levels()):
+				numbers[level] = k
+			self._level_numbers = numbers
+		return self._level_numbers
+
+	def ancestors(self, nodes):
+		"""
+		:param nodes: Array of task indices
+		:return: Sorted array of the task indices in nodes and of every task
+		from which one of them can be reached
+		"""
+		seen = np.zeros(self.num_tasks, dtype=bool)
+		frontier = np.unique(nodes)
+		seen[frontier] = True
+		found = [frontier]
+		while len(frontier):
+			positions, _ = self.predecessor_edges(frontier)
+			preds = np.unique(self.pred_idx[positions])
+			frontier = preds[~seen[preds]]
+			seen[frontier] = True
+			found.append(frontier)
+		return np.sort(np.concatenate(found))
+
+	def predecessor_lists(self):
+		"""
+		Python-list form of the predecessor CSR, for scheduling loops that
+		visit one task at a time and would otherwise pay for NumPy scalar
+		indexing.
+
+		:return: List of (predecessor indices, data sizes) pairs, indexed by
+		task index
+		"""
+		ptr = self.pred_ptr.tolist()
+		idx = self.pred_idx.tolist()
+		data = self.data_size[self.pred_eid].tolist()
+		return [
+			(idx[ptr[i]:ptr[i + 1]], data[ptr[i]:ptr[i + 1]])
+			for i in range(self.num_tasks)
+		]
+
+
+def _transpose(succ_ptr, succ_idx):
+	"""
+	Build the predecessor CSR (pred_ptr, pred_idx, pred_eid) from the
+	successor CSR.
+	"""
+	num_tasks = len(succ_ptr) - 1
+	pred_eid = np.argsort(succ_idx, kind='stable')
+	pred_idx = np.repeat(
+		np.arange(num_tasks, dtype=np.int64), np.diff(succ_ptr)
+	)[pred_eid]
+	pred_ptr = np.zeros(num_tasks + 1, dtype=np.int64)
+	np.cumsum(np.bincount(succ_idx, minlength=num_tasks), out=pred_ptr[1:])
+	return pred_ptr, pred_idx, pred_eid
+
+
+ARRAY_COLUMNS = [
+	'tids', 'comp', 'succ_ptr', 'succ_idx', 'data_size',
+	'pred_ptr', 'pred_idx', 'pred_eid'
+]
+
+
+def write_arrays(directory, time, tids, comp, src, dst, data_size):
+	"""
+	Write a workflow as a directory of .npy columns for Workflow.from_arrays().
+	This does not need a networkx graph, so translators can write very large
+	graphs directly.
+
+	:param directory: Output directory (created if necessary)
+	:param time: True if comp holds runtimes, False if it holds FLOPs
+	:param tids: Task ids
+	:param comp: Runtime (n_tasks, n_machines) or FLOPs (n_tasks,) per task
+	:param src: Source task index of each edge
+	:param dst: Destination task index of each edge
+	:param data_size: Data size of each edge
+	"""
+	os.makedirs(directory, exist_ok=True)
+	src = np.asarray(src, dtype=np.int64)
+	order = np.argsort(src, kind='stable')
+	succ_idx = np.asarray(dst, dtype=np.int64)[order]
+	succ_ptr = np.zeros(len(tids) + 1, dtype=np.int64)
+	np.cumsum(np.bincount(src, minlength=len(tids)), out=succ_ptr[1:])
+	pred_ptr, pred_idx, pred_eid = _transpose(succ_ptr, succ_idx)
+	columns = {
+		'tids': np.asarray(tids),
+		'comp': np.asarray(comp),
+		'succ_ptr': succ_ptr,
+		'succ_idx': succ_idx,
+		'data_size': np.asarray(data_size)[order],
+		'pred_ptr': pred_ptr,
+		'pred_idx': pred_idx,
+		'pred_eid': pred_eid
+	}
+	for name in ARRAY_COLUMNS:
+		np.save(os.path.join(directory, name + '.npy'), columns[name])
+	with open(os.path.join(directory, 'header.json'), 'w') as outfile:
+		json.dump({'time': time}, outfile)
+
+
+def read_arrays(directory, mmap_mode='r'):
+	"""
+	:return: Dictionary of the columns written by write_arrays(), plus the
+	'time' header value
+	"""
+	arrays = {
+		name: np.load(
+			os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode
+		)
+		for name in ARRAY_COLUMNS
+	}
+	with open(os.path.join(directory, 'header.json'), 'r') as infile:
+		arrays['time'] = json.load(infile)['time']
+	return arrays
+
+
+def _gather_segments(ptr, nodes):
+	"""
+	Concatenate the CSR segments ptr[i]:ptr[i+1] for every i in nodes.
+
+	:return: (positions, counts) of the gathered entries
+	"""
+	starts = ptr[nodes]
+	counts = ptr[nodes + 1] - starts
+	if len(nodes) == 1:
+		return np.arange(starts[0], starts[0] + counts[0]), counts
+	offsets = np.cumsum(counts) - counts
+	positions = np.arange(counts.sum()) + np.repeat(starts - offsets, counts)
+	return positions, counts
+
+
+def segment_max(values, counts, initial=0):
+	"""
+	Maximum of each consecutive segment of values (along the first axis),
+	where counts holds the length of each segment. Empty segments, and
+	segments whose maximum is below initial, take the value initial.
+	"""
+	out = np.full(
+		(len(counts),) + np.shape(values)[1:], initial,
+		dtype=np.result_type(values, initial)
+	)
+	nonempty = counts > 0
+	if len(values):
+		starts = (np.cumsum(counts) - counts)[nonempty]
+		out[nonempty] = np.maximum(
+			np.maximum.reduceat(values, starts, axis=0), initial
+		)
+	return out
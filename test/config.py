@@ -28,8 +28,13 @@ test_heuristic_data = {  # Tests that use the Topcuoglu paper graph
 	'topcuoglu_graph_nocalc': 'test/data/heuristic/heft_nocalc.json',
 	'flops_test_attr': 'test/data/flop_rep_test.json',
 	"topcuoglu_graph_system": 'test/data/heuristic/final_heft_sys.json',
+	# The Topcuoglu machines, with a different data rate for each category
+	"topcuoglu_graph_rates_system": 'test/data/heuristic/final_heft_rates_sys.json',
 	# Tests that use the PHEFT paper graph
 	'pheft_graph': 'test/data/heuristic/pheft_nocalc.json',
+	# A DALiuGE graph whose optimistic costs exceed 1000
+	'daliuge_graph': 'test/data/heuristic/daliugesample.json',
+	'daliuge_graph_system': 'test/data/heuristic/daliugesample_sys.json',
 	# 'pheft_attr': 'test/data/pheft_attr.json',
 	# 'pheft_ccost':'test/data/oct_comm.txt',
 }
@@ -61,3 +66,8 @@ test_environment_data = {
 	'environment_sys': 'test/data/environment/ggen_out_2-denselu_sys.json'
 }
 
+test_batch_data = {
+	'pair_dir': 'test/data/heuristic',
+	'topcuoglu_graph': 'test/data/metaheuristic/final_heft.json',
+	'graph_sys_with_costs': 'test/data/metaheuristic/final_heft_sys.json'
+}
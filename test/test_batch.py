@@ -0,0 +1,63 @@
+# Copyright (C) 2020 RW Bunney
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+import csv
+import os
+import tempfile
+
+from test import config as cfg
+from shadow import batch
+
+
+class TestBatchRunner(unittest.TestCase):
+
+	def setUp(self):
+		fd, self.output = tempfile.mkstemp(suffix='.csv')
+		os.close(fd)
+
+	def tearDown(self):
+		os.remove(self.output)
+
+	def test_find_pairs(self):
+		pairs = batch.find_pairs(cfg.test_batch_data['pair_dir'])
+		workflows = [os.path.basename(w) for w, e in pairs]
+		self.assertEqual(['daliugesample.json', 'final_heft.json'], workflows)
+		for workflow, environment in pairs:
+			self.assertEqual(
+				workflow[:-len('.json')] + '_sys.json', environment
+			)
+
+	def test_run_pair(self):
+		job = (
+			cfg.test_batch_data['topcuoglu_graph'],
+			cfg.test_batch_data['graph_sys_with_costs'],
+			['heft', 'pheft'],
+			None
+		)
+		results = batch.run_pair(job)
+		self.assertEqual(['heft', 'pheft'], [r['algorithm'] for r in results])
+		self.assertEqual(98, results[0]['makespan'])
+		self.assertIsNone(results[0]['error'])
+		self.assertGreater(results[0]['cost'], 0)
+
+	def test_run_batch(self):
+		pairs = batch.find_pairs(cfg.test_batch_data['pair_dir'])
+		results = batch.run_batch(pairs, ['heft'], self.output, workers=2)
+		self.assertEqual(len(pairs), len(results))
+		with open(self.output, 'r', newline='') as infile:
+			rows = list(csv.DictReader(infile))
+		self.assertEqual(len(pairs), len(rows))
+		self.assertEqual(batch.RESULT_FIELDS, list(rows[0].keys()))
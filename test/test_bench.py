@@ -0,0 +1,83 @@
+# Copyright (C) 2020 RW Bunney
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+import json
+import os
+import tempfile
+
+from shadow import bench
+from shadow.algorithms.heuristic import heft
+from shadow.classes.environment import Environment
+from shadow.classes.workflow import Workflow
+
+
+class TestBenchmarks(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		self.workflow = os.path.join(self.directory.name, 'bench.json')
+		self.environment = os.path.join(self.directory.name, 'bench_sys.json')
+
+	def tearDown(self):
+		self.directory.cleanup()
+
+	def test_generate(self):
+		num_edges = bench.generate_workflow(self.workflow, 200, ccr=2.0, seed=3)
+		bench.generate_environment(self.environment, 6, heterogeneity=4.0, categories=3)
+		wf = Workflow(self.workflow)
+		env = Environment(self.environment)
+		self.assertEqual(200, len(wf.tasks))
+		self.assertEqual(num_edges, len(wf.edges))
+		self.assertEqual(6, env.num_machines)
+		flops = sorted(m['flops'] for m in env.machines.values())
+		self.assertAlmostEqual(4.0, flops[-1] / flops[0])
+		self.assertAlmostEqual(1.0, sum(flops) / len(flops))
+
+		with open(self.workflow) as infile:
+			first = infile.read()
+		bench.generate_workflow(self.workflow, 200, ccr=2.0, seed=3)
+		with open(self.workflow) as infile:
+			self.assertEqual(first, infile.read())
+
+	def test_run_benchmarks(self):
+		workloads = bench.workloads([50], ccrs=[0.5, 5.0], machines=[4])
+		output = os.path.join(self.directory.name, 'report.json')
+		report = bench.run_benchmarks(
+			workloads, ['heft', 'pheft'], output=output, repeat=1
+		)
+		with open(output) as infile:
+			self.assertEqual(report['results'], json.load(infile)['results'])
+		self.assertEqual(4, len(report['results']))
+		for result in report['results']:
+			for phase in bench.PHASES:
+				self.assertGreaterEqual(result[phase], 0)
+			self.assertGreater(result['peak_memory'], 0)
+
+		# The benchmarked makespan matches a plain run of the algorithm
+		bench.generate_workflow(self.workflow, 50, ccr=0.5)
+		bench.generate_environment(self.environment, 4, 2.0)
+		wf = Workflow(self.workflow)
+		wf.add_environment(Environment(self.environment))
+		self.assertEqual(heft(wf), report['results'][0]['makespan'])
+
+	def test_cost_algorithms(self):
+		workloads = bench.workloads([30], ccrs=[1.0], machines=[3])
+		report = bench.run_benchmarks(
+			workloads, ['pcp', 'mols'], repeat=1, memory=False
+		)
+		self.assertEqual(2, len(report['results']))
+		for result in report['results']:
+			self.assertGreater(result['makespan'], 0)
@@ -15,7 +15,8 @@
 import unittest
 from test.config import test_environment_data
 import os
-from shadow.classes.environment import Environment
+import tempfile
+from shadow.classes.environment import Environment, CommunicationModel
 # Tests for /algorithms/heuristic.py
 
 
@@ -33,3 +34,42 @@ class TestEnvironmentInit(unittest.TestCase):
 	def tearDown(self) -> None:
 		pass
 
+
+	def test_cache(self):
+		with tempfile.TemporaryDirectory() as cache_dir:
+			path = os.path.join(cache_dir, 'environment.npz')
+			self.env.save_cache(path)
+			cached = Environment.from_cache(path)
+			self.assertEqual(self.env.machines, cached.machines)
+			self.assertEqual(self.env.rates, cached.rates)
+			self.assertEqual(self.env.has_comp, cached.has_comp)
+			self.assertEqual(self.env.has_cost, cached.has_cost)
+
+
+class TestCommunicationModel(unittest.TestCase):
+	def setUp(self) -> None:
+		# Two machines at rate 9 and two at rate 4
+		self.comm = Environment(test_environment_data['environment_sys']).communication
+
+	def test_transfer_times(self):
+		self.assertEqual([[9, 4], [4, 4]], self.comm.bandwidth.tolist())
+		self.assertEqual(
+			[0, 4, 9, 9],
+			self.comm.transfer_times(36, 0, [0, 1, 2, 3]).tolist()
+		)
+		self.assertEqual(
+			[9, 0], self.comm.transfer_times([36, 36], [3, 2], 2).tolist()
+		)
+
+	def test_average_cost(self):
+		# 12 ordered pairs of distinct machines: 2 at rate 9, 10 at rate 4
+		expected = 36 * (2 / 9 + 10 / 4) / 12
+		self.assertAlmostEqual(expected, self.comm.average_cost(36).item())
+		self.assertIsNone(self.comm.uniform)
+
+	def test_unit_rates(self):
+		comm = CommunicationModel(['cat0_m0', 'cat1_m1'])
+		self.assertTrue(comm.unit)
+		self.assertEqual([0, 5], comm.transfer_times(5, 0, [0, 1]).tolist())
+		self.assertEqual(5, comm.average_cost(5))
+
@@ -0,0 +1,79 @@
+# Copyright (C) 2020 RW Bunney
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import unittest
+
+import numpy as np
+
+from test import config as cfg
+from shadow.algorithms.fitness import Schedules, machine_prices, \
+	run_objectives, natural_units
+from shadow.algorithms.metaheuristic import nsga2
+from shadow.classes.workflow import Workflow
+from shadow.classes.environment import Environment
+
+current_dir = os.path.abspath('.')
+
+
+class TestObjectives(unittest.TestCase):
+
+	def setUp(self):
+		# Two schedules of three tasks on two machines
+		self.schedules = Schedules(
+			start=np.array([[0, 2, 2], [0, 0, 4]]),
+			finish=np.array([[2, 4, 6], [4, 4, 8]]),
+			machine=np.array([[0, 0, 1], [0, 1, 1]]),
+			prices=np.array([1.0, 0.5])
+		)
+
+	def test_objectives(self):
+		values = run_objectives(
+			['time', 'cost', 'throughput', 'utilisation'], self.schedules
+		)
+		self.assertEqual((2, 4), values.shape)
+		self.assertEqual([6, 8], values[:, 0].tolist())
+		self.assertEqual([2 + 2 + 2, 4 + 2 + 2], values[:, 1].tolist())
+		self.assertEqual([3 / 6, 3 / 8], values[:, 2].tolist())
+		self.assertEqual([8 / 12, 12 / 16], values[:, 3].tolist())
+
+	def test_minimise(self):
+		objectives = ['time', 'throughput']
+		values = run_objectives(objectives, self.schedules, minimise=True)
+		self.assertEqual([-3 / 6, -3 / 8], values[:, 1].tolist())
+		self.assertEqual(
+			run_objectives(objectives, self.schedules).tolist(),
+			natural_units(objectives, values).tolist()
+		)
+		self.assertRaises(
+			ValueError, run_objectives, ['reliability'], self.schedules
+		)
+
+	def test_metaheuristic_objectives(self):
+		wf = Workflow("{0}/{1}".format(
+			current_dir, cfg.test_metaheuristic_data['topcuoglu_graph']
+		))
+		env = Environment("{0}/{1}".format(
+			current_dir, cfg.test_metaheuristic_data['graph_sys_with_costs']
+		))
+		wf.add_environment(env)
+		self.assertEqual(3, len(machine_prices(wf)))
+		front = nsga2(
+			wf, 10, generations=5, popsize=10, objectives=('time', 'utilisation')
+		)
+		for soln in front:
+			self.assertEqual(soln.makespan, soln.objectives['time'])
+			self.assertGreater(soln.objectives['utilisation'], 0)
+			self.assertLessEqual(soln.objectives['utilisation'], 1)
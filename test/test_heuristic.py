@@ -17,11 +17,17 @@
 import unittest
 import networkx as nx
 import os
+import sys
+import json
+import tempfile
 import logging
 
+import numpy as np
+
 from test import config as cfg
 from shadow.algorithms.heuristic import upward_rank, upward_oct_rank, \
-	heft, pheft
+	heft, pheft, ready_times, schedule_arrays, reschedule, \
+	insertion_policy_lookahead, pcp, mols
 from shadow.classes.workflow import Workflow
 from shadow.classes.environment import Environment
 
@@ -35,6 +41,37 @@ logging.basicConfig(level='WARNING')
 current_dir = os.path.abspath('.')
 
 
+def assert_valid_schedule(test, wf, solution=None):
+	"""
+	Check that every task of wf is allocated once, that no two allocations
+	on a machine overlap, and that each task starts after the data from its
+	predecessors has arrived.
+
+	:param test: The TestCase making the assertions
+	:param wf: Scheduled workflow
+	:param solution: Solution to check, if not wf.solution
+	"""
+	solution = wf.solution if solution is None else solution
+	cw = wf.compile()
+	count = 0
+	for allocations in solution.list_all_allocations().values():
+		for prev, a in zip(allocations, allocations[1:]):
+			test.assertLessEqual(prev.aft, a.ast)
+		count += len(allocations)
+	test.assertEqual(cw.num_tasks, count)
+	for i, tid in enumerate(cw.tids.tolist()):
+		machine, a = solution.find_alloc(tid)
+		for p, data_size in zip(
+			cw.predecessors(i).tolist(), cw.predecessor_data(i).tolist()
+		):
+			pred_machine, pred = solution.find_alloc(cw.tids[p].item())
+			comm = cw.comm.transfer_times(
+				data_size,
+				cw.machine_index[pred_machine], cw.machine_index[machine]
+			)
+			test.assertGreaterEqual(a.ast, pred.aft + comm)
+
+
 class TestHeftMethods(unittest.TestCase):
 	"""
 	This class test HEFT on the same example graph presented by
@@ -62,6 +99,192 @@ class TestHeftMethods(unittest.TestCase):
 		self.wf.pretty_print_allocation()
 		self.assertTrue(retval == 80)
 
+	def test_ready_times(self):
+		heft(self.wf)
+		cw = self.wf.compile()
+		placed, finish = schedule_arrays(cw)
+		for i, task in enumerate(cw.tasks):
+			placed[i] = cw.machine_index[task.machine]
+			finish[i] = task.aft
+		for i in range(cw.num_tasks):
+			expected = []
+			for m in range(cw.num_machines):
+				ready = 0
+				preds = zip(cw.predecessors(i), cw.predecessor_data(i))
+				for p, data_size in preds:
+					comm = 0 if placed[p] == m else data_size
+					ready = max(ready, finish[p] + comm)
+				expected.append(ready)
+			self.assertEqual(
+				expected, ready_times(cw, i, placed, finish).tolist()
+			)
+
+
+class TestHeftWithRates(unittest.TestCase):
+	"""
+	HEFT on the Topcuoglu graph, with a different data rate for each machine
+	category
+	"""
+
+	def setUp(self):
+		self.wf = Workflow("{0}/{1}".format(current_dir, cfg.test_heuristic_data['topcuoglu_graph_nocalc']))
+		env = Environment("{0}/{1}".format(current_dir, cfg.test_heuristic_data['topcuoglu_graph_rates_system']))
+		self.wf.add_environment(env)
+
+	def test_rank(self):
+		cw = self.wf.compile()
+		rank = upward_rank(self.wf)
+		# Rates are 2, 1 and 4, so links run at 1, 1 and 2 in each direction
+		mean_inverse = (1 + 1 + 1 / 2) / 3
+		for i in range(cw.num_tasks):
+			successors = cw.successors(i)
+			data = cw.data_size[cw.succ_ptr[i]:cw.succ_ptr[i + 1]]
+			expected = cw.runtime[i].mean() + max(
+				(data * mean_inverse + rank[successors]).tolist(), default=0
+			)
+			self.assertAlmostEqual(expected, rank[i])
+
+	def test_schedule(self):
+		makespan = heft(self.wf)
+		assert_valid_schedule(self, self.wf)
+		self.assertEqual(makespan, self.wf.compile().finish.max())
+
+
+class TestHeftMachineClasses(unittest.TestCase):
+	"""
+	HEFT with interchangeable machines searched as pools, on two categories
+	of two identical machines
+	"""
+
+	def setUp(self):
+		self.wf = Workflow("{0}/{1}".format(current_dir, cfg.test_workflow_data['topcuoglu_graph']))
+		env = Environment("{0}/{1}".format(current_dir, cfg.test_environment_data['environment_sys']))
+		self.wf.add_environment(env)
+
+	def test_machine_classes(self):
+		classes, representatives = self.wf.compile().machine_classes()
+		self.assertListEqual([0, 0, 1, 1], classes.tolist())
+		self.assertListEqual([0, 2], representatives.tolist())
+
+	def test_schedule(self):
+		makespan = heft(self.wf, aggregate=True)
+		assert_valid_schedule(self, self.wf)
+		self.assertEqual(makespan, self.wf.compile().finish.max())
+
+	def test_single_machine_classes(self):
+		# With one machine in each class the pools are searched exactly
+		placed = []
+		for aggregate in (False, True):
+			wf = Workflow("{0}/{1}".format(current_dir, cfg.test_heuristic_data['topcuoglu_graph_nocalc']))
+			wf.add_environment(Environment("{0}/{1}".format(current_dir, cfg.test_workflow_data['topcuoglu_graph_system'])))
+			self.assertEqual(80, heft(wf, aggregate=aggregate))
+			placed.append(wf.compile().placed.tolist())
+		self.assertListEqual(placed[0], placed[1])
+
+
+class TestHeftLookahead(unittest.TestCase):
+	"""
+	HEFT with a lookahead on the Topcuoglu graph
+	"""
+
+	def setUp(self):
+		self.wf = Workflow("{0}/{1}".format(current_dir, cfg.test_heuristic_data['topcuoglu_graph_nocalc']))
+		env = Environment("{0}/{1}".format(current_dir, cfg.test_workflow_data['topcuoglu_graph_system']))
+		self.wf.add_environment(env)
+
+	def test_no_lookahead(self):
+		self.assertEqual(80, insertion_policy_lookahead(self.wf, depth=0))
+		self.assertListEqual(
+			[2, 0, 2, 1, 2, 1, 2, 0, 1, 1], self.wf.compile().placed.tolist()
+		)
+
+	def test_schedule(self):
+		makespan = heft(self.wf, lookahead=1)
+		self.assertEqual(76, makespan)
+		assert_valid_schedule(self, self.wf)
+
+
+class TestPCP(unittest.TestCase):
+	"""
+	IC-PCP on the Topcuoglu graph, with a price for each machine category
+	"""
+
+	def setUp(self):
+		self.wf = Workflow("{0}/{1}".format(current_dir, cfg.test_metaheuristic_data['topcuoglu_graph']))
+		env = Environment("{0}/{1}".format(current_dir, cfg.test_metaheuristic_data['graph_sys_with_costs']))
+		self.wf.add_environment(env)
+
+	def check_schedule(self):
+		assert_valid_schedule(self, self.wf)
+		cw = self.wf.compile()
+		start = cw.finish - cw.runtime[np.arange(cw.num_tasks), cw.placed]
+		prices = np.array([0.5, 0.7, 1.1])
+		cost = (prices[cw.placed] * (cw.finish - start)).sum()
+		self.assertAlmostEqual(cost, self.wf.solution.solution_cost)
+
+	def test_schedule(self):
+		makespan = pcp(self.wf, deadline=150)
+		self.assertLessEqual(makespan, 150)
+		self.check_schedule()
+		self.assertAlmostEqual(97.3, self.wf.solution.solution_cost)
+
+	def test_deadline(self):
+		# Looser deadlines leave room for the cheaper, slower machines
+		costs = []
+		for deadline in [150, 200, 300]:
+			self.setUp()
+			self.assertLessEqual(pcp(self.wf, deadline=deadline), deadline)
+			self.check_schedule()
+			costs.append(self.wf.solution.solution_cost)
+		self.assertGreater(costs[0], costs[1])
+		self.assertGreater(costs[1], costs[2])
+		# Every task fits on the cheapest machine
+		self.assertListEqual([0] * 10, self.wf.compile().placed.tolist())
+
+	def test_missed_deadline(self):
+		# The schedule stays valid when the deadline cannot be met
+		self.assertGreater(pcp(self.wf, deadline=50), 50)
+		self.check_schedule()
+
+
+class TestMOLS(unittest.TestCase):
+	"""
+	Multi-objective list scheduling on the Topcuoglu graph, with a price for
+	each machine category
+	"""
+
+	def setUp(self):
+		self.wf = Workflow("{0}/{1}".format(current_dir, cfg.test_metaheuristic_data['topcuoglu_graph']))
+		env = Environment("{0}/{1}".format(current_dir, cfg.test_metaheuristic_data['graph_sys_with_costs']))
+		self.wf.add_environment(env)
+
+	def test_front(self):
+		front = mols(self.wf, size=5)
+		self.assertListEqual(
+			[88, 98, 111, 124, 171], [s.makespan for s in front]
+		)
+		for soln, cost in zip(front, [114.5, 107.8, 98.1, 95.1, 85.5]):
+			self.assertAlmostEqual(cost, soln.solution_cost)
+		cw = self.wf.compile()
+		prices = {'cat0_m0': 0.5, 'cat1_m1': 0.7, 'cat2_m2': 1.1}
+		for soln in front:
+			assert_valid_schedule(self, self.wf, soln)
+			cost = 0
+			for tid in cw.tids.tolist():
+				machine, a = soln.find_alloc(tid)
+				cost += prices[machine] * (a.aft - a.ast)
+			self.assertEqual(soln.makespan, max(
+				a.aft for m in cw.machines
+				for a in soln.list_machine_allocations(m)
+			))
+			self.assertAlmostEqual(cost, soln.solution_cost)
+
+	def test_size(self):
+		front = mols(self.wf, size=2)
+		self.assertEqual(2, len(front))
+		self.assertLess(front[0].makespan, front[1].makespan)
+		self.assertGreater(front[0].solution_cost, front[1].solution_cost)
+
 
 class TestHeftMethodCalcTime(unittest.TestCase):
 	def setUp(self):
@@ -80,6 +303,57 @@ class TestHeftMethodCalcTime(unittest.TestCase):
 		self.wf.pretty_print_allocation()
 		self.assertTrue(retval == 98)
 
+	def test_schedule_from_arrays(self):
+		with tempfile.TemporaryDirectory() as directory:
+			self.wf.save_arrays(directory)
+			wf = Workflow.from_arrays(directory)
+			wf.add_environment(self.wf.env)
+			self.assertEqual(98, heft(wf))
+			wf.add_environment(self.wf.env)
+			self.assertEqual(95, pheft(wf))
+			self.assertEqual(
+				10, sum(len(a) for a in wf.solution.list_all_allocations().values())
+			)
+			del wf
+
+
+class TestUpwardRankDeepGraph(unittest.TestCase):
+	"""
+	Ranking a pipeline that is deeper than the recursion limit
+	"""
+
+	def setUp(self):
+		self.length = sys.getrecursionlimit() * 2
+		nodes = [{'comp': [1, 2, 3], 'id': i} for i in range(self.length)]
+		links = [
+			{'source': i, 'target': i + 1, 'data_size': 2}
+			for i in range(self.length - 1)
+		]
+		config = {
+			'header': {'time': True},
+			'graph': {
+				'directed': True, 'multigraph': False, 'graph': {},
+				'nodes': nodes, 'links': links
+			}
+		}
+		fd, self.path = tempfile.mkstemp(suffix='.json')
+		with os.fdopen(fd, 'w') as jfile:
+			json.dump(config, jfile)
+		self.wf = Workflow(self.path)
+		env = Environment("{0}/{1}".format(current_dir, cfg.test_workflow_data['topcuoglu_graph_system']))
+		self.wf.add_environment(env)
+
+	def tearDown(self):
+		os.remove(self.path)
+
+	def test_rank(self):
+		rank = upward_rank(self.wf)
+		# Each task adds its average runtime (2) and the edge cost (2)
+		self.assertEqual(4 * self.length - 2, rank[0])
+		self.assertEqual(2, rank[-1])
+		for task in self.wf.tasks:
+			self.assertEqual(4 * (self.length - task.tid) - 2, task.rank)
+
 
 @unittest.SkipTest
 class TestHeftMethodLargeGraph(unittest.TestCase):
@@ -117,8 +391,8 @@ class TestPHeftMethods(unittest.TestCase):
 							self.up_rank_values[node.tid])
 
 	def test_oct_rank(self):
-		oct_rank_matrix = dict()
-		upward_oct_rank(self.wf, oct_rank_matrix)
+		oct_table = upward_oct_rank(self.wf)
+		self.assertEqual((10, 3), oct_table.shape)
 		sorted_tasks = self.wf.sort_tasks('rank')
 		for node in sorted_tasks:
 			self.assertTrue(node.rank ==
@@ -136,6 +410,88 @@ class TestPHeftMethods(unittest.TestCase):
 		self.assertTrue(retval == 122)
 
 
+class TestPHeftLargeCosts(unittest.TestCase):
+
+	def setUp(self):
+		self.wf = Workflow(cfg.test_heuristic_data['daliuge_graph'])
+		env = Environment(cfg.test_heuristic_data['daliuge_graph_system'])
+		self.wf.add_environment(env)
+
+	def test_oct_is_not_capped(self):
+		# OCT entries used to be capped at 1000, which ranked the entry
+		# tasks of this graph too low
+		oct_table = upward_oct_rank(self.wf)
+		self.assertListEqual([1114, 1177, 1206], oct_table[0].tolist())
+		self.assertListEqual([1114, 1177, 1226], oct_table[2].tolist())
+		ranks = {task.tid: task.rank for task in self.wf.tasks}
+		self.assertEqual(1165, ranks[0])
+		self.assertEqual(1172, ranks[2])
+
+	def test_pheft_schedule(self):
+		self.assertEqual(1934, pheft(self.wf))
+
+	def test_heft_makespan_is_max_finish(self):
+		makespan = heft(self.wf)
+		self.assertEqual(1779, makespan)
+		self.assertEqual(makespan, max(task.aft for task in self.wf.tasks))
+
+
+class TestReschedule(unittest.TestCase):
+
+	def setUp(self):
+		self.wf = Workflow("{0}/{1}".format(current_dir, cfg.test_workflow_data['topcuoglu_graph']))
+		env = Environment("{0}/{1}".format(current_dir, cfg.test_workflow_data['topcuoglu_graph_system']))
+		self.wf.add_environment(env)
+		self.makespan = heft(self.wf)
+		self.cw = self.wf.compile()
+
+	def allocations(self):
+		assert_valid_schedule(self, self.wf)
+		allocations = {}
+		for machine, allocs in self.wf.solution.list_all_allocations().items():
+			for a in allocs:
+				allocations[a.tid] = (machine, a.ast, a.aft)
+		return allocations
+
+	def test_replan_everything(self):
+		self.assertEqual(self.makespan, reschedule(self.wf, 0))
+
+	def test_runtime_revision(self):
+		before = self.allocations()
+		tid = 6
+		old_ranks = self.cw.rank.copy()
+		reschedule(self.wf, 40, runtimes={tid: 30})
+		after = self.allocations()
+		for t, (machine, ast, aft) in before.items():
+			if ast < 40 and t != tid:
+				self.assertEqual((machine, ast, aft), after[t])
+		# Only the ancestors of the revised task are re-ranked
+		ranks = self.cw.rank.copy()
+		self.cw.rank = None
+		upward_rank(self.wf)
+		self.assertEqual(ranks.tolist(), self.cw.rank.tolist())
+		ancestors = self.cw.ancestors([self.cw.task_index[tid]])
+		changed = np.flatnonzero(ranks != old_ranks)
+		self.assertTrue(set(changed.tolist()) <= set(ancestors.tolist()))
+
+	def test_fractional_runtime(self):
+		# FLOP/s runtimes are integers; the revision must not be truncated
+		reschedule(self.wf, 40, runtimes={6: 12.7})
+		self.allocations()
+		i = self.cw.task_index[6]
+		self.assertListEqual([12.7] * 3, self.cw.runtime[i].tolist())
+		machine, a = self.wf.solution.find_alloc(6)
+		self.assertAlmostEqual(12.7, a.aft - a.ast)
+		self.assertEqual(a.aft, self.cw.finish[i])
+
+	def test_machine_dropout(self):
+		machine = self.wf.solution.find_alloc(0)[0]
+		reschedule(self.wf, 20, unavailable=[machine])
+		for t, (m, ast, aft) in self.allocations().items():
+			if m == machine:
+				self.assertLessEqual(aft, 20)
+
+
 @unittest.SkipTest
 class TestDALiuGEGraph(unittest.TestCase):
 
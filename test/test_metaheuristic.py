@@ -19,14 +19,24 @@ import os
 import logging
 
 import networkx as nx
+import numpy as np
 
 from test import config as cfg
 from shadow.algorithms.metaheuristic import generate_population, \
 	generate_allocations, \
 	generate_exec_orders, \
-	calc_start_finish_times, \
-	non_dom_sort
-
+	decode_population, \
+	evaluate_population, \
+	sample_exec_orders, \
+	PopulationEvaluator, \
+	non_dom_sort, \
+	crowding_distance, \
+	nsga2, \
+	spea2, \
+	spea2_fitness, \
+	truncate
+
+from shadow.algorithms.heuristic import upward_rank, rank_order
 from shadow.classes.workflow import Workflow
 from shadow.classes.environment import Environment
 
@@ -95,31 +105,149 @@ class TestPopulationGeneration(unittest.TestCase):
 
 		return 0
 
+	def test_sample_exec_orders(self):
+		cw = self.wf.compile()
+		upward_rank(self.wf)
+		rng = np.random.default_rng(self.SEED)
+		orders = sample_exec_orders(cw, 50, rng)
+		position = np.empty_like(orders)
+		position[np.arange(50)[:, np.newaxis], orders] = np.arange(cw.num_tasks)
+		self.assertTrue(
+			(position[:, cw.edge_src] < position[:, cw.edge_dst]).all()
+		)
+		self.assertGreater(len({tuple(order) for order in orders.tolist()}), 1)
+		# Without noise, the rank-perturbed order is the upward rank order
+		orders = sample_exec_orders(cw, 2, rng, rank_noise=0)
+		self.assertEqual(rank_order(cw).tolist(), orders[1].tolist())
+
 	def test_pop_gen(self):
 		top_sort = generate_exec_orders(self.wf, popsize=4, seed=self.SEED, skip_limit=1)
 		curr_sort = next(top_sort)
 		machines = list(self.wf.env.machines.keys())
-		# Solution should contain allocations between tasks and machines
-		soln = generate_allocations(machines, self.wf.tasks, self.SEED)
-		retval = calc_start_finish_times(soln, curr_sort)
-		alloc = soln['cat0_m0'][1]  # This should be task 5
+		soln = generate_allocations(machines, curr_sort, self.wf, self.SEED)
+		alloc = soln.list_machine_allocations('cat0_m0')[1]  # This should be task 5
 		self.assertEqual(alloc.tid, 5)
 		self.assertEqual(alloc.ast, 17)
 		self.assertEqual(alloc.aft, 41)
-		alloc = soln['cat1_m1'][0]  # this should be task 6
-		self.assertEqual(alloc.tid, 2)
-		self.assertEqual(alloc.ast, 29)
-		self.assertEqual(alloc.aft, 45)
+		# Machines are drawn in execution order, one draw per task
+		self.assertListEqual(
+			[(4, 28, 46), (1, 46, 61), (7, 63, 87)],
+			[(a.tid, a.ast, a.aft)
+				for a in soln.list_machine_allocations('cat1_m1')]
+		)
+
+		# Decoding a population gives each individual its own schedule
+		exec_order, task_assign = generate_population(self.wf, 4, self.SEED)
+		self.assertEqual((4, 10), exec_order.shape)
+		self.assertEqual((4, 10), task_assign.shape)
+		exec_order[0], task_assign[0] = soln.exec_order, soln.task_assign
+		start, finish = decode_population(self.wf.compile(), exec_order, task_assign)
+		self.assertEqual(17, start[0, 5])
+		self.assertEqual(41, finish[0, 5])
+		objectives = evaluate_population(self.wf, exec_order, task_assign)
+		self.assertEqual(107, objectives[0, 0])
+		self.assertAlmostEqual(110.6, objectives[0, 1], delta=0.01)
+		# Tasks are not changed by decoding
+		self.assertIsNone(self.wf.compile().tasks[5].machine)
 
 	# what our the costs?
 
 	# These two are generated in the above tests, so we can garauntee their correctness
 
 	def test_nondomsort(self):
+		objectives = [[1, 5], [2, 4], [3, 3], [2, 5], [4, 4], [5, 5], [1, 5]]
+		ranks = non_dom_sort(objectives)
+		self.assertEqual([0, 0, 0, 1, 1, 2, 0], ranks.tolist())
+
 		seed = 10
-		pop = generate_population(self.wf, 10, seed, 2)
-		objectives = []
-		# print(pop)
-		non_dom_sort(pop, objectives)
-		for p in pop:
-			print(p.nondom_rank)
+		pop = evaluate_population(self.wf, *generate_population(self.wf, 10, seed))
+		ranks = non_dom_sort(pop)
+		front = pop[ranks == 0]
+		for p in front:
+			for q in pop:
+				self.assertFalse(
+					(q <= p).all() and (q < p).any()
+				)
+
+	def test_crowding_distance(self):
+		objectives = [[1, 5], [2, 4], [3, 3], [5, 1], [2, 5]]
+		ranks = non_dom_sort(objectives)
+		distance = crowding_distance(objectives, ranks)
+		self.assertEqual(float('inf'), distance[0])
+		self.assertEqual(float('inf'), distance[3])
+		self.assertAlmostEqual(2 / 4 + 2 / 4, distance[1])
+		self.assertAlmostEqual(3 / 4 + 3 / 4, distance[2])
+		# A front of one solution is at both ends of its front
+		self.assertEqual(float('inf'), distance[4])
+
+	def test_decode_with_rates(self):
+		wf = Workflow("{0}/{1}".format(current_dir, cfg.test_metaheuristic_data['topcuoglu_graph']))
+		wf.add_environment(Environment("{0}/{1}".format(
+			current_dir, 'test/data/heuristic/final_heft_rates_sys.json'
+		)))
+		cw = wf.compile()
+		exec_order, task_assign = generate_population(wf, 5, self.SEED)
+		start, finish = decode_population(cw, exec_order, task_assign)
+		for k in range(5):
+			for i in range(cw.num_tasks):
+				for p, data_size in zip(
+					cw.predecessors(i).tolist(), cw.predecessor_data(i).tolist()
+				):
+					transfer = cw.comm.transfer_times(
+						data_size, task_assign[k, p], task_assign[k, i]
+					)
+					self.assertGreaterEqual(start[k, i], finish[k, p] + transfer)
+
+	def test_parallel_evaluation(self):
+		exec_order, task_assign = generate_population(self.wf, 10, self.SEED)
+		expected = evaluate_population(self.wf, exec_order, task_assign)
+		with PopulationEvaluator(self.wf, workers=2, chunk_size=3) as evaluate:
+			self.assertEqual(
+				expected.tolist(), evaluate(exec_order, task_assign).tolist()
+			)
+		serial = nsga2(self.wf, self.SEED, generations=5, popsize=10)
+		parallel = nsga2(
+			self.wf, self.SEED, generations=5, popsize=10, workers=2, chunk_size=4
+		)
+		self.assertEqual(
+			[(p.makespan, p.solution_cost) for p in serial],
+			[(p.makespan, p.solution_cost) for p in parallel]
+		)
+
+	def test_nsga2(self):
+		front = nsga2(self.wf, self.SEED, generations=20, popsize=20)
+		objectives = [(p.makespan, p.solution_cost) for p in front]
+		self.assertEqual(sorted(objectives), objectives)
+		self.assertEqual([0] * len(front), non_dom_sort(objectives).tolist())
+		for p in front:
+			self.assertEqual(
+				10, sum(len(a) for a in p.list_all_allocations().values())
+			)
+
+	def test_spea2_fitness(self):
+		objectives = [[1, 5], [2, 4], [3, 3], [2, 5], [4, 4], [5, 5]]
+		fitness, distance = spea2_fitness(objectives)
+		# Strengths are [2, 3, 2, 1, 1, 0], and the raw fitness of a solution
+		# is the sum of the strengths of the solutions that dominate it
+		self.assertEqual([0, 0, 0, 5, 5, 9], np.floor(fitness).tolist())
+		self.assertTrue((fitness[:3] < 1).all())
+		self.assertEqual(float('inf'), distance[0, 0])
+
+	def test_truncate(self):
+		points = np.array([[0.0], [1.0], [2.0], [2.1], [3.0]])
+		distance = np.abs(points - points.T)
+		np.fill_diagonal(distance, np.inf)
+		# 2 and 2.1 are closest; 2.1 is then nearer its other neighbours
+		self.assertEqual([0, 1, 2, 4], truncate(distance, 4).tolist())
+		self.assertEqual([0, 2, 4], truncate(distance, 3).tolist())
+
+	def test_spea2(self):
+		front = spea2(self.wf, self.SEED, generations=20, popsize=20, archive_size=10)
+		objectives = [(p.makespan, p.solution_cost) for p in front]
+		self.assertLessEqual(len(front), 10)
+		self.assertEqual(sorted(objectives), objectives)
+		self.assertEqual([0] * len(front), non_dom_sort(objectives).tolist())
+		for p in front:
+			self.assertEqual(
+				10, sum(len(a) for a in p.list_all_allocations().values())
+			)
@@ -0,0 +1,64 @@
+# Copyright (C) 2020 RW Bunney
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+import os
+
+from test import config as cfg
+from shadow.algorithms.multiworkflow import schedule_workflows, policies
+from shadow.classes.environment import Environment
+from shadow.classes.workflow import Workflow
+
+current_dir = os.path.abspath('.')
+
+
+class TestMultiWorkflow(unittest.TestCase):
+
+	def setUp(self):
+		self.config = "{0}/{1}".format(current_dir, cfg.test_workflow_data['topcuoglu_graph'])
+		self.env = Environment("{0}/{1}".format(current_dir, cfg.test_workflow_data['topcuoglu_graph_system']))
+
+	def test_single_workflow(self):
+		result = schedule_workflows([Workflow(self.config)], self.env)
+		self.assertEqual(98, result['makespan'])
+		self.assertEqual(1.0, result['workflows'][0]['slowdown'])
+		self.assertEqual(0.0, result['unfairness'])
+
+	def test_shared_machines(self):
+		arrivals = [0, 0, 40]
+		for policy in policies:
+			workflows = [Workflow(self.config) for a in arrivals]
+			result = schedule_workflows(
+				workflows, self.env, arrivals=arrivals, policy=policy
+			)
+			for machine, allocs in result['solution'].list_all_allocations().items():
+				for prev, a in zip(allocs, allocs[1:]):
+					self.assertLessEqual(prev.aft, a.ast)
+			for wf, arrival, summary in zip(workflows, arrivals, result['workflows']):
+				self.assertGreaterEqual(min(t.ast for t in wf.tasks), arrival)
+				self.assertEqual(
+					max(t.aft for t in wf.tasks), summary['finish']
+				)
+				self.assertGreaterEqual(summary['slowdown'], 1.0)
+				self.assertEqual(
+					10, sum(len(a) for a in wf.solution.list_all_allocations().values())
+				)
+			self.assertEqual(
+				3 / result['makespan'], result['throughput']
+			)
+
+	def test_unknown_policy(self):
+		with self.assertRaises(ValueError):
+			schedule_workflows([Workflow(self.config)], self.env, policy='lottery')
@@ -0,0 +1,71 @@
+# Copyright (C) 2020 RW Bunney
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+import json
+import os
+import tempfile
+
+from test import config as cfg
+from shadow.algorithms.heuristic import heft, pheft
+from shadow.classes.environment import Environment
+from shadow.classes.profiler import Profiler, DISABLED, json_sink
+from shadow.classes.workflow import Workflow
+
+current_dir = os.path.abspath('.')
+
+
+class TestProfiler(unittest.TestCase):
+
+	def setUp(self):
+		self.wf = Workflow("{0}/{1}".format(current_dir, cfg.test_workflow_data['topcuoglu_graph']))
+		self.env = Environment("{0}/{1}".format(current_dir, cfg.test_workflow_data['topcuoglu_graph_system']))
+		self.wf.add_environment(self.env)
+
+	def test_heft_report(self):
+		reports = []
+		profiler = Profiler(reports.append)
+		self.assertEqual(98, heft(self.wf, profiler=profiler))
+		self.assertEqual(1, len(reports))
+		report = reports[0]
+		self.assertEqual('heft', report['name'])
+		counters = report['counters']
+		self.assertEqual(10, counters['allocate.tasks'])
+		self.assertEqual(len(self.wf.edges), counters['rank.edges'])
+		self.assertEqual(len(self.wf.edges), counters['allocate.predecessors'])
+		# Every task but the first is evaluated on each of the 3 machines
+		self.assertEqual(27, counters['allocate.est_evaluations'])
+		for phase in ['heft', 'rank', 'allocate']:
+			self.assertEqual(1, report['timers'][phase]['calls'])
+		self.assertEqual(9, report['timers']['allocate.ready_times']['calls'])
+
+	def test_runs_are_separate(self):
+		with tempfile.TemporaryDirectory() as directory:
+			path = os.path.join(directory, 'profile.jsonl')
+			profiler = Profiler(json_sink(path))
+			heft(self.wf, profiler=profiler)
+			self.wf.add_environment(self.env)
+			pheft(self.wf, profiler=profiler)
+			with open(path) as infile:
+				reports = [json.loads(line) for line in infile]
+		self.assertEqual(['heft', 'pheft'], [r['name'] for r in reports])
+		for report in reports:
+			self.assertEqual(10, report['counters']['allocate.tasks'])
+
+	def test_disabled(self):
+		self.assertFalse(DISABLED)
+		with DISABLED.timer('rank'):
+			DISABLED.count('rank.levels')
+		self.assertEqual(98, heft(self.wf))
@@ -0,0 +1,87 @@
+# Copyright (C) 2020 RW Bunney
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+import asyncio
+import os
+
+from test import config as cfg
+from shadow.algorithms.heuristic import heft
+from shadow.algorithms.streaming import StreamingScheduler, workflow_events
+from shadow.classes.environment import Environment
+from shadow.classes.workflow import Workflow
+
+current_dir = os.path.abspath('.')
+
+
+class TestStreamingScheduler(unittest.TestCase):
+
+	def setUp(self):
+		self.wf = Workflow("{0}/{1}".format(current_dir, cfg.test_workflow_data['topcuoglu_graph']))
+		self.env = Environment("{0}/{1}".format(current_dir, cfg.test_workflow_data['topcuoglu_graph_system']))
+		self.wf.add_environment(self.env)
+
+	def check(self, allocations):
+		placed = {a.tid: (machine, a.ast, a.aft) for machine, a in allocations}
+		self.assertEqual(10, len(placed))
+		for u, v, data_size in self.wf.edges(data='data_size'):
+			pre, post = placed[u.tid], placed[v.tid]
+			comm = 0 if pre[0] == post[0] else data_size
+			self.assertGreaterEqual(post[1], pre[2] + comm)
+		return placed
+
+	def test_whole_stream_matches_heft(self):
+		scheduler = StreamingScheduler(self.env)
+		allocations = list(scheduler.run(workflow_events(self.wf)))
+		placed = self.check(allocations)
+		self.assertEqual(heft(self.wf), scheduler.makespan)
+		for task in self.wf.tasks:
+			self.assertEqual((task.machine, task.ast, task.aft), placed[task.tid])
+		# Every task is retired once its successors are allocated
+		self.assertEqual(0, len(scheduler))
+
+	def test_partitions(self):
+		scheduler = StreamingScheduler(self.env)
+		allocations = []
+		held = 0
+		for allocation in scheduler.run(workflow_events(self.wf, 3)):
+			allocations.append(allocation)
+			held = max(held, len(scheduler))
+		self.check(allocations)
+		self.assertLess(held, 10)
+		self.assertGreater(scheduler.watermark, 0)
+
+	def test_async_stream(self):
+		async def events():
+			for event in workflow_events(self.wf, 3):
+				yield event
+
+		async def collect(scheduler):
+			return [a async for a in scheduler.arun(events())]
+
+		expected = list(StreamingScheduler(self.env).run(workflow_events(self.wf, 3)))
+		allocations = asyncio.run(collect(StreamingScheduler(self.env)))
+		self.assertEqual(
+			[(m, a.tid, a.ast, a.aft) for m, a in expected],
+			[(m, a.tid, a.ast, a.aft) for m, a in allocations]
+		)
+
+	def test_closed_inputs(self):
+		scheduler = StreamingScheduler(self.env)
+		scheduler.add_task(0, [1, 2, 3])
+		scheduler.add_task(1, [1, 2, 3])
+		scheduler.barrier()
+		with self.assertRaises(ValueError):
+			scheduler.add_edge(0, 1, 10)
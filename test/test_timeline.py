@@ -0,0 +1,132 @@
+# Copyright (C) 2020 RW Bunney
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+import random
+
+import numpy as np
+
+from shadow.classes.timeline import Timeline
+from shadow.classes.solution import Solution
+
+
+def slot_search(intervals, ready, runtime):
+	"""
+	Reference implementation: scan every gap in order of start time
+	"""
+	prev = 0
+	for ast, aft in sorted(intervals):
+		start = max(prev, ready)
+		if start + runtime <= ast:
+			return start
+		prev = aft
+	return max(prev, ready)
+
+
+class TestTimeline(unittest.TestCase):
+
+	def setUp(self):
+		self.timeline = Timeline()
+		for ast, aft in [(10, 20), (0, 5), (30, 35)]:
+			self.timeline.insert(ast, aft, (ast, aft))
+
+	def test_order(self):
+		self.assertEqual([(0, 5), (10, 20), (30, 35)], list(self.timeline))
+		self.assertEqual(35, self.timeline.end)
+		self.assertEqual(10, self.timeline.max_gap)
+		self.assertEqual(2, self.timeline.count_le(10))
+		self.assertEqual(
+			[(10, 20), (30, 35)], list(self.timeline.items_from(10))
+		)
+		self.assertEqual([(30, 35)], list(self.timeline.items_from(11)))
+		self.assertEqual([], list(self.timeline.items_from(31)))
+
+	def test_earliest_start(self):
+		self.assertEqual(5, self.timeline.earliest_start(0, 5))
+		self.assertEqual(20, self.timeline.earliest_start(6, 5))
+		self.assertEqual(35, self.timeline.earliest_start(6, 11))
+		self.assertEqual(40, self.timeline.earliest_start(40, 100))
+
+	def test_copy_is_independent(self):
+		snapshot = self.timeline.copy()
+		self.timeline.insert(5, 10, (5, 10))
+		self.timeline.remove(30, (30, 35))
+		self.assertEqual(3, len(snapshot))
+		self.assertEqual([(0, 5), (5, 10), (10, 20)], list(self.timeline))
+		self.assertEqual(35, snapshot.end)
+
+	def test_matches_slot_search(self):
+		rnd = random.Random(10)
+		timeline = Timeline()
+		intervals = []
+		for x in range(300):
+			ready, runtime = rnd.randint(0, 2000), rnd.randint(0, 40)
+			start = timeline.earliest_start(ready, runtime)
+			self.assertEqual(slot_search(intervals, ready, runtime), start)
+			timeline.insert(start, start + runtime, x)
+			intervals.append((start, start + runtime))
+		self.assertEqual(sorted(intervals)[-1][1], timeline.end)
+
+	def test_zero_length_interval(self):
+		timeline = Timeline()
+		timeline.insert(38, 43, 0)
+		timeline.insert(38, 38, 1)
+		self.assertEqual([1, 0], list(timeline))
+		self.assertEqual(43, timeline.end)
+		self.assertEqual(43, timeline.earliest_start(38, 3))
+		self.assertEqual(1, timeline.count_le(38, 38))
+		self.assertEqual(2, timeline.count_le(38))
+
+
+class TestSnapshot(unittest.TestCase):
+
+	def setUp(self):
+		self.solution = Solution(['m0', 'm1'])
+		self.solution.allocate(0, 'm0', 0, 10)
+
+	def test_allocations_are_tentative(self):
+		snapshot = self.solution.snapshot()
+		snapshot.allocate('m0', 10, 15)
+		nested = snapshot.snapshot()
+		nested.allocate('m1', 0, 20)
+		self.assertListEqual([15, 20], nested.earliest_starts(
+			np.zeros(2, dtype=np.int64), np.array([5, 5])
+		).tolist())
+		self.assertListEqual([15, 0], snapshot.earliest_starts(
+			np.zeros(2, dtype=np.int64), np.array([5, 5])
+		).tolist())
+		self.assertListEqual([10, 0], self.solution.earliest_starts(
+			np.zeros(2, dtype=np.int64), np.array([5, 5])
+		).tolist())
+		self.assertEqual(1, len(self.solution.timelines['m0']))
+
+	def test_remove_after_equal_starts(self):
+		self.solution.allocate(1, 'm0', 10, 20)
+		self.solution.allocate(2, 'm0', 10, 10)
+		self.solution.allocate(3, 'm0', 10, 10)
+		self.assertListEqual(
+			[0, 2, 3, 1],
+			[a.tid for a in self.solution.allocations['m0']]
+		)
+		self.solution.remove_allocation(2, 'm0')
+		self.solution.remove_allocation(1, 'm0')
+		self.assertListEqual(
+			[0, 3], [a.tid for a in self.solution.allocations['m0']]
+		)
+		self.assertListEqual(
+			[a for a in self.solution.allocations['m0']],
+			list(self.solution.timelines['m0'])
+		)
+		self.assertEqual(10, self.solution.timelines['m0'].end)
@@ -17,6 +17,7 @@
 
 import unittest
 import os
+import tempfile
 
 from test import config as cfg
 
@@ -40,3 +41,79 @@ class TestWorkflowClass(unittest.TestCase):
 		self.assertEqual(retval, 0)
 		self.assertEqual(28, wf.graph.nodes[5]['comp'][1])
 		self.assertEqual(wf.graph.edges[3, 7]['data_size'], 27)
+
+	def test_compile(self):
+		wf = Workflow("{0}/{1}".format(current_dir, cfg.test_workflow_data['topcuoglu_graph']))
+		env = Environment("{0}/{1}".format(current_dir,cfg.test_workflow_data['topcuoglu_graph_system']))
+		wf.add_environment(env)
+		cw = wf.compile()
+
+		self.assertIs(cw, wf.compile())
+		self.assertEqual((10, 3), cw.runtime.shape)
+		self.assertEqual(len(wf.edges), cw.num_edges)
+		src, dst = cw.task_index[3], cw.task_index[7]
+		self.assertIn(dst, cw.successors(src))
+		preds = cw.predecessors(dst).tolist()
+		self.assertIn(src, preds)
+		self.assertEqual(27, cw.predecessor_data(dst)[preds.index(src)])
+		task = cw.tasks[src]
+		self.assertEqual(
+			task.calculated_runtime['cat1_m1'],
+			cw.runtime[src, cw.machine_index['cat1_m1']]
+		)
+
+	def test_shared_runtimes(self):
+		wf = Workflow("{0}/{1}".format(current_dir, cfg.test_workflow_data['topcuoglu_graph']))
+		env = Environment("{0}/{1}".format(current_dir,cfg.test_workflow_data['topcuoglu_graph_system']))
+		task = list(wf.tasks)[0]
+		self.assertFalse(hasattr(task, '__dict__'))
+		self.assertEqual({}, task.calculated_runtime)
+		wf.add_environment(env)
+		cw = wf.compile()
+		self.assertIs(wf._runtime, cw.runtime)
+		row = cw.task_index[task.tid]
+		self.assertEqual(
+			cw.runtime[row].tolist(), list(task.calculated_runtime.values())
+		)
+		self.assertEqual(list(env.machines), list(task.calculated_runtime))
+
+	def test_cache(self):
+		config = "{0}/{1}".format(current_dir, cfg.test_workflow_data['topcuoglu_graph'])
+		env = Environment("{0}/{1}".format(current_dir,cfg.test_workflow_data['topcuoglu_graph_system']))
+		with tempfile.TemporaryDirectory() as cache_dir:
+			wf = Workflow(config, cache_dir=cache_dir)
+			self.assertEqual(1, len(os.listdir(cache_dir)))
+			cache = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+			cached = Workflow.from_cache(cache)
+			reused = Workflow(config, cache_dir=cache_dir)
+			for other in (cached, reused):
+				self.assertEqual(sorted(wf.tasks), sorted(other.tasks))
+				self.assertEqual(
+					sorted(wf.edges(data='data_size')),
+					sorted(other.edges(data='data_size'))
+				)
+				wf.add_environment(env)
+				other.add_environment(env)
+				self.assertEqual(
+					wf.compile().runtime.tolist(),
+					other.compile().runtime.tolist()
+				)
+
+	def test_arrays(self):
+		config = "{0}/{1}".format(current_dir, cfg.test_workflow_data['topcuoglu_graph'])
+		env = Environment("{0}/{1}".format(current_dir,cfg.test_workflow_data['topcuoglu_graph_system']))
+		wf = Workflow(config)
+		wf.add_environment(env)
+		with tempfile.TemporaryDirectory() as directory:
+			wf.save_arrays(directory)
+			mapped = Workflow.from_arrays(directory)
+			self.assertIsNone(mapped.graph)
+			self.assertEqual(0, mapped.add_environment(env))
+			cw, mapped_cw = wf.compile(), mapped.compile()
+			self.assertIsNone(mapped_cw.tasks)
+			for attr in ['tids', 'runtime', 'succ_ptr', 'succ_idx', 'data_size',
+						'pred_ptr', 'pred_idx', 'pred_eid']:
+				self.assertEqual(
+					getattr(cw, attr).tolist(), getattr(mapped_cw, attr).tolist()
+				)
+			del mapped, mapped_cw